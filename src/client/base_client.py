@@ -0,0 +1,385 @@
+import abc
+import logging
+import secrets
+import threading
+import time
+import random
+from collections import deque
+
+from src.core import metrics
+
+# Outbound queue
+EMIT_QUEUE_SIZE = 64 # Max queued (non-status) events; oldest dropped when full
+
+DEFAULT_DEVICE_ID = 'default'
+
+# Per-process boot id: versions restart at 0 in a new process, so they are only
+# comparable within one epoch
+BOOT_ID = secrets.token_hex(8)
+
+# Metrics pushed to the web UI ('s2c_metrics') while connected
+METRICS_PUSH_INTERVAL = 2.0
+
+EMIT_SENT = metrics.REGISTRY.counter('powertap_emit_sent_total', 'Events sent to the web server')
+EMIT_DROPPED = metrics.REGISTRY.counter('powertap_emit_dropped_total', 'Events dropped (queue full / send failed)')
+
+# Reconnect backoff (seconds): jittered exponential, low first retry
+RECONNECT_DELAY_MIN = 0.2
+RECONNECT_DELAY_MAX = 10.0
+
+class BaseClient(abc.ABC):
+    """
+    Transport-independent part of the device <-> web server link:
+    outbound queue, state versioning/snapshots, reconnect loop and
+    c2s_control command handling.
+
+    Subclasses implement: connected, _connect(), _wait(), _disconnect(), _send(event, data)
+    and call _on_connected() / _on_disconnected() / handle_control(data).
+    """
+
+    def __init__(self, state_machine, device_id=DEFAULT_DEVICE_ID, tags=None, queue_size=EMIT_QUEUE_SIZE):
+        self.sm = state_machine
+        # Identity in fleet mode (one server, many taps). Tags e.g. {'floor': 3}
+        self.device_id = device_id
+        self.tags = tags or {}
+        self.logger = logging.getLogger(type(self).__module__)
+        self.running = False
+        self.thread = None
+        self.stop_event = threading.Event()
+
+        # State version, bumped on every status change. Sent with snapshots (and
+        # the epoch they belong to) so dashboards can discard stale data.
+        self.version = 0
+        self.epoch = BOOT_ID
+        self.conn_stats = {
+            'attempts': 0,
+            'failures': 0,
+            'connects': 0,
+            'disconnects': 0,
+            'connected_since': None,
+            'last_disconnect': None,
+            'last_connect_time': 0.0, # Seconds spent in _connect()
+            'last_downtime': 0.0,     # Seconds from disconnect to reconnect
+        }
+
+        # Outbound queue, drained by the sender thread.
+        # Producers (e.g. the relay callback inside all_off) only append and notify.
+        self.queue_cond = threading.Condition()
+        self.queue = deque(maxlen=queue_size)
+        self.pending_status = None # Latest-wins slot for s2c_status
+        self.pending_snapshot = False # Full-state resync requested (built at send time)
+        self.sender_thread = None
+        metrics.REGISTRY.gauge('powertap_emit_queue_depth', 'Outbound events waiting to be sent', fn=self.queue_depth)
+        # Source of the pushed metrics (supervisor mode merges in the core process' metrics)
+        self.metrics_source = metrics.REGISTRY.snapshot
+        self.stats = {
+            'queued': 0,
+            'sent': 0,
+            'dropped': 0,
+            'coalesced': 0,
+            'send_latency_last': 0.0,
+            'send_latency_max': 0.0,
+        }
+
+    # --- Transport interface ---
+
+    @property
+    @abc.abstractmethod
+    def connected(self):
+        ...
+
+    @abc.abstractmethod
+    def _connect(self):
+        ...
+
+    @abc.abstractmethod
+    def _wait(self):
+        """Block until the connection is closed."""
+
+    @abc.abstractmethod
+    def _disconnect(self):
+        ...
+
+    @abc.abstractmethod
+    def _send(self, event, data):
+        ...
+
+    # --- Connection events ---
+
+    def _on_connected(self):
+        now = time.monotonic()
+        self.conn_stats['connects'] += 1
+        self.conn_stats['connected_since'] = now
+        if self.conn_stats['last_disconnect'] is not None:
+            self.conn_stats['last_downtime'] = now - self.conn_stats['last_disconnect']
+        # Resync: one consolidated snapshot replaces any queued status
+        self.request_snapshot()
+
+    def _on_disconnected(self):
+        self.conn_stats['disconnects'] += 1
+        self.conn_stats['connected_since'] = None
+        self.conn_stats['last_disconnect'] = time.monotonic()
+
+    # --- Inbound ---
+
+    def handle_control(self, data):
+        self.logger.info("Received Control: %s", data)
+        try:
+            if not isinstance(data, dict):
+                self.logger.error(f"Invalid data format: {type(data)}")
+                return
+
+            cmd = data.get('cmd')
+
+            # Handle 'get' command (No relay ID needed)
+            if cmd == 'get':
+                self.request_snapshot()
+                return
+
+            # --- Simulation Commands (Allowed in ANY state) ---
+            if cmd == 'simulate_button':
+                btn_id = int(data.get('btn_id'))
+                self.logger.info("[DEBUG] Simulating Button %s", btn_id)
+                self.sm.on_button_press(btn_id)
+                return
+
+            if cmd == 'simulate_qzss':
+                report = data.get('report', "Simulation Report")
+                self.logger.info("[DEBUG] Simulating QZSS: %s", report)
+                self.sm.on_qz1_message(report)
+                return
+
+            if cmd == 'simulate_imu':
+                force = float(data.get('force', 1.5))
+                self.logger.info("[DEBUG] Simulating IMU: %sG", force)
+                self.sm.on_imu_shake(force)
+                return
+
+            # Batch: validated as a whole, applied atomically, acknowledged
+            if cmd == 'batch':
+                self._handle_batch(data)
+                return
+
+            # --- Control Commands (Restricted to NORMAL state) ---
+            if self.sm.current_state != self.sm.STATE_NORMAL:
+                 self.logger.warning("Ignored control (Not in NORMAL state)")
+                 return
+
+            # Handle set/toggle
+            if cmd in ['set', 'toggle']:
+                relay_val = data.get('relay')
+                if relay_val is None:
+                    self.logger.error("Missing relay ID")
+                    return
+
+                relay = int(relay_val)
+
+                if cmd == 'set':
+                    state = bool(data.get('state'))
+                    self.sm.power.set_relay(relay, state)
+                elif cmd == 'toggle':
+                    self.sm.power.toggle(relay)
+            else:
+                self.logger.warning("Unknown command: %s", cmd)
+
+        except Exception as e:
+            self.logger.error(f"Error handling control event: {e}")
+
+    def _handle_batch(self, data):
+        """
+        data: {cmd: 'batch', ops: [{cmd: 'set', relay: 1, state: false}, {cmd: 'toggle', relay: 4}], req_id: ...}
+        Emits exactly one 's2c_ack' {req_id, ok, version, epoch[, error]} and (on success) one status.
+        """
+        req_id = data.get('req_id')
+
+        def ack(ok, error=None):
+            payload = {'req_id': req_id, 'ok': ok, 'version': self.version, 'epoch': self.epoch}
+            if error:
+                payload['error'] = error
+            self.emit_event('s2c_ack', payload)
+
+        ops = data.get('ops')
+        if not isinstance(ops, list) or not ops:
+            self.logger.error("Batch: missing ops")
+            return ack(False, 'invalid')
+
+        # Validate everything before touching any relay
+        current = self.sm.power.get_status()
+        targets = {}
+        for op in ops:
+            if not isinstance(op, dict) or op.get('cmd') not in ('set', 'toggle'):
+                self.logger.error("Batch: invalid op %s", op)
+                return ack(False, 'invalid')
+            try:
+                relay = int(op.get('relay'))
+            except (TypeError, ValueError):
+                relay = None
+            if relay not in current:
+                self.logger.error("Batch: invalid relay in %s", op)
+                return ack(False, 'invalid')
+
+            if op['cmd'] == 'set':
+                targets[relay] = bool(op.get('state'))
+            else:
+                targets[relay] = not targets.get(relay, current[relay])
+
+        if not self.sm.apply_relay_batch(targets):
+            self.logger.warning("Ignored batch (Not in NORMAL state)")
+            return ack(False, 'state')
+
+        ack(True)
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run_client, daemon=True)
+        self.thread.start()
+        self.sender_thread = threading.Thread(target=self._send_loop, daemon=True)
+        self.sender_thread.start()
+        threading.Thread(target=self._metrics_loop, daemon=True).start()
+
+    def stop(self):
+        self.running = False
+        self.stop_event.set()
+        with self.queue_cond:
+            self.queue_cond.notify_all()
+        if self.connected:
+            self._disconnect()
+
+    def _run_client(self):
+        # Retry loop with jittered exponential backoff
+        delay = RECONNECT_DELAY_MIN
+        while self.running:
+            if not self.connected:
+                self.conn_stats['attempts'] += 1
+                t0 = time.monotonic()
+                try:
+                    self._connect()
+                    self.conn_stats['last_connect_time'] = time.monotonic() - t0
+                    delay = RECONNECT_DELAY_MIN
+                except Exception as e:
+                    self.conn_stats['failures'] += 1
+                    self.logger.debug(f"Connection Failed: {e}")
+                    self.stop_event.wait(random.uniform(0.5, 1.0) * delay)
+                    delay = min(delay * 2, RECONNECT_DELAY_MAX)
+                    continue
+            self._wait() # Blocking until disconnected
+
+    def get_connection_stats(self):
+        stats = dict(self.conn_stats)
+        stats['connected'] = self.connected
+        since = stats.pop('connected_since')
+        stats['uptime'] = time.monotonic() - since if since is not None else 0.0
+        last = stats.pop('last_disconnect')
+        stats['since_disconnect'] = time.monotonic() - last if last is not None else None
+        return stats
+
+    def request_snapshot(self):
+        """Queue a full-state snapshot (replaces any pending status)."""
+        with self.queue_cond:
+            self.pending_status = None
+            self.pending_snapshot = True
+            self.stats['queued'] += 1
+            self.queue_cond.notify()
+
+    def build_snapshot(self):
+        return {
+            'version': self.version,
+            'epoch': self.epoch,
+            'relays': self.sm.power.get_status(),
+            'current_state': self.sm.current_state,
+            'alert_message': self.sm.alert_message,
+            'sensors': self.sm.get_sensor_health(),
+        }
+
+    def emit_status(self, status_dict):
+        """
+        Queue 's2c_status' event to server.
+        status_dict: {1: True, 2: False ...}
+        Returns immediately; only the latest status is kept until it is sent.
+        """
+        with self.queue_cond:
+            self.version += 1
+            if self.pending_status is not None or self.pending_snapshot:
+                self.stats['coalesced'] += 1
+            if self.pending_snapshot:
+                # The snapshot is built at send time and already covers this change
+                self.queue_cond.notify()
+                return
+            self.pending_status = (dict(status_dict), time.monotonic())
+            self.stats['queued'] += 1
+            self.queue_cond.notify()
+
+    def emit_event(self, event, data):
+        """
+        Queue an arbitrary event. The queue is bounded: when full, the oldest
+        event is dropped (backpressure never blocks the caller).
+        """
+        with self.queue_cond:
+            if len(self.queue) == self.queue.maxlen:
+                self.stats['dropped'] += 1
+                EMIT_DROPPED.inc()
+            self.queue.append((event, data, time.monotonic()))
+            self.stats['queued'] += 1
+            self.queue_cond.notify()
+
+    def queue_depth(self):
+        return len(self.queue) + (1 if self.pending_status is not None or self.pending_snapshot else 0)
+
+    def get_stats(self):
+        with self.queue_cond:
+            stats = dict(self.stats)
+        stats['depth'] = self.queue_depth()
+        return stats
+
+    def _next_outbound(self):
+        """Pop the next event to send (snapshot/status first). Called with queue_cond held."""
+        if self.pending_snapshot:
+            self.pending_snapshot = False
+            return 's2c_snapshot', self.build_snapshot(), time.monotonic()
+        if self.pending_status is not None:
+            status, queued_at = self.pending_status
+            self.pending_status = None
+            return 's2c_status', status, queued_at
+        if self.queue:
+            return self.queue.popleft()
+        return None
+
+    def _send_loop(self):
+        while self.running:
+            with self.queue_cond:
+                # Hold events while disconnected (status stays coalesced, queue stays bounded)
+                while self.running and (not self.connected or self.queue_depth() == 0):
+                    self.queue_cond.wait(timeout=0.5)
+                if not self.running:
+                    return
+                item = self._next_outbound()
+            if item is None:
+                continue
+
+            event, data, queued_at = item
+            try:
+                self.logger.debug("Emitting %s: %s", event, data)
+                self._send(event, data)
+            except Exception as e:
+                self.logger.warning("Emit failed (%s): %s", event, e)
+                with self.queue_cond:
+                    self.stats['dropped'] += 1
+                EMIT_DROPPED.inc()
+                continue
+
+            latency = time.monotonic() - queued_at
+            EMIT_SENT.inc()
+            with self.queue_cond:
+                self.stats['sent'] += 1
+                self.stats['send_latency_last'] = latency
+                if latency > self.stats['send_latency_max']:
+                    self.stats['send_latency_max'] = latency
+
+    def _metrics_loop(self):
+        while not self.stop_event.wait(METRICS_PUSH_INTERVAL):
+            if not self.connected:
+                continue
+            try:
+                self.emit_event('s2c_metrics', self.metrics_source())
+            except Exception as e:
+                self.logger.debug(f"Metrics push failed: {e}")
@@ -0,0 +1,119 @@
+import json
+import socket
+import struct
+import threading
+
+from src.client.base_client import BaseClient, DEFAULT_DEVICE_ID, EMIT_QUEUE_SIZE
+
+# Same-host transport to web/server.ts over a Unix domain socket.
+# Frame: [payload length: uint32 BE][message type: uint8][payload: compact JSON (UTF-8)]
+IPC_PATH = '/tmp/qzss-powertap.sock'
+FRAME_HEADER = struct.Struct('>IB')
+MAX_FRAME_SIZE = 1 << 20
+
+MSG_TYPES = {
+    's2c_status': 1,
+    's2c_snapshot': 2,
+    's2c_ack': 3,
+    'c2s_control': 4,
+    'ping': 5,
+    'pong': 6,
+    'register': 7,
+    's2c_metrics': 8,
+}
+MSG_NAMES = {v: k for k, v in MSG_TYPES.items()}
+
+
+def encode_frame(event, data):
+    payload = json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return FRAME_HEADER.pack(len(payload), MSG_TYPES[event]) + payload
+
+
+class FrameDecoder:
+    """Incremental decoder: feed() raw bytes, get back complete (event, data) messages."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        messages = []
+        while len(self.buffer) >= FRAME_HEADER.size:
+            length, msg_type = FRAME_HEADER.unpack_from(self.buffer)
+            if length > MAX_FRAME_SIZE:
+                raise ValueError(f"Frame too large: {length}")
+            end = FRAME_HEADER.size + length
+            if len(self.buffer) < end:
+                break
+            payload = bytes(self.buffer[FRAME_HEADER.size:end])
+            del self.buffer[:end]
+            event = MSG_NAMES.get(msg_type)
+            if event is None:
+                continue # Unknown type: skip frame
+            messages.append((event, json.loads(payload) if payload else None))
+        return messages
+
+
+class IPCClient(BaseClient):
+    """Drop-in alternative to SocketIOClient for a web server on the same host."""
+
+    def __init__(self, state_machine, path=IPC_PATH, device_id=DEFAULT_DEVICE_ID, tags=None,
+                 queue_size=EMIT_QUEUE_SIZE):
+        super().__init__(state_machine, device_id=device_id, tags=tags, queue_size=queue_size)
+        self.path = path
+        self.sock = None
+        self.send_lock = threading.Lock()
+
+    @property
+    def connected(self):
+        return self.sock is not None
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+        # Identify before anything else is sent (fleet routing on the server)
+        self._send('register', {'device_id': self.device_id, 'tags': self.tags})
+        self.logger.info(f"Connected to Web Server via IPC ({self.path})")
+        self._on_connected()
+
+    def _wait(self):
+        sock = self.sock
+        decoder = FrameDecoder()
+        try:
+            while self.running:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                for event, data in decoder.feed(chunk):
+                    if event == 'c2s_control':
+                        self.handle_control(data)
+                    elif event == 'ping':
+                        self._send('pong', data)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"IPC connection error: {e}")
+        finally:
+            self.sock = None
+            sock.close()
+            self.logger.warning("Disconnected from Web Server")
+            self._on_disconnected()
+
+    def _disconnect(self):
+        sock = self.sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _send(self, event, data):
+        sock = self.sock
+        if sock is None:
+            raise ConnectionError("IPC not connected")
+        frame = encode_frame(event, data)
+        with self.send_lock:
+            sock.sendall(frame)
@@ -0,0 +1,87 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+
+class BootTimeline:
+    """
+    Records named boot phases (import / init) with their thread and timing,
+    relative to t0 (process start as seen by main.py).
+    """
+
+    def __init__(self, t0=None):
+        self.t0 = t0 if t0 is not None else time.monotonic()
+        self.lock = threading.Lock()
+        self.phases = [] # (name, thread, start, end)
+        self.marks = {}  # name -> time (e.g. "protected")
+        self.logger = logging.getLogger(__name__)
+
+    @contextmanager
+    def phase(self, name):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            end = time.monotonic()
+            with self.lock:
+                self.phases.append((name, threading.current_thread().name, start - self.t0, end - self.t0))
+
+    def mark(self, name):
+        with self.lock:
+            self.marks[name] = time.monotonic() - self.t0
+
+    def run_parallel(self, name, fn):
+        """Run fn in a daemon thread, timed as phase `name`. Returns the thread."""
+        def target():
+            try:
+                with self.phase(name):
+                    fn()
+            except Exception as e:
+                self.logger.error(f"Boot phase {name} failed: {e}", exc_info=True)
+
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        return thread
+
+    def report(self):
+        with self.lock:
+            phases = sorted(self.phases, key=lambda p: p[2])
+            marks = sorted(self.marks.items(), key=lambda m: m[1])
+        lines = ["Boot timeline (ms since start):"]
+        for name, thread, start, end in phases:
+            lines.append(f"  {start * 1000:8.1f} -> {end * 1000:8.1f}  ({(end - start) * 1000:7.1f})  [{thread}] {name}")
+        for name, t in marks:
+            lines.append(f"  {t * 1000:8.1f}  * {name}")
+        return "\n".join(lines)
+
+
+class DeferredAudio:
+    """
+    Stand-in for AudioHandler while it is still starting (pygame import/mixer
+    init are slow). Remembers whether the alarm should be sounding and
+    replays that once the real handler is attached.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.target = None
+        self.alarm_requested = False
+
+    def attach(self, audio):
+        with self.lock:
+            self.target = audio
+            if self.alarm_requested:
+                audio.start_alarm()
+
+    def start_alarm(self):
+        with self.lock:
+            self.alarm_requested = True
+            if self.target:
+                self.target.start_alarm()
+
+    def stop_alarm(self):
+        with self.lock:
+            self.alarm_requested = False
+            if self.target:
+                self.target.stop_alarm()
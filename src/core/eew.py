@@ -0,0 +1,78 @@
+import os
+
+# DC Report classification for the state machine:
+#   ALERT  - cut power now (strong EEW for our area, or any non-EEW report as before)
+#   PREARM - EEW for our area below the cutoff intensity: IMU at full rate with the
+#            sensitive profile, cutoff on the first shaking within the pre-arm window
+#   IGNORE - EEW for another area (logged only)
+#
+# Reports come from azarashi (attributes) or from simulations (dicts with the same
+# or the short keys). Anything that cannot be read as an EEW keeps the old behavior.
+
+# Forecast regions that count as "our area" (names or codes, substring match).
+# Empty: every EEW is for our area.
+AREA_REGIONS = [r.strip() for r in os.environ.get("POWERTAP_EEW_REGIONS", "").split(",") if r.strip()]
+CUTOFF_INTENSITY = os.environ.get("POWERTAP_EEW_CUTOFF_INTENSITY", "5-") # Forecast intensity that cuts power at once
+
+CATEGORY_FIELDS = ("disaster_category", "category")
+INTENSITY_FIELDS = ("seismic_intensity_upper_limit", "seismic_intensity_lower_limit", "intensity")
+REGION_FIELDS = ("eew_forecast_regions", "forecast_regions", "regions")
+EEW_NAMES = ("eew", "earthquake early warning", "緊急地震速報")
+
+# JMA seismic intensity scale, weakest first
+INTENSITY_SCALE = ("0", "1", "2", "3", "4", "5-", "5+", "6-", "6+", "7")
+INTENSITY_ALIASES = {"5弱": "5-", "5強": "5+", "6弱": "6-", "6強": "6+", "5 lower": "5-", "5 upper": "5+",
+                     "6 lower": "6-", "6 upper": "6+"}
+
+ALERT = "ALERT"
+PREARM = "PREARM"
+IGNORE = "IGNORE"
+
+
+def _field(report, names):
+    for name in names:
+        value = report.get(name) if isinstance(report, dict) else getattr(report, name, None)
+        if value is not None:
+            return value
+    return None
+
+
+def intensity_rank(value):
+    """'震度5弱' / '5-' / 'Intensity 5 lower' -> index in INTENSITY_SCALE, None if unknown"""
+    if value is None:
+        return None
+    text = str(getattr(value, 'value', value)).lower().replace("震度", "").replace("intensity", "").strip()
+    text = INTENSITY_ALIASES.get(text, text)
+    return INTENSITY_SCALE.index(text) if text in INTENSITY_SCALE else None
+
+
+def is_eew(report):
+    category = _field(report, CATEGORY_FIELDS)
+    if category is None:
+        return False
+    text = str(getattr(category, 'value', category)).lower()
+    return any(name in text for name in EEW_NAMES)
+
+
+def for_our_area(report, regions=None):
+    regions = AREA_REGIONS if regions is None else regions
+    if not regions:
+        return True
+    forecast = _field(report, REGION_FIELDS)
+    if forecast is None:
+        return True # Region list unknown: assume ours
+    if isinstance(forecast, (str, bytes)):
+        forecast = [forecast]
+    names = [str(f) for f in forecast]
+    return any(region in name for region in regions for name in names)
+
+
+def classify(report, regions=None, cutoff_intensity=CUTOFF_INTENSITY):
+    if not is_eew(report):
+        return ALERT
+    if not for_our_area(report, regions):
+        return IGNORE
+    rank = intensity_rank(_field(report, INTENSITY_FIELDS))
+    if rank is None or rank >= INTENSITY_SCALE.index(cutoff_intensity):
+        return ALERT
+    return PREARM
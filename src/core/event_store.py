@@ -0,0 +1,291 @@
+import json
+import logging
+import os
+import struct
+import threading
+import time
+from collections import deque
+
+from src.core import metrics
+
+# Append-only event history (QZSS reports, IMU triggers, buttons, relays, states)
+# for incident review.
+#
+# record() only appends to an in-memory buffer. A writer thread encodes the
+# buffer as one batch every FLUSH_INTERVAL seconds (sooner for state changes),
+# appends it to the current segment file and fsyncs once per batch.
+#
+#   events-<first seq>.seg : records  seq u64 | time f64 | type u8 | len u16 | payload (JSON, utf-8)
+#   events-<first seq>.idx : one entry per batch  first_seq u64 | count u32 | offset u32 | length u32 |
+#                            t_min f64 | t_max f64 | type mask u32
+#
+# Queries use the (in-memory) index to skip batches outside the time range or
+# without the requested types. Events still in the buffer are included (with the
+# seqs the next flush will give them) without flushing: durability stays with the
+# writer's batches.
+
+EVENTS_DIR = os.environ.get("POWERTAP_EVENTS_DIR",
+                            os.path.join(os.path.expanduser("~"), ".local", "share", "qzss-powertap", "events"))
+FLUSH_INTERVAL = float(os.environ.get("POWERTAP_EVENTS_FLUSH", "5.0")) # Seconds between fsyncs
+SEGMENT_BYTES = 1 << 20   # Rotate segments at 1 MiB
+MAX_SEGMENTS = 32         # Oldest segments are deleted beyond this
+MAX_BUFFERED = 10000      # Unflushed events kept if the writer falls behind (oldest dropped)
+MAX_PAYLOAD = 4096
+QUERY_LIMIT_MAX = 1000
+
+RECORD = struct.Struct('<QdBH')
+INDEX_ENTRY = struct.Struct('<QIIIddI')
+
+EVENT_TYPES = {
+    'qzss': 1,   # DC Report received
+    'imu': 2,    # Shake threshold crossed
+    'button': 3, # Physical (or simulated) button press
+    'relay': 4,  # Relay states after a change
+    'state': 5,  # State machine transition
+    'imu_rate': 6, # Adaptive IMU sampling switched idle <-> active
+    'cutoff': 7, # Receipt / broadcast -> relay cutoff latency of a DC Report
+}
+EVENT_NAMES = {code: name for name, code in EVENT_TYPES.items()}
+
+RECORDED = metrics.REGISTRY.counter('powertap_events_recorded_total', 'Events appended to the event store buffer')
+DROPPED = metrics.REGISTRY.counter('powertap_events_dropped_total', 'Events dropped before reaching disk')
+FLUSH_TIME = metrics.REGISTRY.histogram('powertap_events_flush_seconds', 'Event batch write + fsync time')
+
+
+def _type_mask(types):
+    mask = 0
+    for name in types:
+        mask |= 1 << EVENT_TYPES[name]
+    return mask
+
+
+def _pack(seq, t, event_type, payload):
+    body = json.dumps(payload, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+    body = body[:MAX_PAYLOAD]
+    return RECORD.pack(seq, t, EVENT_TYPES[event_type], len(body)) + body
+
+
+class _Segment:
+    def __init__(self, directory, first_seq):
+        self.first_seq = first_seq
+        base = os.path.join(directory, f"events-{first_seq:012d}")
+        self.path = base + ".seg"
+        self.index_path = base + ".idx"
+        self.entries = [] # INDEX_ENTRY tuples
+        self.size = 0
+
+    def load(self):
+        """Read the index and drop anything a crash left half-written."""
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'rb') as f:
+                data = f.read()
+            usable = len(data) - len(data) % INDEX_ENTRY.size
+            self.entries = [INDEX_ENTRY.unpack_from(data, i) for i in range(0, usable, INDEX_ENTRY.size)]
+            if usable != len(data):
+                with open(self.index_path, 'r+b') as f:
+                    f.truncate(usable)
+        self.size = self.entries[-1][2] + self.entries[-1][3] if self.entries else 0
+        if os.path.exists(self.path) and os.path.getsize(self.path) != self.size:
+            with open(self.path, 'r+b') as f:
+                f.truncate(self.size)
+
+    def end_seq(self):
+        if not self.entries:
+            return self.first_seq
+        first, count = self.entries[-1][:2]
+        return first + count
+
+
+class EventStore:
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.buffer = None # deque once opened; record() is a no-op before that
+        self.time = time.time
+        self.directory = None
+        self.segments = []
+        self.next_seq = 1
+        self.io_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    # --- Hot path ---
+
+    def record(self, event_type, payload=None, urgent=False):
+        """
+        Queue one event. payload is any JSON-serializable value, encoded later by the writer.
+        urgent: flush soon instead of waiting for the batch interval (state changes).
+        """
+        buffer = self.buffer
+        if buffer is None:
+            return
+        if len(buffer) == buffer.maxlen:
+            DROPPED.inc()
+        buffer.append((self.time(), event_type, payload))
+        RECORDED.inc()
+        if urgent:
+            self.wake.set()
+
+    # --- Lifecycle ---
+
+    def open(self, directory=EVENTS_DIR):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        for name in sorted(os.listdir(directory)):
+            if name.startswith("events-") and name.endswith(".seg"):
+                segment = _Segment(directory, int(name[7:-4]))
+                segment.load()
+                self.segments.append(segment)
+        if self.segments:
+            self.next_seq = self.segments[-1].end_seq()
+        else:
+            self.segments.append(_Segment(directory, self.next_seq))
+        self.buffer = deque(maxlen=MAX_BUFFERED)
+        self.thread = threading.Thread(target=self._writer_loop, name="event-store", daemon=True)
+        self.thread.start()
+        self.logger.info(f"Event store: {directory} ({len(self.segments)} segments, next seq {self.next_seq})")
+
+    def close(self):
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        self.wake.set()
+        self.thread.join()
+        self.thread = None
+        self.flush()
+
+    def _writer_loop(self):
+        while not self.stop_event.is_set():
+            self.wake.wait(FLUSH_INTERVAL)
+            self.wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                self.logger.error(f"Event store write failed: {e}")
+
+    # --- Writer ---
+
+    def flush(self):
+        with self.io_lock:
+            batch = []
+            while self.buffer:
+                batch.append(self.buffer.popleft())
+            if not batch:
+                return
+            t0 = time.perf_counter()
+
+            data = bytearray()
+            mask = 0
+            for t, event_type, payload in batch:
+                data += _pack(self._take_seq(), t, event_type, payload)
+                mask |= 1 << EVENT_TYPES[event_type]
+
+            segment = self.segments[-1]
+            entry = (self.next_seq - len(batch), len(batch), segment.size, len(data),
+                     min(t for t, _, _ in batch), max(t for t, _, _ in batch), mask)
+            with open(segment.path, 'ab') as f:
+                f.truncate(segment.size) # Drop the tail of a failed earlier write
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            with open(segment.index_path, 'ab') as f:
+                f.write(INDEX_ENTRY.pack(*entry))
+                f.flush()
+                os.fsync(f.fileno())
+            segment.entries.append(entry)
+            segment.size += len(data)
+            FLUSH_TIME.observe(time.perf_counter() - t0)
+
+            if segment.size >= SEGMENT_BYTES:
+                self._rotate()
+
+    def _take_seq(self):
+        seq = self.next_seq
+        self.next_seq += 1
+        return seq
+
+    def _rotate(self):
+        self.segments.append(_Segment(self.directory, self.next_seq))
+        while len(self.segments) > MAX_SEGMENTS:
+            old = self.segments.pop(0)
+            for path in (old.path, old.index_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    # --- Queries ---
+
+    def query(self, start=None, end=None, types=None, after_seq=0, limit=100):
+        """
+        Events with start <= time <= end (epoch seconds) of the given type names,
+        in sequence order, after `after_seq`. Returns {'events': [...], 'next_after_seq': seq or None}.
+        """
+        limit = max(1, min(int(limit), QUERY_LIMIT_MAX))
+        mask = _type_mask(types) if types else ~0
+
+        def wanted(event):
+            return (event['seq'] > after_seq and (1 << EVENT_TYPES[event['type']]) & mask
+                    and (start is None or event['time'] >= start) and (end is None or event['time'] <= end))
+
+        events = []
+        with self.io_lock:
+            for segment in self.segments:
+                if segment.end_seq() <= after_seq:
+                    continue
+                candidates = [e for e in segment.entries
+                              if e[0] + e[1] > after_seq and e[6] & mask
+                              and (start is None or e[5] >= start) and (end is None or e[4] <= end)]
+                if not candidates:
+                    continue
+                with open(segment.path, 'rb') as f:
+                    for _, _, offset, length, _, _, _ in candidates:
+                        f.seek(offset)
+                        for event in self._decode(f.read(length)):
+                            if wanted(event):
+                                events.append(event)
+                                if len(events) == limit:
+                                    return {'events': events, 'next_after_seq': event['seq']}
+            # Not flushed yet: flush() runs under io_lock and numbers the buffer from next_seq
+            pending = list(self.buffer or ())
+            first_seq = self.next_seq
+        data = b"".join(_pack(first_seq + i, t, event_type, payload)
+                        for i, (t, event_type, payload) in enumerate(pending))
+        for event in self._decode(data):
+            if wanted(event):
+                events.append(event)
+                if len(events) == limit:
+                    return {'events': events, 'next_after_seq': event['seq']}
+        return {'events': events, 'next_after_seq': None}
+
+    def _decode(self, data):
+        pos = 0
+        while pos + RECORD.size <= len(data):
+            seq, t, code, length = RECORD.unpack_from(data, pos)
+            pos += RECORD.size
+            body = data[pos:pos + length]
+            pos += length
+            try:
+                payload = json.loads(body.decode('utf-8'))
+            except ValueError:
+                payload = body.decode('utf-8', errors='replace') # Truncated payload
+            yield {'seq': seq, 'time': t, 'type': EVENT_NAMES.get(code, str(code)), 'payload': payload}
+
+    def http_query(self, params):
+        """Handler for the local HTTP endpoint: /events?start=&end=&types=qzss,state&after_seq=&limit="""
+        def number(name):
+            value = params.get(name)
+            return float(value) if value not in (None, "") else None
+
+        types = [t for t in params.get("types", "").split(",") if t]
+        unknown = [t for t in types if t not in EVENT_TYPES]
+        if unknown:
+            return 400, {'error': f"unknown types: {','.join(unknown)}", 'types': list(EVENT_TYPES)}
+        return 200, self.query(start=number("start"), end=number("end"), types=types,
+                               after_seq=int(params.get("after_seq") or 0),
+                               limit=params.get("limit") or 100)
+
+
+STORE = EventStore()
+
+
+def record(event_type, payload=None, urgent=False):
+    STORE.record(event_type, payload, urgent)
@@ -0,0 +1,226 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+from src.core import metrics
+
+# Logging off the hot paths:
+#   - The root logger only has a QueueHandler (+ the in-memory ring). Callers pay
+#     for a LogRecord and a queue put; formatting and the stderr / SD card write
+#     happen on the listener thread.
+#   - Records are not pre-formatted (QueueHandler.prepare normally does that on the
+#     caller's thread). Log with %-style args and do not mutate them afterwards.
+#   - Per-logger token bucket below WARNING: bursts (relay spam, control floods)
+#     are cut to LOG_RATE records/s; the next record that passes notes how many
+#     were suppressed. WARNING and above are never rate limited.
+#   - A full queue drops DEBUG / INFO records. WARNING and above wait up to
+#     URGENT_PUT_TIMEOUT for room, then are written on the caller's thread to
+#     every output that is not blocked.
+#   - The ring keeps the last RING_SIZE records (before rate limiting) for crash dumps.
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+LOG_LEVEL = os.environ.get("POWERTAP_LOG_LEVEL", "INFO").upper()
+LOG_FILE = os.environ.get("POWERTAP_LOG_FILE")   # Optional file (in addition to stderr)
+LOG_RATE = float(os.environ.get("POWERTAP_LOG_RATE", "20"))   # Records/s per logger below WARNING (0 = unlimited)
+LOG_BURST = 50            # Token bucket size
+QUEUE_SIZE = 10000        # Records waiting for the writer; newest dropped beyond this (below WARNING)
+URGENT_PUT_TIMEOUT = 0.1  # Seconds a WARNING+ record waits for queue room before it is written directly
+RING_SIZE = int(os.environ.get("POWERTAP_LOG_RING", "2000"))
+CRASH_DIR = os.environ.get("POWERTAP_CRASH_DIR",
+                           os.path.join(os.path.expanduser("~"), ".local", "share", "qzss-powertap", "crash"))
+
+DROPPED = metrics.REGISTRY.counter('powertap_log_dropped_total', 'Log records dropped (writer queue full)')
+SUPPRESSED = metrics.REGISTRY.counter('powertap_log_suppressed_total', 'Log records dropped by rate limiting')
+
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket per logger name for records below WARNING."""
+
+    def __init__(self, rate=LOG_RATE, burst=LOG_BURST):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {} # name -> [tokens, last refill, suppressed]
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if self.rate <= 0 or record.levelno >= logging.WARNING:
+            return True
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get(record.name)
+            if bucket is None:
+                bucket = self.buckets[record.name] = [self.burst, now, 0]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                SUPPRESSED.inc()
+                return False
+            bucket[0] -= 1
+            suppressed, bucket[2] = bucket[2], 0
+        if suppressed:
+            record.msg = f"{record.msg} (+{suppressed} suppressed)"
+        return True
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, log_queue, outputs):
+        super().__init__(log_queue)
+        self.outputs = outputs # The listener's handlers (direct writes when the queue stays full)
+
+    def prepare(self, record):
+        return record # Formatted by the listener thread
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            if record.levelno < logging.WARNING:
+                DROPPED.inc()
+                return
+        try:
+            self.queue.put(record, timeout=URGENT_PUT_TIMEOUT)
+        except queue.Full:
+            # Writer stuck: write here (out of order) rather than lose a warning or error.
+            # Outputs the writer is blocked in keep their lock: skip those after a timeout.
+            written = False
+            for handler in self.outputs:
+                if record.levelno < handler.level or not handler.filter(record):
+                    continue
+                if handler.lock.acquire(timeout=URGENT_PUT_TIMEOUT):
+                    try:
+                        handler.emit(record)
+                        written = True
+                    finally:
+                        handler.lock.release()
+            if not written:
+                DROPPED.inc()
+
+
+class _Listener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel) # Waits for room: stop() drains a full queue instead of failing
+
+
+class RingBufferHandler(logging.Handler):
+    """Last `capacity` records in memory (formatted only when dumped)."""
+
+    def __init__(self, capacity=RING_SIZE):
+        super().__init__()
+        self.records = deque(maxlen=capacity)
+
+    def emit(self, record):
+        self.records.append(record)
+
+    def handle(self, record):
+        # No handler lock needed: deque.append is atomic
+        if self.filter(record):
+            self.emit(record)
+        return record
+
+    def dump(self, stream):
+        formatter = self.formatter or logging.Formatter(LOG_FORMAT)
+        for record in list(self.records):
+            try:
+                stream.write(formatter.format(record) + "\n")
+            except Exception:
+                stream.write(f"{record.name} {record.levelname} {record.msg!r} {record.args!r}\n")
+
+
+_state = {}
+
+
+def setup(level=LOG_LEVEL, fmt=LOG_FORMAT, log_file=LOG_FILE, outputs=None, rate=LOG_RATE):
+    """
+    Install the queue + ring handlers on the root logger and start the writer thread.
+    outputs: handlers run by the writer (default: stderr + LOG_FILE).
+    """
+    if _state:
+        return
+    formatter = logging.Formatter(fmt)
+    if outputs is None:
+        outputs = [logging.StreamHandler()]
+        if log_file:
+            outputs.append(logging.FileHandler(log_file, encoding="utf-8"))
+    for handler in outputs:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(maxsize=QUEUE_SIZE)
+    queue_handler = _NonBlockingQueueHandler(log_queue, outputs)
+    queue_handler.addFilter(RateLimitFilter(rate))
+    ring = RingBufferHandler()
+    ring.setFormatter(formatter)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.setLevel(level)
+    root.addHandler(ring)
+    root.addHandler(queue_handler)
+    metrics.REGISTRY.gauge('powertap_log_queue_depth', 'Log records waiting for the writer', fn=log_queue.qsize)
+
+    listener = _Listener(log_queue, *outputs, respect_handler_level=True)
+    listener.start()
+    _state.update(listener=listener, ring=ring)
+    _install_crash_hooks()
+    atexit.register(shutdown)
+
+
+def shutdown():
+    """Flush queued records and stop the writer thread."""
+    _state.pop('ring', None)
+    listener = _state.pop('listener', None)
+    if listener:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.flush()
+
+
+def dump_ring(reason="dump", directory=CRASH_DIR):
+    """Write the in-memory records to <directory>/<reason>-<time>.log. Returns the path (None if no ring)."""
+    ring = _state.get('ring')
+    if ring is None:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{reason}-{time.strftime('%Y%m%d-%H%M%S')}.log")
+    with open(path, "w", encoding="utf-8") as f:
+        ring.dump(f)
+    return path
+
+
+def _install_crash_hooks():
+    previous_hook = sys.excepthook
+    previous_thread_hook = threading.excepthook
+
+    def dump(exc_type, exc, tb, where):
+        try:
+            path = dump_ring("crash")
+            if path:
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write(f"--- Unhandled exception in {where} ---\n")
+                    f.writelines(traceback.format_exception(exc_type, exc, tb))
+                sys.stderr.write(f"Last {RING_SIZE} log records written to {path}\n")
+        except Exception as e:
+            sys.stderr.write(f"Crash dump failed: {e}\n")
+
+    def excepthook(exc_type, exc, tb):
+        dump(exc_type, exc, tb, "main thread")
+        previous_hook(exc_type, exc, tb)
+
+    def thread_excepthook(args):
+        if args.exc_type is not SystemExit:
+            dump(args.exc_type, args.exc_value, args.exc_traceback,
+                 f"thread {args.thread.name if args.thread else '?'}")
+        previous_thread_hook(args)
+
+    sys.excepthook = excepthook
+    threading.excepthook = thread_excepthook
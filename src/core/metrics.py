@@ -0,0 +1,282 @@
+import bisect
+import json
+import logging
+import os
+import threading
+from urllib.parse import urlsplit, parse_qsl
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# In-process metrics: counters, gauges and fixed-bucket histograms.
+# Updates never take a lock: every thread writes its own cell and readers sum
+# the cells (item stores are atomic under the GIL). Only metric creation and a
+# thread's first write are locked, so create metrics once (module level / __init__).
+# Cells of exited threads (timers, HTTP request threads) are folded into a
+# retired total, so the cell list stays as long as the live writer threads.
+
+# Local Prometheus endpoint (text format 0.0.4). Port 0 disables it.
+METRICS_HOST = os.environ.get("POWERTAP_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("POWERTAP_METRICS_PORT", "9108"))
+
+# Seconds; covers decode / cutoff (sub-ms) up to slow GUI frames
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+class _PerThreadCells:
+    def __init__(self, size):
+        self.size = size
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.cells = [] # (thread, cell) per writer thread
+        self.retired = [0] * size # Sum of the cells of exited threads
+
+    def cell(self):
+        try:
+            return self.local.cell
+        except AttributeError:
+            cell = [0] * self.size
+            self.local.cell = cell
+            with self.lock:
+                self._retire()
+                self.cells.append((threading.current_thread(), cell))
+            return cell
+
+    def _retire(self):
+        """Fold the cells of exited threads into `retired` (lock held). They no longer write."""
+        live = []
+        for thread, cell in self.cells:
+            if thread.is_alive():
+                live.append((thread, cell))
+            else:
+                for i, value in enumerate(cell):
+                    self.retired[i] += value
+        self.cells = live
+
+    def totals(self):
+        with self.lock:
+            self._retire()
+            totals = list(self.retired)
+            for _, cell in self.cells:
+                for i, value in enumerate(cell):
+                    totals[i] += value
+        return totals
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self):
+        self.cells = _PerThreadCells(1)
+
+    def inc(self, amount=1):
+        self.cells.cell()[0] += amount
+
+    def value(self):
+        return self.cells.totals()[0]
+
+
+class Gauge:
+    """Last value set, or fn() evaluated at read time."""
+    kind = "gauge"
+
+    def __init__(self, fn=None):
+        self.fn = fn
+        self.current = 0
+
+    def set(self, value):
+        self.current = value
+
+    def value(self):
+        if self.fn is not None:
+            try:
+                return self.fn()
+            except Exception:
+                return float("nan")
+        return self.current
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        # Per thread: one count per bucket + overflow (+Inf), then sum, count
+        self.cells = _PerThreadCells(len(self.buckets) + 3)
+
+    def observe(self, value):
+        cell = self.cells.cell()
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-2] += value
+        cell[-1] += 1
+
+    def value(self):
+        """(cumulative bucket counts incl. +Inf, sum, count)"""
+        totals = self.cells.totals()
+        cumulative = []
+        running = 0
+        for n in totals[:-2]:
+            running += n
+            cumulative.append(running)
+        return cumulative, totals[-2], totals[-1]
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (None if empty)."""
+        cumulative, _, count = self.value()
+        if count == 0:
+            return None
+        for bound, n in zip(self.buckets, cumulative):
+            if n >= q * count:
+                return bound
+        return float("inf")
+
+
+def _label_str(labels, extra=None):
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+def _format(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if value != value:
+        return "NaN"
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _json_safe(value):
+    # JSON has no Infinity / NaN
+    if isinstance(value, float):
+        if value != value:
+            return None
+        if value == float("inf"):
+            return "+Inf"
+    return value
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.families = {} # name -> [kind, help, {labels: metric}]
+
+    def _get(self, cls, name, help, labels, **kwargs):
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self.lock:
+            family = self.families.setdefault(name, [cls.kind, help, {}])
+            if family[0] != cls.kind:
+                raise ValueError(f"Metric {name} already registered as {family[0]}")
+            metric = family[2].get(key)
+            if metric is None:
+                metric = family[2][key] = cls(**kwargs)
+            return metric
+
+    def counter(self, name, help="", **labels):
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name, help="", fn=None, **labels):
+        gauge = self._get(Gauge, name, help, labels)
+        if fn is not None:
+            gauge.fn = fn # Latest owner wins (e.g. a reconnected client)
+        return gauge
+
+    def histogram(self, name, help="", buckets=DEFAULT_BUCKETS, **labels):
+        return self._get(Histogram, name, help, labels, buckets=buckets)
+
+    def _items(self):
+        with self.lock:
+            return [(name, kind, help, list(series.items()))
+                    for name, (kind, help, series) in sorted(self.families.items())]
+
+    def render(self):
+        """Prometheus text exposition format."""
+        lines = []
+        for name, kind, help, series in self._items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, metric in series:
+                if kind == "histogram":
+                    cumulative, total, count = metric.value()
+                    bounds = [_format(b) for b in metric.buckets] + ["+Inf"]
+                    for bound, n in zip(bounds, cumulative):
+                        lines.append(f"{name}_bucket{_label_str(labels, ('le', bound))} {n}")
+                    lines.append(f"{name}_sum{_label_str(labels)} {_format(total)}")
+                    lines.append(f"{name}_count{_label_str(labels)} {count}")
+                else:
+                    lines.append(f"{name}{_label_str(labels)} {_format(metric.value())}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """Compact JSON-friendly view for the web UI: {'name{labels}': value}."""
+        out = {}
+        for name, kind, _, series in self._items():
+            for labels, metric in series:
+                key = name + _label_str(labels)
+                if kind == "histogram":
+                    _, total, count = metric.value()
+                    out[key] = {
+                        'count': count,
+                        'sum': total,
+                        'p50': _json_safe(metric.quantile(0.5)),
+                        'p99': _json_safe(metric.quantile(0.99)),
+                    }
+                else:
+                    out[key] = _json_safe(metric.value())
+        return out
+
+
+REGISTRY = MetricsRegistry()
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+    routes = {} # Extra GET endpoints: path -> fn(params) -> (status, JSON-able body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/metrics":
+            self._reply(200, "text/plain; version=0.0.4; charset=utf-8", self.registry.render())
+            return
+        route = self.routes.get(url.path)
+        if route is None:
+            self.send_error(404)
+            return
+        try:
+            status, body = route(dict(parse_qsl(url.query)))
+        except (ValueError, KeyError) as e:
+            status, body = 400, {'error': str(e)}
+        self._reply(status, "application/json; charset=utf-8", json.dumps(body, ensure_ascii=False))
+
+    def _reply(self, status, content_type, text):
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # Scrapes are not worth a log line
+
+
+def serve(registry=REGISTRY, host=METRICS_HOST, port=METRICS_PORT, routes=None):
+    """
+    Start the local HTTP endpoint (/metrics + extra `routes`) in a daemon thread.
+    Returns the server (None if disabled/failed).
+    """
+    logger = logging.getLogger(__name__)
+    if not port:
+        return None
+    handler = type("MetricsRequestHandler", (_MetricsRequestHandler,),
+                   {"registry": registry, "routes": dict(routes or {})})
+    try:
+        server = ThreadingHTTPServer((host, port), handler)
+    except OSError as e:
+        logger.warning(f"Metrics endpoint disabled: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"Metrics: http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,111 @@
+import struct
+import time
+from multiprocessing import shared_memory, resource_tracker
+
+# Fixed-layout status block shared by the core process (single writer) and the
+# GUI / network processes (readers). A sequence counter makes reads consistent:
+# odd while the writer is updating, readers retry until they see the same even value.
+# A writer that attaches (e.g. a restarted core) rounds the counter up to even first:
+# the previous one may have died mid-update and left it odd.
+#
+#   seq u32 | version u32 | state u8 | relays u8 (bit n-1 = relay n) | imu_mock u8 | qz1_port u8 |
+#   updated_at f64 | imu_last f64 | qz1_last f64 | gnss_offset f64 | msg_len u16 | alert_message (utf-8)
+#
+# Times are time.monotonic() (system-wide). gnss_offset: GNSS time - monotonic, 0 while not synced.
+HEADER = struct.Struct('<IIBBBBddddH')
+MESSAGE_SIZE = 512
+BLOCK_SIZE = HEADER.size + MESSAGE_SIZE
+
+SEQ_MASK = 0xFFFFFFFF
+READ_RETRIES = 1000       # Attempts before read() gives up on a block stuck mid-update
+READ_BACKOFF = 0.0001     # Seconds between attempts (after the first immediate retry)
+
+RELAY_COUNT = 4
+STATES = ("BOOT", "NORMAL", "ALERT", "RECOVERY", "PREARM")
+STATE_CODES = {name: i for i, name in enumerate(STATES)}
+
+
+class SharedStatusBlock:
+    def __init__(self, name=None, create=False, writer=False):
+        """writer: attach as the single writer (core process)"""
+        if create:
+            self.shm = shared_memory.SharedMemory(create=True, size=BLOCK_SIZE)
+            self.shm.buf[:BLOCK_SIZE] = bytes(BLOCK_SIZE)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            # Only the creator owns the segment (Python < 3.13 would unlink it when a reader exits)
+            try:
+                resource_tracker.unregister(self.shm._name, 'shared_memory')
+            except Exception:
+                pass
+        self.name = self.shm.name
+        self.owner = create
+        self.version = 0
+        self.last = None # Last consistent read() snapshot
+        self.seq = None
+        if writer:
+            seq = struct.unpack_from('<I', self.shm.buf, 0)[0]
+            self.seq = ((seq | 1) + 1) & SEQ_MASK # Even, above anything a reader has seen
+            struct.pack_into('<I', self.shm.buf, 0, self.seq)
+
+    def write(self, state, relays, alert_message, imu_mock=False, qz1_port_open=False,
+              imu_last=0.0, qz1_last=0.0, gnss_offset=None):
+        """Single writer only (core process, attached with writer=True)."""
+        buf = self.shm.buf
+        seq = self.seq
+        struct.pack_into('<I', buf, 0, seq + 1) # Odd: update in progress
+
+        self.version += 1
+        bits = 0
+        for relay_id, on in relays.items():
+            if on:
+                bits |= 1 << (int(relay_id) - 1)
+        msg = alert_message.encode('utf-8')[:MESSAGE_SIZE]
+        HEADER.pack_into(buf, 0, seq + 1, self.version, STATE_CODES.get(state, 0), bits,
+                         int(imu_mock), int(qz1_port_open), time.monotonic(),
+                         imu_last or 0.0, qz1_last or 0.0, gnss_offset or 0.0, len(msg))
+        buf[HEADER.size:HEADER.size + len(msg)] = msg
+
+        self.seq = (seq + 2) & SEQ_MASK
+        struct.pack_into('<I', buf, 0, self.seq) # Even: consistent
+
+    def read(self):
+        """
+        Returns a dict snapshot (retries while the writer is mid-update). If the block
+        stays inconsistent (writer died mid-update), returns the last good snapshot,
+        or raises TimeoutError if there is none.
+        """
+        buf = self.shm.buf
+        for attempt in range(READ_RETRIES):
+            fields = HEADER.unpack_from(buf, 0)
+            seq = fields[0]
+            if not seq & 1:
+                msg = bytes(buf[HEADER.size:HEADER.size + min(fields[10], MESSAGE_SIZE)])
+                if struct.unpack_from('<I', buf, 0)[0] == seq:
+                    self.last = self._snapshot(fields, msg)
+                    return self.last
+            time.sleep(READ_BACKOFF if attempt else 0)
+        if self.last is None:
+            raise TimeoutError("Shared status block stuck mid-update")
+        return self.last
+
+    @staticmethod
+    def _snapshot(fields, msg):
+        _, version, state, bits, imu_mock, qz1_port, updated_at, imu_last, qz1_last, gnss_offset, _ = fields
+        return {
+            'version': version,
+            'current_state': STATES[state] if state < len(STATES) else "BOOT",
+            'relays': {i: bool(bits & (1 << (i - 1))) for i in range(1, RELAY_COUNT + 1)},
+            'alert_message': msg.decode('utf-8', errors='ignore'),
+            'imu_mock': bool(imu_mock),
+            'qz1_port_open': bool(qz1_port),
+            'updated_at': updated_at,
+            'imu_last': imu_last or None,
+            'qz1_last': qz1_last or None,
+            'gnss_offset': gnss_offset or None,
+        }
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
@@ -1,9 +1,37 @@
 import logging
+import os
 import time
+import threading
+
+from src.core import eew, event_store, metrics
+
+# EEW pre-arm: seconds to stay in PREARM (sensitive IMU, cutoff primed) without shaking
+PREARM_WINDOW = float(os.environ.get("POWERTAP_PREARM_WINDOW", "90"))
+
+TRANSITIONS = {
+    state: metrics.REGISTRY.counter('powertap_state_transitions_total', 'State transitions by target state', to=state)
+    for state in ("BOOT", "NORMAL", "PREARM", "ALERT", "RECOVERY")
+}
+CUTOFF_TIME = {
+    source: metrics.REGISTRY.histogram('powertap_trigger_to_cutoff_seconds',
+                                       'Trigger (report / shake / test button) to all relays off', source=source)
+    for source in ("qz1", "imu", "button")
+}
+PREARM_OUTCOMES = {
+    outcome: metrics.REGISTRY.counter('powertap_prearm_total', 'EEW pre-arm windows by outcome', outcome=outcome)
+    for outcome in ("cutoff", "expired", "reset")
+}
+# DC Reports stamped by the QZ1 reader (see src/hw/gnss_clock.py)
+RECEIPT_TO_CUTOFF = metrics.REGISTRY.histogram('powertap_receipt_to_cutoff_seconds',
+                                               'DC Report sentence received to all relays off (local clock)')
+BROADCAST_TO_CUTOFF = metrics.REGISTRY.histogram('powertap_broadcast_to_cutoff_seconds',
+                                                 'DC Report broadcast by the satellite to all relays off (GNSS time)',
+                                                 buckets=(1.0, 1.1, 1.2, 1.3, 1.5, 2.0, 3.0, 5.0, 10.0)) # >= one L1S message
 
 class StateMachine:
     STATE_BOOT = "BOOT"
     STATE_NORMAL = "NORMAL"
+    STATE_PREARM = "PREARM"
     STATE_ALERT = "ALERT"
     STATE_RECOVERY = "RECOVERY"
 
@@ -16,7 +44,11 @@ class StateMachine:
 
         self.current_state = self.STATE_BOOT
         self.alert_message = ""
+        self.prearm_timer = None
+        self.prearm_until = None
         self.running = True
+        # Serializes transitions with NORMAL-only relay group updates
+        self.lock = threading.RLock()
 
     def start(self):
         self.logger.info("Core Logic Started")
@@ -29,47 +61,150 @@ class StateMachine:
 
     def stop(self):
         self.running = False
+        if self.prearm_timer:
+            self.prearm_timer.cancel()
         self.qz1.stop()
         self.imu.stop_monitoring()
         self.audio.stop_alarm()
         self.power.all_off() # Monitor specific behavior? keep running or cut?
 
-    def _transition_to(self, new_state):
-        self.logger.info(f"Transition: {self.current_state} -> {new_state}")
-        self.current_state = new_state
+    def gnss_time(self):
+        """UTC epoch seconds from the receiver's GNSS time, or None while not synced."""
+        return self.qz1.gnss.now()
+
+    def get_sensor_health(self):
+        return {
+            'qz1': self.qz1.get_health(),
+            'imu': self.imu.get_health(),
+        }
+
+    def apply_relay_batch(self, states):
+        """
+        Apply a relay group update atomically, only in NORMAL state.
+        Returns False (nothing applied) if not in NORMAL.
+        """
+        with self.lock:
+            if self.current_state != self.STATE_NORMAL:
+                return False
+            self.power.set_relays(states)
+            return True
+
+    def _transition_to(self, new_state, trigger=None, stamp=None):
+        """
+        trigger: (source, time.perf_counter() at the trigger) for ALERT, to time the cutoff
+        stamp: GNSS stamp of the DC Report that caused the ALERT (QZ1Handler)
+        """
+        with self.lock:
+            previous = self.current_state
+            self.logger.info("Transition: %s -> %s", previous, new_state)
+            event_store.record('state', {'from': previous, 'to': new_state}, urgent=True)
+            self.current_state = new_state
+            TRANSITIONS[new_state].inc()
+            if previous == self.STATE_PREARM:
+                self._end_prearm()
+
+            if new_state == self.STATE_NORMAL:
+                if previous != self.STATE_PREARM: # Relays stayed as they were while pre-armed
+                    self.power.all_on() # Restore power
+                self.audio.stop_alarm()
+                self.alert_message = ""
 
-        if new_state == self.STATE_NORMAL:
-            self.power.all_on() # Restore power
-            self.audio.stop_alarm()
-            self.alert_message = ""
+            elif new_state == self.STATE_PREARM:
+                self.imu.prearm() # Full rate, sensitive threshold: the next shake cuts off
+                self._start_prearm_window()
 
-        elif new_state == self.STATE_ALERT:
-            self.power.all_off() # SAFETY CUTOFF
-            self.audio.start_alarm()
+            elif new_state == self.STATE_ALERT:
+                self.power.all_off() # SAFETY CUTOFF
+                if trigger:
+                    source, triggered_at = trigger
+                    CUTOFF_TIME[source].observe(time.perf_counter() - triggered_at)
+                if stamp:
+                    self._record_cutoff_latency(stamp)
+                if previous == self.STATE_PREARM:
+                    PREARM_OUTCOMES["cutoff"].inc()
+                self.audio.start_alarm()
 
-        elif new_state == self.STATE_RECOVERY:
-            # Maybe waiting for confirmation
+            elif new_state == self.STATE_RECOVERY:
+                # Maybe waiting for confirmation
+                self._transition_to(self.STATE_NORMAL)
+
+    # --- EEW pre-arm ---
+
+    def _start_prearm_window(self):
+        """(Re)start the pre-arm window; a follow-up EEW extends it."""
+        if self.prearm_timer:
+            self.prearm_timer.cancel()
+        clock = self.qz1.clock
+        self.prearm_until = clock.monotonic() + PREARM_WINDOW
+        self.prearm_timer = clock.call_later(PREARM_WINDOW, self._prearm_expired)
+
+    def _end_prearm(self):
+        if self.prearm_timer:
+            self.prearm_timer.cancel()
+            self.prearm_timer = None
+        self.imu.disarm()
+
+    def _prearm_expired(self):
+        with self.lock:
+            if self.current_state != self.STATE_PREARM or self.qz1.clock.monotonic() < self.prearm_until:
+                return # Cut off, reset or extended meanwhile
+            self.logger.info(f"Pre-arm window ({PREARM_WINDOW:.0f}s) ended without shaking")
+            PREARM_OUTCOMES["expired"].inc()
             self._transition_to(self.STATE_NORMAL)
 
-    def on_qz1_message(self, report):
-        self.logger.info(f"QZ1 Report: {report}")
-        # Logic to determine if report is urgent
-        # For now, treat any report as alert trigger
+    def _record_cutoff_latency(self, stamp):
+        """Receipt -> cutoff and (once GNSS time is known) satellite broadcast -> cutoff."""
+        cutoff_at = self.qz1.clock.monotonic()
+        latency = {'broadcast': stamp.get('broadcast'), 'receipt_to_cutoff': cutoff_at - stamp['received']}
+        RECEIPT_TO_CUTOFF.observe(latency['receipt_to_cutoff'])
+        cutoff_gnss = self.qz1.gnss.now_at(cutoff_at)
+        if cutoff_gnss is not None and stamp.get('broadcast') is not None:
+            latency['broadcast_to_cutoff'] = cutoff_gnss - stamp['broadcast']
+            BROADCAST_TO_CUTOFF.observe(latency['broadcast_to_cutoff'])
+        event_store.record('cutoff', latency)
+        self.logger.info("Cutoff latency: %s", latency)
+
+    def on_qz1_message(self, report, stamp=None):
+        """stamp: {'received', 'received_gnss', 'broadcast'} from QZ1Handler (None for simulated reports)"""
+        triggered_at = time.perf_counter()
+        event_store.record('qzss', {'report': report, 'stamp': stamp}) # Formatted by the writer thread
+        self.logger.info("QZ1 Report: %s", report)
+        action = eew.classify(report)
+        if action == eew.IGNORE:
+            self.logger.info("EEW for another area: no action")
+            return
+        if action == eew.PREARM:
+            with self.lock:
+                if self.current_state == self.STATE_NORMAL:
+                    self.alert_message = f"緊急地震速報 (揺れに警戒): {report}"
+                    self._transition_to(self.STATE_PREARM)
+                elif self.current_state == self.STATE_PREARM:
+                    self._start_prearm_window()
+            return
+        # Strong EEW for our area, or any other report: cut off now
         self.alert_message = f"QZSS受信: {report}"
         if self.current_state != self.STATE_ALERT:
-            self._transition_to(self.STATE_ALERT)
+            self._transition_to(self.STATE_ALERT, trigger=("qz1", triggered_at), stamp=stamp)
 
     def on_imu_shake(self, g_force):
-        self.logger.info(f"IMU Shake: {g_force:.2f}G")
+        triggered_at = time.perf_counter()
+        event_store.record('imu', g_force)
+        self.logger.info("IMU Shake: %.2fG", g_force)
         if self.current_state != self.STATE_ALERT:
              self.alert_message = f"強い揺れを検知! ({g_force:.1f}G)"
-             self._transition_to(self.STATE_ALERT)
+             self._transition_to(self.STATE_ALERT, trigger=("imu", triggered_at))
 
     def on_button_press(self, btn_id):
-        self.logger.info(f"Button {btn_id} pressed")
+        triggered_at = time.perf_counter()
+        event_store.record('button', btn_id)
+        self.logger.info("Button %s pressed", btn_id)
         # Button 1: Reset / Recovery (Any state)
         if btn_id == 1:
-            if self.current_state == self.STATE_ALERT:
+            if self.current_state == self.STATE_PREARM:
+                self.logger.info("Pre-arm cancelled")
+                PREARM_OUTCOMES["reset"].inc()
+                self._transition_to(self.STATE_NORMAL)
+            elif self.current_state == self.STATE_ALERT:
                 self.logger.info("Manual Reset Triggered")
                 self._transition_to(self.STATE_RECOVERY)
             elif self.current_state == self.STATE_RECOVERY:
@@ -88,4 +223,4 @@ class StateMachine:
         if self.current_state == self.STATE_NORMAL:
             if btn_id == 5: # Test Alert
                 self.alert_message = "テスト警報 (ボタン5)"
-                self._transition_to(self.STATE_ALERT)
+                self._transition_to(self.STATE_ALERT, trigger=("button", triggered_at))
@@ -0,0 +1,367 @@
+import logging
+import multiprocessing
+import os
+import secrets
+import threading
+import time
+from multiprocessing.connection import Listener, Client, wait
+
+from src.core import event_store, log_setup, metrics
+from src.core.shared_status import SharedStatusBlock
+
+# Supervisor mode: the safety core (QZ1, IMU, StateMachine, RelayController)
+# runs in its own high-priority process. GUI and network run in separate
+# processes that read the shared status block and send commands over a
+# local connection, so their GIL contention cannot delay sampling/cutoff.
+
+LOG_FORMAT = '%(asctime)s - %(processName)s - %(name)s - %(levelname)s - %(message)s'
+CORE_RT_PRIORITY = 50   # SCHED_FIFO priority if permitted
+CORE_NICE = -10         # Fallback when real-time scheduling is not permitted
+STATUS_REFRESH = 0.1    # Seconds between periodic status block refreshes (health, message)
+WATCH_INTERVAL = 0.02   # Network process: status block poll interval
+CORE_READY_TIMEOUT = 30.0
+RESTART_DELAY = 1.0
+
+# Each process serves its own /metrics: core on POWERTAP_METRICS_PORT, then GUI, network
+METRICS_PORT_OFFSETS = {"core": 0, "gui": 1, "network": 2}
+
+# Commands accepted from GUI / network processes
+POWER_COMMANDS = ('set_relay', 'set_relays', 'toggle')
+SM_COMMANDS = ('on_button_press', 'on_qz1_message', 'on_imu_shake', 'apply_relay_batch')
+
+
+def _metrics_port(process):
+    return metrics.METRICS_PORT + METRICS_PORT_OFFSETS[process] if metrics.METRICS_PORT else 0
+
+
+def _raise_priority(logger):
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(CORE_RT_PRIORITY))
+        logger.info(f"Core process: SCHED_FIFO priority {CORE_RT_PRIORITY}")
+        return
+    except (AttributeError, PermissionError, OSError):
+        pass
+    try:
+        os.nice(CORE_NICE)
+        logger.info(f"Core process: nice {CORE_NICE}")
+    except (PermissionError, OSError) as e:
+        logger.warning(f"Core process: could not raise priority: {e}")
+
+
+# --- Core process ---
+
+def run_core(shm_name, address, authkey, ready, stop):
+    log_setup.setup(fmt=LOG_FORMAT)
+    logger = logging.getLogger("Core")
+    _raise_priority(logger)
+
+    from src.hw.qz1_handler import QZ1Handler
+    from src.hw.imu_handler import IMUHandler
+    from src.hw.power_control import RelayController
+    from src.core.state_machine import StateMachine
+    from src.core.boot import DeferredAudio
+
+    event_store.STORE.open()
+    metrics.serve(port=_metrics_port("core"), routes={'/events': event_store.STORE.http_query})
+    block = SharedStatusBlock(shm_name, writer=True)
+    publish_lock = threading.Lock()
+    core = {}
+
+    def publish(status=None):
+        if 'sm' not in core:
+            return
+        sm = core['sm']
+        with publish_lock: # Single writer
+            block.write(sm.current_state, sm.power.get_status(), sm.alert_message,
+                        imu_mock=sm.imu.mock_mode, qz1_port_open=sm.qz1.port_open,
+                        imu_last=sm.imu.last_sample_at, qz1_last=sm.qz1.last_sentence_at,
+                        gnss_offset=sm.qz1.gnss.current_offset())
+
+    power = RelayController(callback=publish)
+    qz1 = QZ1Handler()
+    imu = IMUHandler()
+    audio = DeferredAudio()
+    sm = StateMachine(qz1, imu, power, audio)
+    core['sm'] = sm
+    sm.start()
+    publish()
+
+    if os.path.exists(address):
+        os.remove(address) # Left over from a previous core process
+    listener = Listener(address, family='AF_UNIX', authkey=authkey)
+    ready.set()
+    logger.info("Safety core armed")
+
+    def start_audio():
+        from src.hw.audio import AudioHandler
+        audio.attach(AudioHandler())
+    threading.Thread(target=start_audio, daemon=True).start()
+
+    def refresh():
+        while not stop.is_set():
+            publish()
+            time.sleep(STATUS_REFRESH)
+    threading.Thread(target=refresh, daemon=True).start()
+
+    conns = []
+    conns_lock = threading.Lock()
+
+    def accept():
+        while not stop.is_set():
+            try:
+                conn = listener.accept()
+            except Exception:
+                continue
+            with conns_lock:
+                conns.append(conn)
+    threading.Thread(target=accept, daemon=True).start()
+
+    try:
+        while not stop.is_set():
+            with conns_lock:
+                current = list(conns)
+            if not current:
+                time.sleep(0.1)
+                continue
+            for conn in wait(current, timeout=0.2):
+                try:
+                    method, args = conn.recv()
+                except (EOFError, OSError):
+                    with conns_lock:
+                        conns.remove(conn)
+                    continue
+
+                result = None
+                try:
+                    if method == 'shutdown':
+                        logger.info("Shutdown requested")
+                        stop.set()
+                    elif method == 'metrics':
+                        result = metrics.REGISTRY.snapshot()
+                    elif method in POWER_COMMANDS:
+                        result = getattr(power, method)(*args)
+                    elif method in SM_COMMANDS:
+                        result = getattr(sm, method)(*args)
+                    else:
+                        logger.warning(f"Unknown command: {method}")
+                except Exception as e:
+                    logger.error(f"Command {method} failed: {e}")
+                try:
+                    conn.send(result)
+                except (EOFError, OSError):
+                    pass
+    finally:
+        sm.stop()
+        listener.close()
+        event_store.STORE.close()
+
+
+# --- Client side (GUI / network processes) ---
+
+class _PowerProxy:
+    def __init__(self, core):
+        self.core = core
+
+    def get_status(self):
+        return self.core.block.read()['relays']
+
+    def set_relay(self, relay_id, state):
+        return self.core.call('set_relay', relay_id, state)
+
+    def set_relays(self, states):
+        return self.core.call('set_relays', states)
+
+    def toggle(self, relay_id):
+        return self.core.call('toggle', relay_id)
+
+
+class CoreProxy:
+    """
+    StateMachine look-alike for the GUI / network processes.
+    Reads come from the shared status block, commands go to the core process.
+    """
+    STATE_BOOT = "BOOT"
+    STATE_NORMAL = "NORMAL"
+    STATE_PREARM = "PREARM"
+    STATE_ALERT = "ALERT"
+    STATE_RECOVERY = "RECOVERY"
+
+    def __init__(self, shm_name, address, authkey):
+        self.logger = logging.getLogger("CoreProxy")
+        self.block = SharedStatusBlock(shm_name)
+        self.address = address
+        self.authkey = authkey
+        self.conn = None
+        self.lock = threading.Lock()
+        self.power = _PowerProxy(self)
+        self._connect()
+
+    def _connect(self):
+        self.conn = Client(self.address, family='AF_UNIX', authkey=self.authkey)
+
+    def _disconnect(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except OSError:
+                pass
+            self.conn = None
+
+    def call(self, method, *args):
+        # The supervisor restarts a crashed core on a new listener: reconnect and retry once.
+        # If the core is still starting, the error propagates and the next call reconnects.
+        with self.lock: # One request in flight per process
+            for attempt in range(2):
+                try:
+                    if self.conn is None:
+                        self._connect()
+                    self.conn.send((method, args))
+                    return self.conn.recv()
+                except (EOFError, OSError) as e: # ConnectionError is an OSError
+                    self._disconnect()
+                    if attempt:
+                        raise
+                    self.logger.warning("Core connection lost (%s), reconnecting", e)
+
+    @property
+    def current_state(self):
+        return self.block.read()['current_state']
+
+    @property
+    def alert_message(self):
+        return self.block.read()['alert_message']
+
+    def gnss_time(self):
+        offset = self.block.read()['gnss_offset']
+        return time.monotonic() + offset if offset is not None else None
+
+    def get_sensor_health(self):
+        status = self.block.read()
+        now = time.monotonic()
+        return {
+            'qz1': {
+                'port_open': status['qz1_port_open'],
+                'last_sentence_age': now - status['qz1_last'] if status['qz1_last'] else None,
+            },
+            'imu': {
+                'mock_mode': status['imu_mock'],
+                'last_sample_age': now - status['imu_last'] if status['imu_last'] else None,
+            },
+        }
+
+    def on_button_press(self, btn_id):
+        return self.call('on_button_press', btn_id)
+
+    def on_qz1_message(self, report):
+        return self.call('on_qz1_message', str(report))
+
+    def on_imu_shake(self, g_force):
+        return self.call('on_imu_shake', g_force)
+
+    def apply_relay_batch(self, states):
+        return self.call('apply_relay_batch', states)
+
+    def stop(self):
+        # Closing the GUI shuts the whole device down (same as single-process mode)
+        try:
+            self.call('shutdown')
+        except (EOFError, OSError):
+            pass
+
+
+def run_gui(shm_name, address, authkey):
+    log_setup.setup(fmt=LOG_FORMAT)
+    metrics.serve(port=_metrics_port("gui"))
+    from src.gui.app_window import AppWindow
+    AppWindow(CoreProxy(shm_name, address, authkey)).run()
+
+
+def run_network(shm_name, address, authkey, transport, device_id, tags):
+    log_setup.setup(fmt=LOG_FORMAT)
+    metrics.serve(port=_metrics_port("network"))
+    proxy = CoreProxy(shm_name, address, authkey)
+    if transport == "ipc":
+        from src.client.ipc_client import IPCClient
+        client = IPCClient(proxy, device_id=device_id, tags=tags)
+    else:
+        from src.client.socket_client import SocketIOClient
+        client = SocketIOClient(proxy, device_id=device_id, tags=tags)
+    # Pushed metrics: the core's (sensors, cutoff, relays) plus this process' (emit queue)
+    client.metrics_source = lambda: {**proxy.call('metrics'), **metrics.REGISTRY.snapshot()}
+    client.start()
+
+    # Status changes are published by the core through the block; forward them
+    last = proxy.block.read()
+    while True:
+        time.sleep(WATCH_INTERVAL)
+        status = proxy.block.read()
+        if status['relays'] != last['relays']:
+            client.emit_status(status['relays'])
+        if (status['current_state'], status['alert_message']) != (last['current_state'], last['alert_message']):
+            client.request_snapshot()
+        last = status
+
+
+# --- Supervisor (parent process) ---
+
+def run_supervisor(transport="socketio", device_id="default", tags=None):
+    log_setup.setup(fmt=LOG_FORMAT)
+    logger = logging.getLogger("Supervisor")
+    ctx = multiprocessing.get_context('spawn')
+
+    block = SharedStatusBlock(create=True)
+    address = f"/tmp/qzss-powertap-core-{os.getpid()}.sock"
+    authkey = secrets.token_bytes(16)
+    stop = ctx.Event()
+
+    def start_core():
+        ready = ctx.Event()
+        proc = ctx.Process(target=run_core, name="core", daemon=True,
+                           args=(block.name, address, authkey, ready, stop))
+        proc.start()
+        if not ready.wait(CORE_READY_TIMEOUT):
+            logger.critical("Core process did not become ready")
+        return proc
+
+    workers = {
+        "gui": (run_gui, (block.name, address, authkey)),
+        "network": (run_network, (block.name, address, authkey, transport, device_id, tags or {})),
+    }
+
+    def start_worker(name):
+        target, args = workers[name]
+        proc = ctx.Process(target=target, name=name, daemon=True, args=args)
+        proc.start()
+        return proc
+
+    core = None
+    procs = {}
+    try:
+        logger.info("Starting safety core process...")
+        core = start_core()
+        procs = {name: start_worker(name) for name in workers}
+
+        while not stop.is_set():
+            time.sleep(0.5)
+            if not core.is_alive() and not stop.is_set():
+                logger.critical(f"Core process exited ({core.exitcode}), restarting")
+                time.sleep(RESTART_DELAY)
+                core = start_core()
+            for name, proc in procs.items():
+                if not proc.is_alive() and not stop.is_set():
+                    logger.error(f"{name} process exited ({proc.exitcode}), restarting")
+                    time.sleep(RESTART_DELAY)
+                    procs[name] = start_worker(name)
+    except KeyboardInterrupt:
+        logger.info("Shutdown requested")
+        stop.set()
+    finally:
+        if core is not None:
+            core.join(timeout=5)
+        for proc in procs.values():
+            proc.terminate()
+        if core is not None and core.is_alive():
+            core.terminate()
+        block.close()
+        if os.path.exists(address):
+            os.remove(address)
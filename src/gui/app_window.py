@@ -4,6 +4,16 @@ import os
 import logging
 import threading
 
+from src.core import metrics
+from src.gui.layout import compute_layout, TEXT_ITEMS
+from src.gui.font_cache import FontAtlasCache, collect_glyphs, CLOCK_GLYPHS, ALERT_VOCABULARY
+
+try:
+    from src.gui.waveform import SampleRingBuffer
+    WAVEFORM_AVAILABLE = True
+except ImportError:
+    WAVEFORM_AVAILABLE = False
+
 # Configuration
 FONT_PATH = "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc"
 FONT_SIZE_CLOCK = 160 # Bigger Clock
@@ -13,6 +23,37 @@ FONT_SIZE_RELAY = 40
 FONT_SIZE_ALERT_TITLE = 60
 FONT_SIZE_ALERT_BODY = 36
 
+JST_OFFSET = 9 * 3600 # Clock shows GNSS time (UTC) in JST
+
+# Live waveform on the alert screen
+WAVEFORM_SECONDS = 10
+WAVEFORM_MAX_RATE_HZ = 1000 # Ring buffer sized for the fastest IMU rate
+WAVEFORM_LEGEND = ("X", "Y", "Z", "|a|-1G")
+
+FRAME_TIME = metrics.REGISTRY.histogram('powertap_gui_frame_seconds', 'GUI update + render time per frame')
+
+# Fixed UI strings (also used to build the font glyph subset)
+TEXT_STATUS = {
+    "BOOT": "起動準備中...",
+    "NORMAL": "システム正常稼働中",
+    "PREARM": "緊急地震速報 揺れを警戒中",
+    "RECOVERY": "復旧待機中..."
+}
+TEXT_STATUS_UNKNOWN = "不明"
+TEXT_RELAY_LOADING = "Relay Status Loading..."
+TEXT_FOOTER = "▼ 災害監視中 (QZSS/IMU)"
+TEXT_ALERT_HEADER = "警報発令"
+TEXT_ALERT_BODY_1 = "強い揺れ/緊急地震速報を検知しました"
+TEXT_ALERT_BODY_2 = "安全のため電源を遮断しました"
+TEXT_ALERT_FOOTER = "安全確認後、ボタン1を押して復旧してください"
+TEXT_RELAY_LABELS = ("ON", "OFF")
+
+UI_TEXTS = (
+    tuple(TEXT_STATUS.values()) + TEXT_RELAY_LABELS +
+    (TEXT_STATUS_UNKNOWN, TEXT_RELAY_LOADING, TEXT_FOOTER, TEXT_ALERT_HEADER,
+     TEXT_ALERT_BODY_1, TEXT_ALERT_BODY_2, TEXT_ALERT_FOOTER)
+)
+
 class AppWindow:
     def __init__(self, state_machine):
         self.sm = state_machine
@@ -20,6 +61,12 @@ class AppWindow:
         self.running = True
         self.current_screen = None # "NORMAL" or "ALERT"
 
+        # Live acceleration feed (ring buffer written by the IMU thread)
+        self.waveform = None
+        if WAVEFORM_AVAILABLE and hasattr(self.sm, 'imu'):
+            self.waveform = SampleRingBuffer(WAVEFORM_SECONDS * WAVEFORM_MAX_RATE_HZ)
+            self.sm.imu.sample_listener = self.waveform.append
+
         dpg.create_context()
         self._load_fonts()
         self._setup_ui()
@@ -28,35 +75,112 @@ class AppWindow:
         dpg.setup_dearpygui()
 
     def _load_fonts(self):
+        self.font_cache = None
+        self.glyphs = set()
+        self.fonts = []
+        self._pending_fonts = None
+        self._glyph_request_active = False
+
+        if not os.path.exists(FONT_PATH):
+            self.logger.error(f"Font not found: {FONT_PATH}")
+            return
+
+        # Only rasterize what the UI can actually display (instead of the full
+        # Japanese range x6 sizes). The subset is built once and cached on disk.
+        self.font_cache = FontAtlasCache(FONT_PATH)
+        self.glyphs = collect_glyphs(UI_TEXTS, ALERT_VOCABULARY, CLOCK_GLYPHS) | self.font_cache.learned_glyphs()
+        font_file = self.font_cache.subset_path(self.glyphs)
+        self._build_fonts(font_file, self.glyphs)
+
+    def _build_fonts(self, font_file, glyphs):
+        """Create the font set from font_file, containing only the given glyphs."""
+        ui_chars = sorted(ord(c) for c in glyphs)
+        clock_chars = sorted(ord(c) for c in collect_glyphs(CLOCK_GLYPHS))
+        relay_chars = sorted(ord(c) for c in collect_glyphs(TEXT_RELAY_LABELS, TEXT_RELAY_LOADING))
+
+        old_fonts = self.fonts
         with dpg.font_registry():
-            if os.path.exists(FONT_PATH):
-                # Normal Font
-                with dpg.font(FONT_PATH, FONT_SIZE_NORMAL) as self.font_normal:
-                    dpg.add_font_range_hint(dpg.mvFontRangeHint_Japanese)
-
-                # Clock Font
-                with dpg.font(FONT_PATH, FONT_SIZE_CLOCK) as self.font_clock:
-                    dpg.add_font_range_hint(dpg.mvFontRangeHint_Default)
-
-                # Status Font
-                with dpg.font(FONT_PATH, FONT_SIZE_STATUS) as self.font_status:
-                    dpg.add_font_range_hint(dpg.mvFontRangeHint_Japanese)
-
-                # Relay Font
-                with dpg.font(FONT_PATH, FONT_SIZE_RELAY) as self.font_relay:
-                    dpg.add_font_range_hint(dpg.mvFontRangeHint_Default)
-
-                # Alert Title Font
-                with dpg.font(FONT_PATH, FONT_SIZE_ALERT_TITLE) as self.font_alert_title:
-                    dpg.add_font_range_hint(dpg.mvFontRangeHint_Japanese)
+            # Normal Font
+            with dpg.font(font_file, FONT_SIZE_NORMAL) as self.font_normal:
+                dpg.add_font_chars(ui_chars)
+
+            # Clock Font
+            with dpg.font(font_file, FONT_SIZE_CLOCK) as self.font_clock:
+                dpg.add_font_chars(clock_chars)
+
+            # Status Font
+            with dpg.font(font_file, FONT_SIZE_STATUS) as self.font_status:
+                dpg.add_font_chars(ui_chars)
+
+            # Relay Font
+            with dpg.font(font_file, FONT_SIZE_RELAY) as self.font_relay:
+                dpg.add_font_chars(relay_chars)
+
+            # Alert Title Font
+            with dpg.font(font_file, FONT_SIZE_ALERT_TITLE) as self.font_alert_title:
+                dpg.add_font_chars(ui_chars)
+
+            # Alert Body Font
+            with dpg.font(font_file, FONT_SIZE_ALERT_BODY) as self.font_alert_body:
+                dpg.add_font_chars(ui_chars)
+
+        self.fonts = [self.font_normal, self.font_clock, self.font_status,
+                      self.font_relay, self.font_alert_title, self.font_alert_body]
+        dpg.bind_font(self.font_normal)
+
+        # Rebuild: rebind drawn items to the new fonts, then drop the old atlas
+        if old_fonts:
+            self._bind_item_fonts()
+            for font in old_fonts:
+                dpg.delete_item(font)
+
+    def _ensure_glyphs(self, text):
+        """
+        Lazily extend the font subset with glyphs not seen before
+        (e.g. a place name in a decoded DC Report).
+        """
+        if self.font_cache is None or self._glyph_request_active:
+            return
+        missing = set(text) - self.glyphs
+        missing.discard("\n")
+        if not missing:
+            return
+
+        self._glyph_request_active = True
+        glyphs = self.glyphs | missing
+        self.logger.info(f"Font cache: adding {len(missing)} glyphs")
+
+        def build():
+            try:
+                self.font_cache.learn(missing)
+                self._pending_fonts = (self.font_cache.subset_path(glyphs), glyphs)
+            finally:
+                self._glyph_request_active = False
+
+        threading.Thread(target=build, daemon=True).start()
+
+    def _apply_pending_fonts(self):
+        # Font items must be created from the render thread
+        pending = self._pending_fonts
+        if pending is None:
+            return
+        self._pending_fonts = None
+        font_file, glyphs = pending
+        self.glyphs = glyphs
+        self._build_fonts(font_file, glyphs)
+        self._update_layout()
 
-                # Alert Body Font
-                with dpg.font(FONT_PATH, FONT_SIZE_ALERT_BODY) as self.font_alert_body:
-                    dpg.add_font_range_hint(dpg.mvFontRangeHint_Japanese)
+    def _bind_item_fonts(self):
+        if hasattr(self, 'font_clock'): dpg.bind_item_font("clock_draw", self.font_clock)
+        if hasattr(self, 'font_status'): dpg.bind_item_font("status_draw", self.font_status)
+        if hasattr(self, 'font_relay'): dpg.bind_item_font("relay_draw", self.font_relay)
+        if hasattr(self, 'font_normal'): dpg.bind_item_font("footer_draw", self.font_normal)
 
-                dpg.bind_font(self.font_normal)
-            else:
-                self.logger.error(f"Font not found: {FONT_PATH}")
+        if hasattr(self, 'font_alert_title'): dpg.bind_item_font("alert_header_draw", self.font_alert_title)
+        if hasattr(self, 'font_alert_body'):
+            dpg.bind_item_font("alert_body_1_draw", self.font_alert_body)
+            dpg.bind_item_font("alert_body_2_draw", self.font_alert_body)
+        if hasattr(self, 'font_normal'): dpg.bind_item_font("alert_footer_draw", self.font_normal)
 
     def _setup_ui(self):
         with dpg.window(tag="main_window", label="Main", no_title_bar=True, no_resize=True, no_move=True):
@@ -70,76 +194,68 @@ class AppWindow:
 
                     # Text Items
                     dpg.draw_text((0, 0), "00:00:00", color=(255, 255, 255), size=120, tag="clock_draw")
-                    dpg.draw_text((0, 0), "システム正常稼働中", color=(100, 200, 255), size=32, tag="status_draw")
-                    dpg.draw_text((0, 0), "Relay Status Loading...", color=(100, 255, 100), size=40, tag="relay_draw")
-                    dpg.draw_text((0, 0), "▼ 災害監視中 (QZSS/IMU)", color=(100, 100, 100), size=24, tag="footer_draw")
-
-                    # Bind Fonts
-                    if hasattr(self, 'font_clock'): dpg.bind_item_font("clock_draw", self.font_clock)
-                    if hasattr(self, 'font_status'): dpg.bind_item_font("status_draw", self.font_status)
-                    if hasattr(self, 'font_relay'): dpg.bind_item_font("relay_draw", self.font_relay)
-                    if hasattr(self, 'font_normal'): dpg.bind_item_font("footer_draw", self.font_normal)
+                    dpg.draw_text((0, 0), TEXT_STATUS["NORMAL"], color=(100, 200, 255), size=32, tag="status_draw")
+                    dpg.draw_text((0, 0), TEXT_RELAY_LOADING, color=(100, 255, 100), size=40, tag="relay_draw")
+                    dpg.draw_text((0, 0), TEXT_FOOTER, color=(100, 100, 100), size=24, tag="footer_draw")
 
             # --- SCREEN 2: ALERT (Drawlist) ---
             with dpg.group(tag="group_alert", show=False):
                 with dpg.drawlist(width=800, height=480, tag="alert_drawlist"):
                     dpg.draw_rectangle((0,0), (800, 480), fill=(200, 0, 0), color=(200, 0, 0), tag="alert_rect")
 
-                    dpg.draw_text((0, 0), "警報発令", color=(255, 255, 0), size=60, tag="alert_header_draw")
-                    dpg.draw_text((0, 0), "強い揺れ/緊急地震速報を検知しました", color=(255, 255, 255), size=36, tag="alert_body_1_draw")
-                    dpg.draw_text((0, 0), "安全のため電源を遮断しました", color=(255, 255, 255), size=36, tag="alert_body_2_draw")
-                    dpg.draw_text((0, 0), "安全確認後、ボタン1を押して復旧してください", color=(200, 200, 200), size=24, tag="alert_footer_draw")
-
-                    if hasattr(self, 'font_alert_title'): dpg.bind_item_font("alert_header_draw", self.font_alert_title)
-                    if hasattr(self, 'font_alert_body'):
-                        dpg.bind_item_font("alert_body_1_draw", self.font_alert_body)
-                        dpg.bind_item_font("alert_body_2_draw", self.font_alert_body)
-                    if hasattr(self, 'font_normal'): dpg.bind_item_font("alert_footer_draw", self.font_normal)
+                    dpg.draw_text((0, 0), TEXT_ALERT_HEADER, color=(255, 255, 0), size=60, tag="alert_header_draw")
+                    dpg.draw_text((0, 0), TEXT_ALERT_BODY_1, color=(255, 255, 255), size=36, tag="alert_body_1_draw")
+                    dpg.draw_text((0, 0), TEXT_ALERT_BODY_2, color=(255, 255, 255), size=36, tag="alert_body_2_draw")
+                    dpg.draw_text((0, 0), TEXT_ALERT_FOOTER, color=(200, 200, 200), size=24, tag="alert_footer_draw")
+
+                # Live waveform panel (X/Y/Z + deviation from 1G vs trigger level)
+                if self.waveform is not None:
+                    with dpg.plot(tag="wave_plot", width=720, height=90, pos=(40, 300),
+                                  no_menus=True, no_box_select=True, no_mouse_pos=True):
+                        dpg.add_plot_legend(horizontal=True, location=dpg.mvPlot_Location_NorthWest)
+                        dpg.add_plot_axis(dpg.mvXAxis, tag="wave_x", no_tick_labels=True)
+                        with dpg.plot_axis(dpg.mvYAxis, tag="wave_y"):
+                            for name in WAVEFORM_LEGEND:
+                                dpg.add_line_series([], [], label=name, tag=f"wave_{name}")
+                            thr = getattr(self.sm.imu, 'threshold', 2.0)
+                            dpg.add_inf_line_series([thr, -thr], horizontal=True, label="Trigger", tag="wave_trigger")
+                    dpg.set_axis_limits("wave_x", -WAVEFORM_SECONDS, 0)
+                    dpg.set_axis_limits("wave_y", -1.5 * thr, 1.5 * thr)
+
+            # Bind Fonts
+            self._bind_item_fonts()
 
     def _update_layout(self):
         """Recalculate positions based on viewport size"""
         w = dpg.get_viewport_client_width()
         h = dpg.get_viewport_client_height()
 
-        # Resize Drawlists
-        dpg.configure_item("normal_drawlist", width=w, height=h)
-        dpg.configure_item("alert_drawlist", width=w, height=h)
-        dpg.configure_item("alert_rect", pmax=(w, h))
-
-        # Center Item Helper
-        def center_item(tag, y_pct, font_ref):
-            conf = dpg.get_item_configuration(tag)
-            text = conf.get('text', '')
-            font = 0
-            if font_ref: font = font_ref
-
-            size = dpg.get_text_size(text, font=font)
-            if size:
-                tw, th = size
-            else:
-                tw, th = 0, 0
-
-            x = (w - tw) / 2
-            y = (h * y_pct) - (th / 2)
-            dpg.configure_item(tag, pos=(x, y))
-
-        # Update Normal Layout
-        center_item("clock_draw", 0.35, self.font_clock)
-        center_item("status_draw", 0.60, self.font_status)
-        center_item("relay_draw", 0.75, self.font_relay)
-        center_item("footer_draw", 0.90, self.font_normal)
-
-        # Update Alert Layout
-        center_item("alert_header_draw", 0.20, self.font_alert_title)
-        center_item("alert_body_1_draw", 0.45, self.font_alert_body)
-        center_item("alert_body_2_draw", 0.55, self.font_alert_body)
-        center_item("alert_footer_draw", 0.85, self.font_normal)
+        fonts = {
+            "clock": getattr(self, 'font_clock', 0),
+            "status": getattr(self, 'font_status', 0),
+            "relay": getattr(self, 'font_relay', 0),
+            "normal": getattr(self, 'font_normal', 0),
+            "alert_title": getattr(self, 'font_alert_title', 0),
+            "alert_body": getattr(self, 'font_alert_body', 0),
+        }
+        text_sizes = {}
+        for tag, _, role in TEXT_ITEMS:
+            text = dpg.get_item_configuration(tag).get('text', '')
+            text_sizes[tag] = dpg.get_text_size(text, font=fonts[role] or 0)
+
+        for tag, conf in compute_layout(w, h, text_sizes, waveform=self.waveform is not None).items():
+            dpg.configure_item(tag, **conf)
 
     def _on_resize(self, sender, app_data):
         self._update_layout()
 
     def update(self):
-        current_time = time.strftime("%H:%M:%S")
+        self._apply_pending_fonts()
+        gnss_now = self.sm.gnss_time() if hasattr(self.sm, 'gnss_time') else None
+        if gnss_now is not None:
+            current_time = time.strftime("%H:%M:%S", time.gmtime(gnss_now + JST_OFFSET))
+        else:
+            current_time = time.strftime("%H:%M:%S") # System clock until the receiver has a fix
 
         if self.sm.current_state != "ALERT":
             # Update Normal Screen
@@ -153,11 +269,7 @@ class AppWindow:
             dpg.configure_item("clock_draw", text=current_time)
 
             # Status Text
-            state_str = {
-                "BOOT": "起動準備中...",
-                "NORMAL": "システム正常稼働中",
-                "RECOVERY": "復旧待機中..."
-            }.get(self.sm.current_state, "不明")
+            state_str = TEXT_STATUS.get(self.sm.current_state, TEXT_STATUS_UNKNOWN)
             dpg.configure_item("status_draw", text=state_str)
 
             # Relay Status
@@ -167,7 +279,7 @@ class AppWindow:
                  # Using Symbols? ● ○
                  parts = []
                  for k in sorted(status.keys()):
-                     sym = "ON" if status[k] else "OFF"
+                     sym = TEXT_RELAY_LABELS[0] if status[k] else TEXT_RELAY_LABELS[1]
                      parts.append(f"{k}:{sym}")
                  dpg.configure_item("relay_draw", text="  ".join(parts))
 
@@ -187,15 +299,30 @@ class AppWindow:
 
             msg = self.sm.alert_message
             if msg:
+                self._ensure_glyphs(msg)
                 dpg.configure_item("alert_body_1_draw", text=f"{msg}")
                 self._update_layout()
 
+            self._update_waveform()
+
         dpg.render_dearpygui_frame()
 
+    def _update_waveform(self):
+        if self.waveform is None:
+            return
+        # One point pair (min/max) per horizontal pixel at most
+        width = max(2, dpg.get_item_width("wave_plot") or 720) # Collapsed plot: still one bucket
+        t, series = self.waveform.decimated(WAVEFORM_SECONDS, time.monotonic(), points=width)
+        values = (series["ax"], series["ay"], series["az"], series["mag"])
+        for name, y in zip(WAVEFORM_LEGEND, values):
+            dpg.set_value(f"wave_{name}", [t, y])
+
     def run(self):
         dpg.show_viewport()
         while dpg.is_dearpygui_running() and self.running:
+            t0 = time.perf_counter()
             self.update()
+            FRAME_TIME.observe(time.perf_counter() - t0)
         dpg.destroy_context()
         self.sm.stop()
 
@@ -0,0 +1,179 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+
+# fontTools is optional. Without it the full font file is loaded, but only the
+# glyphs in the collected set are rasterized into the atlas.
+try:
+    from fontTools.ttLib import TTFont
+    from fontTools import subset as ft_subset
+    FONTTOOLS_AVAILABLE = True
+except ImportError:
+    FONTTOOLS_AVAILABLE = False
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")),
+    "qzss-powertap", "fonts")
+
+MANIFEST_NAME = "manifest.json"
+
+# Always available: printable ASCII (report text may contain latin/digits)
+ASCII_GLYPHS = "".join(chr(c) for c in range(0x20, 0x7F))
+
+# Glyphs needed by the clock font only
+CLOCK_GLYPHS = "0123456789:"
+
+# Words that show up in alert messages (StateMachine + decoded DC Reports).
+# Anything outside this set is picked up lazily at runtime.
+ALERT_VOCABULARY = (
+    "QZSS受信", "強い揺れを検知", "テスト警報", "ボタン",
+    "緊急地震速報", "警報", "注意報", "予報", "震源", "震度", "地震", "津波",
+    "南海トラフ", "北西太平洋", "火山", "噴火", "降灰", "気象", "洪水", "台風", "海上",
+    "発表", "訂正", "取消", "訓練", "試験", "最優先", "優先", "通常",
+    "マグニチュード", "深さ", "km", "以上", "以下", "程度", "約", "秒後", "分",
+    "年月日時", "頃", "強弱", "弱", "強", "不明", "なし", "到達", "予想", "高さ",
+    "北海道", "青森県", "岩手県", "宮城県", "秋田県", "山形県", "福島県",
+    "茨城県", "栃木県", "群馬県", "埼玉県", "千葉県", "東京都", "神奈川県",
+    "新潟県", "富山県", "石川県", "福井県", "山梨県", "長野県", "岐阜県",
+    "静岡県", "愛知県", "三重県", "滋賀県", "京都府", "大阪府", "兵庫県",
+    "奈良県", "和歌山県", "鳥取県", "島根県", "岡山県", "広島県", "山口県",
+    "徳島県", "香川県", "愛媛県", "高知県", "福岡県", "佐賀県", "長崎県",
+    "熊本県", "大分県", "宮崎県", "鹿児島県", "沖縄県",
+    "沿岸", "地方", "北部", "南部", "東部", "西部", "中部", "沖", "近海", "諸島",
+    "、。・（）「」！？：～",
+)
+
+
+def collect_glyphs(*texts):
+    """
+    Collect the set of characters needed to render the given strings.
+    Always includes printable ASCII.
+    """
+    glyphs = set(ASCII_GLYPHS)
+    for text in texts:
+        if isinstance(text, str):
+            glyphs.update(text)
+        else:
+            for t in text:
+                glyphs.update(t)
+    glyphs.discard("\n")
+    return glyphs
+
+
+class FontAtlasCache:
+    """
+    Builds glyph-subset copies of a (large) font file and caches them on disk,
+    keyed by the source font hash and the glyph set.
+
+    Glyphs that were requested lazily at runtime are persisted in the manifest,
+    so the next boot includes them in the subset from the start.
+    """
+
+    def __init__(self, font_path, cache_dir=DEFAULT_CACHE_DIR):
+        self.font_path = font_path
+        self.cache_dir = cache_dir
+        self.logger = logging.getLogger(__name__)
+        self.lock = threading.Lock()
+        self.manifest = self._load_manifest()
+
+    def _manifest_path(self):
+        return os.path.join(self.cache_dir, MANIFEST_NAME)
+
+    def _load_manifest(self):
+        try:
+            with open(self._manifest_path(), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if isinstance(manifest, dict):
+                return manifest
+        except (OSError, ValueError):
+            pass
+        return {"font_hashes": {}, "learned_glyphs": ""}
+
+    def _save_manifest(self):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = self._manifest_path() + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.manifest, f, ensure_ascii=False)
+            os.replace(tmp, self._manifest_path())
+        except OSError as e:
+            self.logger.warning(f"Font cache: failed to write manifest: {e}")
+
+    def font_hash(self):
+        """
+        SHA-1 of the source font file. Memoized in the manifest by (size, mtime)
+        so the multi-MB file is only hashed once per font update.
+        """
+        st = os.stat(self.font_path)
+        memo_key = f"{self.font_path}:{st.st_size}:{st.st_mtime_ns}"
+        cached = self.manifest["font_hashes"].get(memo_key)
+        if cached:
+            return cached
+
+        h = hashlib.sha1()
+        with open(self.font_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        with self.lock:
+            self.manifest["font_hashes"] = {memo_key: digest}
+            self._save_manifest()
+        return digest
+
+    def learned_glyphs(self):
+        return set(self.manifest.get("learned_glyphs", ""))
+
+    def learn(self, glyphs):
+        """Persist glyphs discovered at runtime for the next boot."""
+        with self.lock:
+            merged = self.learned_glyphs() | set(glyphs)
+            self.manifest["learned_glyphs"] = "".join(sorted(merged))
+            self._save_manifest()
+
+    def subset_path(self, glyphs):
+        """
+        Return a path to a font file containing (at least) the given glyphs.
+        Builds and caches a subset if possible, otherwise returns the original font.
+        """
+        if not FONTTOOLS_AVAILABLE:
+            return self.font_path
+
+        try:
+            key_src = self.font_hash() + "".join(sorted(glyphs))
+            key = hashlib.sha1(key_src.encode("utf-8")).hexdigest()[:16]
+            out_path = os.path.join(self.cache_dir, f"subset-{key}.otf")
+            if os.path.exists(out_path):
+                return out_path
+
+            self.logger.info(f"Font cache: building subset ({len(glyphs)} glyphs)")
+            os.makedirs(self.cache_dir, exist_ok=True)
+            font = TTFont(self.font_path, fontNumber=0, lazy=True)
+            options = ft_subset.Options()
+            options.layout_features = []
+            options.name_IDs = ["*"]
+            options.notdef_outline = True
+            subsetter = ft_subset.Subsetter(options)
+            subsetter.populate(unicodes=[ord(c) for c in glyphs])
+            subsetter.subset(font)
+
+            tmp = out_path + ".tmp"
+            font.save(tmp)
+            font.close()
+            os.replace(tmp, out_path)
+            self._prune(keep=out_path)
+            return out_path
+        except Exception as e:
+            self.logger.warning(f"Font cache: subset failed, using full font: {e}")
+            return self.font_path
+
+    def _prune(self, keep):
+        """Remove stale subsets (older glyph sets / font versions)."""
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.startswith("subset-") and path != keep:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
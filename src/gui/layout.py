@@ -0,0 +1,39 @@
+# Screen layout as a pure function of viewport size and measured text sizes
+# (no DearPyGui calls), so it can run headless in benchmarks.
+
+# (draw tag, vertical center as a fraction of the height, font role)
+NORMAL_ITEMS = (
+    ("clock_draw", 0.35, "clock"),
+    ("status_draw", 0.60, "status"),
+    ("relay_draw", 0.75, "relay"),
+    ("footer_draw", 0.90, "normal"),
+)
+ALERT_ITEMS = (
+    ("alert_header_draw", 0.20, "alert_title"),
+    ("alert_body_1_draw", 0.45, "alert_body"),
+    ("alert_body_2_draw", 0.55, "alert_body"),
+    ("alert_footer_draw", 0.85, "normal"),
+)
+TEXT_ITEMS = NORMAL_ITEMS + ALERT_ITEMS
+
+# Waveform plot on the alert screen: (x, y, width, height) as fractions of the viewport
+WAVE_PLOT_BOX = (0.05, 0.62, 0.9, 0.18)
+
+
+def compute_layout(w, h, text_sizes, waveform=False):
+    """
+    w, h: viewport client size. text_sizes: {tag: (text width, text height)}
+    (missing tags count as empty). Returns {tag: {configure_item kwargs}}.
+    """
+    layout = {
+        "normal_drawlist": {"width": w, "height": h},
+        "alert_drawlist": {"width": w, "height": h},
+        "alert_rect": {"pmax": (w, h)},
+    }
+    for tag, y_pct, _ in TEXT_ITEMS:
+        tw, th = text_sizes.get(tag) or (0, 0)
+        layout[tag] = {"pos": ((w - tw) / 2, (h * y_pct) - (th / 2))}
+    if waveform:
+        x, y, bw, bh = WAVE_PLOT_BOX
+        layout["wave_plot"] = {"pos": (int(w * x), int(h * y)), "width": int(w * bw), "height": int(h * bh)}
+    return layout
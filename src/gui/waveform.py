@@ -0,0 +1,93 @@
+import numpy as np
+
+
+class SampleRingBuffer:
+    """
+    Preallocated ring buffer for 3-axis acceleration samples.
+
+    Every sample is written twice (at i and i + capacity), so the most recent
+    N samples are always one contiguous slice: no copies or Python lists are
+    needed to hand them to the plot.
+    """
+
+    def __init__(self, capacity, max_points=800):
+        if max_points < 2:
+            raise ValueError(f"max_points must be at least 2 (min/max pair), got {max_points}")
+        self.capacity = capacity
+        self.t = np.zeros(2 * capacity)
+        self.ax = np.zeros(2 * capacity)
+        self.ay = np.zeros(2 * capacity)
+        self.az = np.zeros(2 * capacity)
+        self.mag = np.zeros(2 * capacity)
+        self.index = 0  # next write position (0 .. capacity-1)
+        self.count = 0  # total samples written
+
+        # Decimation output (min/max per bucket -> 2 points per bucket)
+        self.max_points = max_points
+        self._out_t = np.zeros(max_points)
+        self._out = {name: np.zeros(max_points) for name in ("ax", "ay", "az", "mag")}
+        self._bucket_t = np.zeros(max_points // 2)
+        self._bucket_min = np.zeros(max_points // 2)
+        self._bucket_max = np.zeros(max_points // 2)
+
+    def append(self, t, ax, ay, az):
+        """Called from the sampling thread. O(1), no allocation."""
+        i = self.index
+        j = i + self.capacity
+        self.t[i] = self.t[j] = t
+        self.ax[i] = self.ax[j] = ax
+        self.ay[i] = self.ay[j] = ay
+        self.az[i] = self.az[j] = az
+        self.mag[i] = self.mag[j] = (ax * ax + ay * ay + az * az) ** 0.5 - 1.0
+        self.index = (i + 1) % self.capacity
+        self.count += 1
+
+    def _window(self, seconds, now):
+        """Return (start, end) of the contiguous slice covering the last `seconds`."""
+        n = min(self.count, self.capacity)
+        end = self.index + self.capacity
+        start = end - n
+        start += int(np.searchsorted(self.t[start:end], now - seconds))
+        return start, end
+
+    def decimated(self, seconds, now, points=None):
+        """
+        Decimate the last `seconds` of samples to at most `points` values per
+        series (min/max per bucket, so spikes survive).
+        Returns (t, {series: values}) as views into preallocated arrays.
+        The time axis is relative to `now` (negative seconds).
+        points: at least 2 (one min/max bucket); None = max_points.
+        """
+        if points is None:
+            points = self.max_points
+        elif points < 2:
+            raise ValueError(f"points must be at least 2 (min/max pair), got {points}")
+        points = min(points, self.max_points)
+        start, end = self._window(seconds, now)
+        n = end - start
+        if n <= 0:
+            return self._out_t[:0], {k: v[:0] for k, v in self._out.items()}
+
+        buckets = points // 2
+        if n <= points:
+            # Few samples: pass through unchanged
+            np.subtract(self.t[start:end], now, out=self._out_t[:n])
+            for name, out in self._out.items():
+                out[:n] = getattr(self, name)[start:end]
+            return self._out_t[:n], {k: v[:n] for k, v in self._out.items()}
+
+        k = n // buckets
+        start = end - buckets * k
+        np.subtract(self.t[start:end:k], now, out=self._bucket_t[:buckets])
+        self._out_t[0:2 * buckets:2] = self._bucket_t[:buckets]
+        self._out_t[1:2 * buckets:2] = self._bucket_t[:buckets]
+
+        for name, out in self._out.items():
+            grid = getattr(self, name)[start:end].reshape(buckets, k)
+            np.minimum.reduce(grid, axis=1, out=self._bucket_min[:buckets])
+            np.maximum.reduce(grid, axis=1, out=self._bucket_max[:buckets])
+            out[0:2 * buckets:2] = self._bucket_min[:buckets]
+            out[1:2 * buckets:2] = self._bucket_max[:buckets]
+
+        size = 2 * buckets
+        return self._out_t[:size], {k: v[:size] for k, v in self._out.items()}
@@ -1,18 +1,26 @@
-from gpiozero import PWMOutputDevice
-import time
-import threading
 import logging
 import os
 
-try:
-    import pygame
-    PYGAME_AVAILABLE = True
-except ImportError:
-    PYGAME_AVAILABLE = False
+from src.hw import backends
+from src.hw.clock import REAL_CLOCK
+
+# pygame is imported lazily in AudioHandler.__init__ (slow import, not needed for the safety core)
+pygame = None
+
+def _import_pygame():
+    global pygame
+    if pygame is None:
+        try:
+            import pygame as _pygame
+            pygame = _pygame
+        except ImportError:
+            return False
+    return True
 
 class AudioHandler:
-    def __init__(self, pin=12, alert_file=None):
+    def __init__(self, pin=12, alert_file=None, clock=None, backend=None):
         self.logger = logging.getLogger(__name__)
+        self.clock = clock or REAL_CLOCK
 
         # Calculate default path relative to this file
         # src/hw/audio.py -> ../../assets/alert.wav
@@ -23,8 +31,8 @@ class AudioHandler:
         self.alert_file = alert_file
         self.using_pygame = False
 
-        # 1. Try Pygame (Voice/High Quality Audio)
-        if PYGAME_AVAILABLE:
+        # 1. Try Pygame (Voice/High Quality Audio); never in simulation
+        if not backends.simulation_only(backend) and _import_pygame():
             try:
                 pygame.mixer.init()
                 self.using_pygame = True
@@ -33,31 +41,25 @@ class AudioHandler:
                 self.logger.warning(f"Audio: Pygame Init Failed: {e}")
 
         # 2. GPIO Buzzer Fallback
-        self.buzzer = None
-        try:
-            self.buzzer = PWMOutputDevice(pin, frequency=440)
-        except Exception as e:
-            self.logger.warning(f"Audio: Buzzer GPIO Init Failed: {e}. Using Mock Buzzer.")
-            class MockBuzzer:
-                def __init__(self): self.frequency = 440; self.value = 0
-            self.buzzer = MockBuzzer()
+        self.buzzer = backends.pwm_output(pin, frequency=440, backend=backend)
 
         self.running = False
-        self.thread = None
+        self.task = None
+        self.siren_high = None # None until the alarm step decides file vs. buzzer
 
     def play_tone(self, frequency=440, duration=0.5):
         if self.buzzer:
             self.buzzer.frequency = frequency
             self.buzzer.value = 0.5
-            time.sleep(duration)
+            self.clock.sleep(duration)
             self.buzzer.value = 0
 
     def start_alarm(self):
         if self.running:
             return
         self.running = True
-        self.thread = threading.Thread(target=self._alarm_loop, daemon=True)
-        self.thread.start()
+        self.siren_high = None
+        self.task = self.clock.spawn(self._alarm_step, name="alarm")
         self.logger.info("Alarm started")
 
     def stop_alarm(self):
@@ -65,40 +67,37 @@ class AudioHandler:
         if self.using_pygame and pygame.mixer.music.get_busy():
             pygame.mixer.music.stop()
 
-        if self.thread:
-            self.thread.join()
+        if self.task:
+            self.task.stop()
+            self.task.join()
 
         if self.buzzer:
             self.buzzer.value = 0
 
         self.logger.info("Alarm stopped")
 
-    def _alarm_loop(self):
-        # Strategy:
-        # If Pygame works and file exists -> Play Loop
-        # Else -> Beep with Buzzer
-
-        file_ready = False
-        if self.using_pygame and os.path.exists(self.alert_file):
-            try:
-                pygame.mixer.music.load(self.alert_file)
-                pygame.mixer.music.play(-1) # Loop forever
-                file_ready = True
-                self.logger.info(f"Audio: Playing {self.alert_file}")
-            except Exception as e:
-                self.logger.error(f"Audio: Failed to play file: {e}")
-
-        # If file is playing, just wait (monitor stop signal)
-        if file_ready:
-            while self.running:
-                time.sleep(0.5)
-            # Stop handled in stop_alarm
-            return
-
-        # Fallback: Buzzer Siren
-        self.logger.info("Audio: Fallback to Buzzer Siren")
-        while self.running:
-            self.play_tone(880, 0.5)
-            if not self.running: break
-            self.play_tone(440, 0.5)
-            if not self.running: break
+    def _alarm_step(self):
+        if not self.running:
+            self.buzzer.value = 0
+            return None
+
+        if self.siren_high is None:
+            # Strategy:
+            # If Pygame works and file exists -> Play Loop (stop handled in stop_alarm)
+            # Else -> Beep with Buzzer
+            if self.using_pygame and os.path.exists(self.alert_file):
+                try:
+                    pygame.mixer.music.load(self.alert_file)
+                    pygame.mixer.music.play(-1) # Loop forever
+                    self.logger.info(f"Audio: Playing {self.alert_file}")
+                    return None
+                except Exception as e:
+                    self.logger.error(f"Audio: Failed to play file: {e}")
+            self.logger.info("Audio: Fallback to Buzzer Siren")
+            self.siren_high = False
+
+        # Buzzer Siren: alternating 880 / 440 Hz, 0.5 s each
+        self.siren_high = not self.siren_high
+        self.buzzer.frequency = 880 if self.siren_high else 440
+        self.buzzer.value = 0.5
+        return 0.5
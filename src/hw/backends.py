@@ -0,0 +1,272 @@
+import logging
+import math
+import os
+import random
+from collections import deque
+
+# Hardware backends: real drivers (gpiozero / smbus2 / pyserial) or deterministic
+# simulated devices. POWERTAP_BACKEND selects:
+#   auto - real hardware, falling back to simulation per device (default)
+#   real - real hardware only (errors propagate)
+#   sim  - simulation only (runs on any Linux box)
+BACKEND = os.environ.get("POWERTAP_BACKEND", "auto")
+
+logger = logging.getLogger(__name__)
+
+
+def _resolve(backend):
+    return backend or BACKEND
+
+
+def _fallback(backend, what, error):
+    if backend == "real":
+        raise error
+    logger.warning(f"{what}: {error}. Using simulated device.")
+
+
+def simulation_only(backend=None):
+    return _resolve(backend) == "sim"
+
+
+def is_simulated(device):
+    return getattr(device, "simulated", False)
+
+
+# --- GPIO ---
+
+class SimulatedOutput:
+    """Relay / digital output."""
+    simulated = True
+
+    def __init__(self, pin=None, initial_value=False):
+        self.pin = pin
+        self.value = bool(initial_value)
+
+    def on(self): self.value = True
+    def off(self): self.value = False
+    def close(self): pass
+
+
+class SimulatedButton:
+    simulated = True
+
+    def __init__(self, pin=None):
+        self.pin = pin
+        self.when_pressed = None
+
+    def press(self):
+        if self.when_pressed:
+            self.when_pressed()
+
+    def close(self): pass
+
+
+class SimulatedPWM:
+    """Buzzer. Records (frequency, value) changes."""
+    simulated = True
+
+    def __init__(self, pin=None, frequency=440):
+        self.pin = pin
+        self.frequency = frequency
+        self.value = 0
+
+    def close(self): pass
+
+
+def output_device(pin, active_high=True, initial_value=False, backend=None):
+    backend = _resolve(backend)
+    if backend != "sim":
+        try:
+            from gpiozero import OutputDevice
+            return OutputDevice(pin, active_high=active_high, initial_value=initial_value)
+        except Exception as e:
+            _fallback(backend, f"GPIO {pin}", e)
+    return SimulatedOutput(pin, initial_value)
+
+
+def button(pin, pull_up=True, bounce_time=None, backend=None):
+    backend = _resolve(backend)
+    if backend != "sim":
+        try:
+            from gpiozero import Button
+            return Button(pin, pull_up=pull_up, bounce_time=bounce_time)
+        except Exception as e:
+            _fallback(backend, f"Button GPIO {pin}", e)
+    return SimulatedButton(pin)
+
+
+def pwm_output(pin, frequency=440, backend=None):
+    backend = _resolve(backend)
+    if backend != "sim":
+        try:
+            from gpiozero import PWMOutputDevice
+            return PWMOutputDevice(pin, frequency=frequency)
+        except Exception as e:
+            _fallback(backend, f"PWM GPIO {pin}", e)
+    return SimulatedPWM(pin, frequency)
+
+
+# --- I2C (MPU6050) ---
+
+ACCEL_LSB_PER_G = 16384.0 # +/- 2G range
+MOT_THR_G_PER_LSB = 0.002
+
+
+class SimulatedMPU6050:
+    """
+    Register-level MPU6050 model on a fake SMBus. Acceleration comes from
+    `source(t)` -> (ax, ay, az) in G, evaluated at the clock's time; default is
+    1G on Z with small deterministic noise.
+
+    Motion detection (INT_ENABLE bit 6): like the chip's 1 kHz internal check,
+    every millisecond since the last INT_STATUS read is compared against MOT_THR
+    (per axis, ideal high-pass = deviation from rest) for MOT_DUR ms. Reading
+    INT_STATUS (0x3A) returns and clears the latch. Sources may carry a `window`
+    (start, end) attribute so quiet stretches are skipped.
+    """
+    simulated = True
+
+    def __init__(self, clock=None, seed=0, noise=0.01):
+        self.clock = clock
+        self.rng = random.Random(seed)
+        self.noise = noise
+        self.source = None
+        self.registers = {}
+        self._latched = (0, 0, 0)
+        self._motion_checked_at = None
+
+    def _accel(self):
+        t = self.clock.monotonic() if self.clock else 0.0
+        ax, ay, az = self.source(t) if self.source else (0.0, 0.0, 1.0)
+        n = self.noise
+        return (ax + self.rng.uniform(-n, n), ay + self.rng.uniform(-n, n), az + self.rng.uniform(-n, n))
+
+    def write_byte_data(self, address, register, value):
+        self.registers[register] = value
+
+    def _motion_since_last_check(self):
+        now = self.clock.monotonic() if self.clock else 0.0
+        since = self._motion_checked_at if self._motion_checked_at is not None else now
+        self._motion_checked_at = now
+        if not self.registers.get(0x38, 0) & 0x40 or self.source is None:
+            return False
+        window = getattr(self.source, "window", None)
+        if window:
+            since, now = max(since, window[0]), min(now, window[1])
+        threshold = self.registers.get(0x1F, 0) * MOT_THR_G_PER_LSB
+        needed = max(1, self.registers.get(0x20, 0))
+        run = 0
+        for i in range(int((now - since) * 1000) + 1):
+            ax, ay, az = self.source(since + i / 1000)
+            if max(abs(ax), abs(ay), abs(az - 1.0)) > threshold:
+                run += 1
+                if run >= needed:
+                    return True
+            else:
+                run = 0
+        return False
+
+    def read_byte_data(self, address, register):
+        if register == 0x3A: # INT_STATUS
+            return 0x40 if self._motion_since_last_check() else 0
+        # ACCEL_XOUT_H (0x3B) latches a new sample for the following reads
+        if register == 0x3B:
+            self._latched = tuple(int(max(-32768, min(32767, g * ACCEL_LSB_PER_G))) & 0xFFFF
+                                  for g in self._accel())
+        if 0x3B <= register <= 0x40:
+            raw = self._latched[(register - 0x3B) // 2]
+            return (raw >> 8) & 0xFF if register % 2 == 1 else raw & 0xFF
+        return self.registers.get(register, 0)
+
+    def close(self): pass
+
+
+def shake(amplitude_g, frequency_hz, start, duration):
+    """
+    Acceleration source: sinusoidal shaking on top of gravity, mostly horizontal
+    with a vertical component. Each axis saturates at the +/- 2G range.
+    """
+    def source(t):
+        if start <= t < start + duration:
+            a = amplitude_g * math.sin(2 * math.pi * frequency_hz * (t - start))
+            return a, 0.8 * a, 1.0 + 0.6 * a
+        return 0.0, 0.0, 1.0
+    source.window = (start, start + duration)
+    return source
+
+
+def quake(p_amplitude_g, s_amplitude_g, start, p_duration, s_duration, frequency_hz=2.0, p_frequency_hz=6.0):
+    """
+    Acceleration source: weak P-wave (faster, mostly vertical) followed by the
+    strong S-wave, each with a linear ramp-up over its first quarter.
+    """
+    s_start = start + p_duration
+    def source(t):
+        if start <= t < s_start:
+            ramp = min(1.0, (t - start) / (p_duration / 4))
+            a = ramp * p_amplitude_g * math.sin(2 * math.pi * p_frequency_hz * (t - start))
+            return 0.3 * a, 0.3 * a, 1.0 + a
+        if s_start <= t < s_start + s_duration:
+            ramp = min(1.0, (t - s_start) / (s_duration / 4))
+            a = ramp * s_amplitude_g * math.sin(2 * math.pi * frequency_hz * (t - s_start))
+            return a, 0.8 * a, 1.0 + 0.6 * a
+        return 0.0, 0.0, 1.0
+    source.window = (start, s_start + s_duration)
+    source.s_start = s_start
+    return source
+
+
+def i2c_bus(bus_num, clock=None, backend=None):
+    backend = _resolve(backend)
+    if backend != "sim":
+        try:
+            import smbus2
+            return smbus2.SMBus(bus_num) # Requires I2C enabled
+        except (ImportError, PermissionError, FileNotFoundError, OSError) as e:
+            _fallback(backend, f"I2C bus {bus_num}", e)
+    return SimulatedMPU6050(clock)
+
+
+# --- Serial (QZ1) ---
+
+class SimulatedSerial:
+    """
+    Serial port fed by scheduled lines. readline() never blocks: it returns the
+    next line whose time has come, else b'' (the reader then polls again after
+    poll_interval).
+    """
+    simulated = True
+
+    def __init__(self, clock=None, poll_interval=0.01):
+        self.clock = clock
+        self.poll_interval = poll_interval
+        self.lines = deque() # (time, bytes), in time order
+
+    def feed(self, line, at=None):
+        if isinstance(line, str):
+            line = line.encode("utf-8")
+        if not line.endswith(b"\n"):
+            line += b"\r\n"
+        t = at if at is not None else (self.clock.monotonic() if self.clock else 0.0)
+        self.lines.append((t, line))
+
+    def readline(self):
+        now = self.clock.monotonic() if self.clock else float("inf")
+        if self.lines and self.lines[0][0] <= now:
+            return self.lines.popleft()[1]
+        return b""
+
+    def close(self): pass
+
+
+def serial_port(port, baudrate, timeout=1, clock=None, backend=None):
+    backend = _resolve(backend)
+    if backend != "sim":
+        try:
+            import serial
+            return serial.Serial(port, baudrate, timeout=timeout)
+        except Exception as e:
+            _fallback(backend, f"Serial {port}", e)
+            # Stand-in for an absent receiver: poll like a real port's read timeout
+            return SimulatedSerial(clock, poll_interval=timeout)
+    return SimulatedSerial(clock)
@@ -1,8 +1,9 @@
-from gpiozero import Button
 import logging
 
+from src.hw import backends
+
 class ButtonHandler:
-    def __init__(self, callbacks=None):
+    def __init__(self, callbacks=None, backend=None):
         """
         :param callbacks: Dictionary mapping button ID (1-5) to callback functions
         """
@@ -20,23 +21,13 @@ class ButtonHandler:
         self.buttons = {}
 
         for btn_id, pin in self.pin_map.items():
-            try:
-                # pull_up=True is default for Button class? Documentation says yes generally for simple connection to GND.
-                # User specified "Pull up input".
-                self.buttons[btn_id] = Button(pin, pull_up=True, bounce_time=0.1)
-
-                # Setup callbacks if provided
-                if callbacks and btn_id in callbacks:
-                    self.buttons[btn_id].when_pressed = callbacks[btn_id]
+            # pull_up=True is default for Button class? Documentation says yes generally for simple connection to GND.
+            # User specified "Pull up input".
+            self.buttons[btn_id] = backends.button(pin, pull_up=True, bounce_time=0.1, backend=backend)
 
-            except Exception as e:
-                self.logger.warning(f"Failed to init Button {btn_id} on Pin {pin}: {e}. Using Mock.")
-                class MockBtn:
-                    def __init__(self): self.when_pressed = None
-                    def close(self): pass
-                self.buttons[btn_id] = MockBtn()
-                if callbacks and btn_id in callbacks:
-                    self.buttons[btn_id].when_pressed = callbacks[btn_id]
+            # Setup callbacks if provided
+            if callbacks and btn_id in callbacks:
+                self.buttons[btn_id].when_pressed = callbacks[btn_id]
 
     def assign_callback(self, btn_id, callback):
         if btn_id in self.buttons:
@@ -0,0 +1,141 @@
+import heapq
+import itertools
+import threading
+import time
+
+# Injectable clocks. Hardware loops are written as "step" functions that do one
+# unit of work and return the delay until the next step (None = stop). The clock
+# decides how to run them: RealClock in threads, VirtualClock as discrete events
+# (deterministic, as fast as the CPU allows).
+
+
+class RealTask:
+    def __init__(self, step, name):
+        self.step = step
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def _run(self):
+        while not self.stopped.is_set():
+            delay = self.step()
+            if delay is None:
+                break
+            if delay > 0:
+                self.stopped.wait(delay)
+
+    def stop(self):
+        self.stopped.set()
+
+    def join(self, timeout=None):
+        if self.thread is not threading.current_thread():
+            self.thread.join(timeout)
+
+
+class RealClock:
+    def monotonic(self):
+        return time.monotonic()
+
+    def time(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def spawn(self, step, name=None):
+        task = RealTask(step, name)
+        task.thread.start()
+        return task
+
+    def call_later(self, delay, fn):
+        timer = threading.Timer(delay, fn)
+        timer.daemon = True
+        timer.start()
+        return timer # .cancel()
+
+
+REAL_CLOCK = RealClock()
+
+
+class _VirtualEvent:
+    __slots__ = ('fn', 'cancelled')
+
+    def __init__(self, fn):
+        self.fn = fn
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class VirtualTask:
+    def __init__(self, clock, step):
+        self.clock = clock
+        self.step = step
+        self.event = None
+        self.stopped = False
+
+    def _fire(self):
+        if self.stopped:
+            return
+        delay = self.step()
+        if delay is not None and not self.stopped:
+            self.event = self.clock.call_later(delay, self._fire)
+
+    def stop(self):
+        self.stopped = True
+        if self.event:
+            self.event.cancel()
+
+    def join(self, timeout=None):
+        pass
+
+
+class VirtualClock:
+    """
+    Discrete-event clock. Time only moves in run_until()/run_for()/sleep(),
+    jumping straight to the next scheduled event. Single-threaded.
+    """
+
+    def __init__(self, start=0.0, wall_start=1700000000.0):
+        self.now = start
+        self.wall_offset = wall_start - start
+        self.queue = []
+        self.seq = itertools.count() # Tie-break: same time -> scheduling order
+        self.in_step = False
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now + self.wall_offset
+
+    def call_later(self, delay, fn):
+        event = _VirtualEvent(fn)
+        heapq.heappush(self.queue, (self.now + max(0.0, delay), next(self.seq), event))
+        return event
+
+    def spawn(self, step, name=None):
+        task = VirtualTask(self, step)
+        task.event = self.call_later(0, task._fire)
+        return task
+
+    def run_until(self, t):
+        if self.in_step:
+            raise RuntimeError("VirtualClock cannot advance from inside a scheduled step")
+        self.in_step = True
+        try:
+            while self.queue and self.queue[0][0] <= t:
+                when, _, event = heapq.heappop(self.queue)
+                if event.cancelled:
+                    continue
+                self.now = when
+                event.fn()
+            self.now = max(self.now, t)
+        finally:
+            self.in_step = False
+
+    def run_for(self, seconds):
+        self.run_until(self.now + seconds)
+
+    def sleep(self, seconds):
+        self.run_for(seconds)
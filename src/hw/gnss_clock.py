@@ -0,0 +1,203 @@
+import calendar
+import logging
+import os
+import time
+from collections import deque
+
+from src.core import metrics
+from src.hw.clock import REAL_CLOCK
+
+# GNSS clock model from the QZ1's own NMEA time sentences (RMC / ZDA / GGA).
+#
+# Each valid sentence gives (GNSS time of the epoch, local monotonic receipt time).
+# The receiver prints a sentence some milliseconds after the epoch it describes,
+# so every sample underestimates the true offset (GNSS time - monotonic) by its
+# output delay. The model keeps the largest offset of the recent samples, i.e.
+# the least-delayed one. NMEA times are UTC.
+
+WINDOW = 30               # Recent samples kept (RMC + GGA + ZDA: ~10 s)
+HOLDOVER = 3600.0         # Seconds the model stays valid without a new fix (local clock drift is ~ms/min)
+MIN_SAMPLES = 3           # Samples before the model is trusted
+L1S_MESSAGE_SECONDS = 1.0 # A DC Report is one 250-bit L1S message sent over one GNSS second
+
+# Set the OS wall clock from GNSS time (offline Pi without NTP; needs CAP_SYS_TIME)
+SET_SYSTEM_CLOCK = os.environ.get("POWERTAP_GNSS_SET_CLOCK", "0") == "1"
+SYSTEM_CLOCK_TOLERANCE = 0.5 # Seconds of wall clock error before it is stepped
+SYSTEM_CLOCK_CHECK = 60.0    # Seconds between wall clock checks
+
+TIME_SENTENCES = ("RMC", "ZDA", "GGA")
+
+FIXES = metrics.REGISTRY.counter('powertap_gnss_fixes_total', 'Valid NMEA time sentences (RMC/ZDA/GGA)')
+JITTER = metrics.REGISTRY.gauge('powertap_gnss_offset_jitter_seconds', 'Spread of the recent GNSS - monotonic offsets')
+CLOCK_STEPS = metrics.REGISTRY.counter('powertap_gnss_system_clock_steps_total', 'System clock corrections from GNSS time')
+
+
+def nmea_checksum(body):
+    """XOR of the characters between '$' and '*', as two hex digits."""
+    checksum = 0
+    for c in body.encode('ascii', errors='replace'):
+        checksum ^= c
+    return f"{checksum:02X}"
+
+
+def format_sentence(body):
+    """'GPRMC,...' -> '$GPRMC,...*hh'"""
+    return f"${body}*{nmea_checksum(body)}"
+
+
+def _split(sentence):
+    """Fields of a checksummed NMEA sentence, or None if it is malformed."""
+    star = sentence.rfind('*')
+    if not sentence.startswith('$') or star < 0:
+        return None
+    body = sentence[1:star]
+    if sentence[star + 1:star + 3].upper() != nmea_checksum(body):
+        return None
+    return body.split(',')
+
+
+def _time_of_day(field):
+    """'hhmmss.ss' -> seconds since midnight"""
+    return int(field[0:2]) * 3600 + int(field[2:4]) * 60 + float(field[4:])
+
+
+def _degrees(value, hemisphere):
+    """NMEA ddmm.mmmm / dddmm.mmmm -> signed decimal degrees"""
+    dot = value.index('.')
+    degrees = int(value[:dot - 2]) + float(value[dot - 2:]) / 60
+    return -degrees if hemisphere in ('S', 'W') else degrees
+
+
+class GNSSClock:
+    def __init__(self, clock=None, set_system_clock=SET_SYSTEM_CLOCK):
+        self.logger = logging.getLogger(__name__)
+        self.clock = clock or REAL_CLOCK
+        self.samples = deque(maxlen=WINDOW) # GNSS time - monotonic receipt time
+        self.offset = None
+        self.last_fix_at = None # clock.monotonic() of the last valid sentence
+        self.last_gnss_time = None
+        self.midnight = None    # Epoch of 00:00 UTC of the current date (from RMC / ZDA)
+        self.position = None    # (lat, lon) decimal degrees
+        self.source = None
+        self.set_system_clock = set_system_clock
+        self.system_clock_checked_at = None
+
+    # --- Input ---
+
+    def update(self, sentence, received_at=None):
+        """
+        Feed one NMEA sentence (received_at: clock.monotonic() at receipt).
+        Returns True if it was a time sentence (RMC / ZDA / GGA), valid or not.
+        """
+        kind = sentence[3:6]
+        if kind not in TIME_SENTENCES:
+            return False
+        if received_at is None:
+            received_at = self.clock.monotonic()
+        fields = _split(sentence)
+        if fields is None:
+            self.logger.debug("Bad NMEA checksum: %s", sentence)
+            return True
+        try:
+            gnss_time = getattr(self, f"_parse_{kind.lower()}")(fields)
+        except (ValueError, IndexError) as e:
+            self.logger.debug("Unparseable %s: %s (%s)", kind, sentence, e)
+            return True
+        if gnss_time is not None:
+            self._add_sample(gnss_time, received_at, kind)
+        return True
+
+    def _parse_rmc(self, fields):
+        # $GPRMC,hhmmss.ss,A,llll.ll,a,yyyyy.yy,a,x.x,x.x,ddmmyy,...
+        if fields[2] != 'A':
+            return None
+        d = fields[9]
+        self.midnight = calendar.timegm((2000 + int(d[4:6]), int(d[2:4]), int(d[0:2]), 0, 0, 0))
+        if fields[3]:
+            self.position = (_degrees(fields[3], fields[4]), _degrees(fields[5], fields[6]))
+        return self.midnight + _time_of_day(fields[1])
+
+    def _parse_zda(self, fields):
+        # $GPZDA,hhmmss.ss,dd,mm,yyyy,zh,zm
+        if not fields[2]:
+            return None
+        self.midnight = calendar.timegm((int(fields[4]), int(fields[3]), int(fields[2]), 0, 0, 0))
+        return self.midnight + _time_of_day(fields[1])
+
+    def _parse_gga(self, fields):
+        # $GPGGA,hhmmss.ss,llll.ll,a,yyyyy.yy,a,q,...  (time of day only)
+        if fields[6] in ('', '0') or self.midnight is None:
+            return None
+        self.position = (_degrees(fields[2], fields[3]), _degrees(fields[4], fields[5]))
+        gnss_time = self.midnight + _time_of_day(fields[1])
+        if self.last_gnss_time is not None and gnss_time < self.last_gnss_time - 43200:
+            gnss_time += 86400 # Past midnight, date not updated yet
+        return gnss_time
+
+    def _add_sample(self, gnss_time, received_at, source):
+        self.samples.append(gnss_time - received_at)
+        self.offset = max(self.samples)
+        self.last_fix_at = received_at
+        self.last_gnss_time = gnss_time
+        self.source = source
+        FIXES.inc()
+        JITTER.set(self.offset - min(self.samples))
+        if self.set_system_clock and self.synced():
+            self._check_system_clock(received_at)
+
+    # --- Time ---
+
+    def synced(self):
+        return (len(self.samples) >= MIN_SAMPLES and self.last_fix_at is not None
+                and self.clock.monotonic() - self.last_fix_at <= HOLDOVER)
+
+    def current_offset(self):
+        """GNSS time - clock.monotonic(), or None while not synced."""
+        return self.offset if self.synced() else None
+
+    def now_at(self, monotonic):
+        """GNSS (UTC epoch) time at a clock.monotonic() instant, or None while not synced."""
+        offset = self.current_offset()
+        return monotonic + offset if offset is not None else None
+
+    def now(self):
+        return self.now_at(self.clock.monotonic())
+
+    def stamp(self, received_at):
+        """
+        Timestamps of a DC Report received at clock.monotonic() `received_at`:
+        received (monotonic), received_gnss and broadcast (start of its L1S message, GNSS time).
+        """
+        received_gnss = self.now_at(received_at)
+        broadcast = None
+        if received_gnss is not None:
+            # The sentence follows the end of the message, which ends on a GNSS second
+            broadcast = int(received_gnss) - L1S_MESSAGE_SECONDS
+        return {'received': received_at, 'received_gnss': received_gnss, 'broadcast': broadcast}
+
+    def get_health(self):
+        offset = self.current_offset()
+        return {
+            'synced': offset is not None,
+            'source': self.source,
+            'jitter': self.offset - min(self.samples) if self.samples else None,
+            'last_fix_age': self.clock.monotonic() - self.last_fix_at if self.last_fix_at is not None else None,
+            'position': self.position,
+        }
+
+    # --- System clock ---
+
+    def _check_system_clock(self, now):
+        if self.system_clock_checked_at is not None and now - self.system_clock_checked_at < SYSTEM_CLOCK_CHECK:
+            return
+        self.system_clock_checked_at = now
+        error = self.now() - self.clock.time()
+        if abs(error) <= SYSTEM_CLOCK_TOLERANCE:
+            return
+        try:
+            time.clock_settime(time.CLOCK_REALTIME, time.time() + error)
+            CLOCK_STEPS.inc()
+            self.logger.warning(f"System clock stepped by {error:+.3f}s to GNSS time")
+        except (AttributeError, OSError) as e:
+            self.logger.error(f"Cannot set system clock from GNSS time: {e}")
+            self.set_system_clock = False
@@ -1,15 +1,21 @@
-import smbus2
 import math
 import logging
-import time
-import threading
+import os
+
+from src.core import event_store, metrics
+from src.hw import backends
+from src.hw.clock import REAL_CLOCK
 
 # MPU6050 Registers
 PWR_MGMT_1 = 0x6B
 SMPLRT_DIV = 0x19
 CONFIG = 0x1A
 GYRO_CONFIG = 0x1B
+ACCEL_CONFIG = 0x1C
+MOT_THR = 0x1F
+MOT_DUR = 0x20
 INT_ENABLE = 0x38
+INT_STATUS = 0x3A
 ACCEL_XOUT_H = 0x3B
 ACCEL_YOUT_H = 0x3D
 ACCEL_ZOUT_H = 0x3F
@@ -17,22 +23,59 @@ GYRO_XOUT_H = 0x43
 GYRO_YOUT_H = 0x45
 GYRO_ZOUT_H = 0x47
 
+RATE_WINDOW = 1.0 # Seconds per achieved-sample-rate update
+
+# Adaptive sampling (sample_interval=None): idle rate with the MPU6050 motion
+# interrupt armed; full rate from the first idle poll that sees motion, back to
+# idle after QUIET_HOLD seconds without motion.
+IDLE_INTERVAL = 0.1      # 10 Hz while quiet
+ACTIVE_INTERVAL = 0.01   # 100 Hz while shaking
+QUIET_HOLD = 10.0
+MOTION_THRESHOLD = 10    # MOT_THR, 2 mg/LSB -> 20 mg (above sensor noise)
+MOTION_DURATION = 1      # MOT_DUR, ms above threshold before MOT_INT latches
+ACTIVE_MOTION_G = 0.03   # |a| deviation from the resting level that keeps full rate going
+REST_SMOOTHING = 0.05    # EMA weight for the resting |a| (absorbs sensor offset / tilt)
+INT_MOT = 0x40           # MOT_EN / MOT_INT bit (INT_ENABLE / INT_STATUS)
+ACCEL_HPF_5HZ = 0x01     # ACCEL_CONFIG: +/- 2G, 5 Hz high-pass for motion detection
+
+# EEW pre-arm profile (StateMachine PREARM): full rate and this trigger threshold (G deviation)
+PREARM_THRESHOLD = float(os.environ.get("POWERTAP_PREARM_THRESHOLD", "0.3"))
+
+SAMPLES = metrics.REGISTRY.counter('powertap_imu_samples_total', 'IMU samples read')
+TRIGGERS = metrics.REGISTRY.counter('powertap_imu_triggers_total', 'IMU shake threshold crossings')
+SAMPLE_RATE = metrics.REGISTRY.gauge('powertap_imu_sample_rate_hz', 'IMU samples per second achieved')
+ACTIVE_MODE = metrics.REGISTRY.gauge('powertap_imu_active', '1 while sampling at full rate (adaptive mode)')
+RATE_CHANGES = {
+    mode: metrics.REGISTRY.counter('powertap_imu_rate_changes_total', 'Adaptive sampling rate switches', to=mode)
+    for mode in ("active", "idle")
+}
+
 class IMUHandler:
-    def __init__(self, address=0x68, bus_num=1, threshold=2.0):
+    def __init__(self, address=0x68, bus_num=1, threshold=2.0, sample_interval=None, clock=None, backend=None):
+        """sample_interval: fixed seconds between samples, or None for adaptive sampling"""
         self.address = address
         self.bus_num = bus_num
         self.logger = logging.getLogger(__name__)
+        self.clock = clock or REAL_CLOCK
         self.threshold = threshold
+        self.base_threshold = threshold
+        self.prearmed = False
+        self.adaptive = sample_interval is None
+        self.fixed_interval = sample_interval
+        self.sample_interval = IDLE_INTERVAL if self.adaptive else sample_interval # Current seconds between samples
+        self.active = not self.adaptive
+        self.last_motion_at = None
+        self.rest_g = 1.0
         self.callback = None
+        self.sample_listener = None # Optional: fn(t, ax, ay, az) for every sample (e.g. GUI waveform)
         self.running = False
-        self.thread = None
-        self.mock_mode = False
-        try:
-            self.bus = smbus2.SMBus(bus_num) # Requires I2C enabled
-            self._init_mpu()
-        except (PermissionError, FileNotFoundError, OSError) as e:
-            self.logger.warning(f"Failed to access I2C bus: {e}. Switching to MOCK MODE.")
-            self.mock_mode = True
+        self.task = None
+        self.last_sample_at = None # clock.monotonic() of last sample
+        self.rate_window_start = None
+        self.rate_window_count = 0
+        self.bus = backends.i2c_bus(bus_num, clock=self.clock, backend=backend)
+        self.mock_mode = backends.is_simulated(self.bus)
+        self._init_mpu()
 
     def _init_mpu(self):
         try:
@@ -40,7 +83,14 @@ class IMUHandler:
             self.bus.write_byte_data(self.address, PWR_MGMT_1, 1)
             self.bus.write_byte_data(self.address, CONFIG, 0)
             self.bus.write_byte_data(self.address, GYRO_CONFIG, 24)
-            self.bus.write_byte_data(self.address, INT_ENABLE, 1)
+            if self.adaptive:
+                # Motion detection: the chip latches MOT_INT in INT_STATUS between our polls
+                self.bus.write_byte_data(self.address, ACCEL_CONFIG, ACCEL_HPF_5HZ)
+                self.bus.write_byte_data(self.address, MOT_THR, MOTION_THRESHOLD)
+                self.bus.write_byte_data(self.address, MOT_DUR, MOTION_DURATION)
+                self.bus.write_byte_data(self.address, INT_ENABLE, INT_MOT)
+            else:
+                self.bus.write_byte_data(self.address, INT_ENABLE, 1)
             self.logger.info("MPU6050 initialized")
         except Exception as e:
             self.logger.error(f"Failed to initialize MPU6050: {e}")
@@ -54,10 +104,6 @@ class IMUHandler:
         return value
 
     def get_accel_data(self):
-        if self.mock_mode:
-            import random
-            return 0.0, 0.0, 1.0 + random.uniform(-0.01, 0.01)
-
         try:
             Ax = self._read_raw_data(ACCEL_XOUT_H)
             Ay = self._read_raw_data(ACCEL_YOUT_H)
@@ -70,34 +116,116 @@ class IMUHandler:
 
             return Ax, Ay, Az
         except Exception as e:
-            self.logger.error(f"Error reading accelerometer: {e}")
+            self.logger.error("Error reading accelerometer: %s", e)
             return 0, 0, 0
 
     def start_monitoring(self, callback):
         self.callback = callback
         self.running = True
-        self.thread = threading.Thread(target=self._monitor_loop, daemon=True)
-        self.thread.start()
+        self.task = self.clock.spawn(self._monitor_step, name="imu")
         self.logger.info("IMU monitoring started")
 
     def stop_monitoring(self):
         self.running = False
-        if self.thread:
-            self.thread.join()
-
-    def _monitor_loop(self):
-        while self.running:
-            ax, ay, az = self.get_accel_data()
-            total_g = math.sqrt(ax**2 + ay**2 + az**2)
-
-            # Simple threshold check (Modify logic for better seismic detection)
-            # Normal gravity is 1.0G. Earthquake would deviate significantly.
-            if abs(total_g - 1.0) > self.threshold:
-                if self.callback:
-                    self.callback(total_g)
-                time.sleep(1) # Debounce
-
-            time.sleep(0.1)
+        if self.task:
+            self.task.stop()
+            self.task.join()
+
+    def get_health(self):
+        last = self.last_sample_at
+        return {
+            'running': self.running,
+            'mock_mode': self.mock_mode,
+            'sample_interval': self.sample_interval,
+            'prearmed': self.prearmed,
+            'last_sample_age': self.clock.monotonic() - last if last is not None else None,
+        }
+
+    def _monitor_step(self):
+        """One sample. Returns the delay until the next one (None = stop)."""
+        if not self.running:
+            return None
+        if self.adaptive and not self.active and self._motion_latched():
+            self._set_active(True, "motion interrupt")
+        ax, ay, az = self.get_accel_data()
+        now = self.last_sample_at = self.clock.monotonic()
+        SAMPLES.inc()
+        self._update_rate(now)
+        if self.sample_listener:
+            self.sample_listener(self.last_sample_at, ax, ay, az)
+        total_g = math.sqrt(ax**2 + ay**2 + az**2)
+
+        if self.adaptive:
+            if abs(total_g - self.rest_g) > ACTIVE_MOTION_G:
+                self.last_motion_at = now
+                if not self.active:
+                    self._set_active(True, f"{total_g:.2f}G")
+            else:
+                self.rest_g += REST_SMOOTHING * (total_g - self.rest_g)
+                if self.active and not self.prearmed and now - self.last_motion_at >= QUIET_HOLD:
+                    self._set_active(False, f"quiet for {QUIET_HOLD:.0f}s")
+
+        # Simple threshold check (Modify logic for better seismic detection)
+        # Normal gravity is 1.0G. Earthquake would deviate significantly.
+        if abs(total_g - 1.0) > self.threshold:
+            TRIGGERS.inc()
+            if self.callback:
+                self.callback(total_g)
+            return 1.0 + self.sample_interval # Debounce
+
+        return self.sample_interval
+
+    def prearm(self, threshold=PREARM_THRESHOLD):
+        """EEW pre-arm: full sample rate and a more sensitive threshold until disarm()."""
+        self.prearmed = True
+        self.threshold = min(self.base_threshold, threshold)
+        if self.adaptive:
+            if not self.active:
+                self._set_active(True, "EEW pre-arm")
+        else:
+            self.sample_interval = min(self.fixed_interval, ACTIVE_INTERVAL)
+        self.logger.info(f"IMU pre-armed: threshold {self.threshold:.2f}G, {1 / self.sample_interval:.0f} Hz")
+
+    def disarm(self):
+        """Back to the normal profile (adaptive sampling idles after QUIET_HOLD as usual)."""
+        if not self.prearmed:
+            return
+        self.prearmed = False
+        self.threshold = self.base_threshold
+        if not self.adaptive:
+            self.sample_interval = self.fixed_interval
+        self.logger.info(f"IMU disarmed: threshold {self.threshold:.2f}G")
+
+    def _motion_latched(self):
+        try:
+            return bool(self.bus.read_byte_data(self.address, INT_STATUS) & INT_MOT) # Read clears the latch
+        except Exception as e:
+            self.logger.error("Error reading INT_STATUS: %s", e)
+            return False
+
+    def _set_active(self, active, reason):
+        now = self.clock.monotonic()
+        self.active = active
+        self.sample_interval = ACTIVE_INTERVAL if active else IDLE_INTERVAL
+        if active:
+            self.last_motion_at = now
+        else:
+            self._motion_latched() # Discard the latch set during the active period
+        mode = "active" if active else "idle"
+        ACTIVE_MODE.set(int(active))
+        RATE_CHANGES[mode].inc()
+        event_store.record('imu_rate', {'mode': mode, 'interval': self.sample_interval, 'reason': reason})
+        self.logger.info("IMU sampling -> %s (%.0f Hz): %s", mode, 1 / self.sample_interval, reason)
+
+    def _update_rate(self, now):
+        if self.rate_window_start is None:
+            self.rate_window_start = now
+        self.rate_window_count += 1
+        elapsed = now - self.rate_window_start
+        if elapsed >= RATE_WINDOW:
+            SAMPLE_RATE.set(self.rate_window_count / elapsed)
+            self.rate_window_start = now
+            self.rate_window_count = 0
 
 if __name__ == "__main__":
     def alert(g):
@@ -1,27 +1,25 @@
-from gpiozero import OutputDevice
 import logging
 
+from src.core import event_store, metrics
+from src.hw import backends
+
+RELAY_OPS = {
+    op: metrics.REGISTRY.counter('powertap_relay_operations_total', 'Relay operations by kind', op=op)
+    for op in ("set", "set_relays", "all_on", "all_off")
+}
+
 class RelayController:
-    def __init__(self, callback=None):
+    def __init__(self, callback=None, backend=None):
         self.logger = logging.getLogger(__name__)
         self.callback = callback # Function to call on state change
         # Relay GPIO configuration (Based on test/relay_keyboard.py)
         # Low active assumption or High active?
         # test/relay_keyboard.py used active_high=True
-        try:
-            self.relays = {
-                1: OutputDevice(4, active_high=True, initial_value=False),
-                2: OutputDevice(17, active_high=True, initial_value=False),
-                3: OutputDevice(27, active_high=True, initial_value=False),
-                4: OutputDevice(22, active_high=True, initial_value=False)
-            }
-        except Exception as e:
-            self.logger.warning(f"GPIO Error: {e}. Using Mock Relays.")
-            class MockRelay:
-                def __init__(self): self.value = False
-                def on(self): self.value = True
-                def off(self): self.value = False
-            self.relays = {i: MockRelay() for i in range(1, 5)}
+        pins = {1: 4, 2: 17, 3: 27, 4: 22}
+        self.relays = {
+            relay_id: backends.output_device(pin, active_high=True, initial_value=False, backend=backend)
+            for relay_id, pin in pins.items()
+        }
 
     def set_relay(self, relay_id, state):
         """
@@ -34,8 +32,24 @@ class RelayController:
                 self.relays[relay_id].on()
             else:
                 self.relays[relay_id].off()
-            self.logger.info(f"Relay {relay_id} set to {'ON' if state else 'OFF'}")
-            if self.callback: self.callback(self.get_status())
+            RELAY_OPS["set"].inc()
+            self.logger.info("Relay %s set to %s", relay_id, 'ON' if state else 'OFF')
+            self._notify()
+
+    def set_relays(self, states):
+        """
+        Set several relays as one group update (single log line / callback).
+        :param states: {relay_id: True/False}
+        """
+        for relay_id, state in states.items():
+            if relay_id in self.relays:
+                if state:
+                    self.relays[relay_id].on()
+                else:
+                    self.relays[relay_id].off()
+        RELAY_OPS["set_relays"].inc()
+        self.logger.info("Relays set: %s", states)
+        self._notify()
 
     def toggle(self, relay_id):
         """Toggle relay state"""
@@ -49,15 +63,22 @@ class RelayController:
         """Turn multiple relays ON (e.g. for Recovery)"""
         for r in self.relays.values():
             r.on()
+        RELAY_OPS["all_on"].inc()
         self.logger.info("All relays ON")
-        if self.callback: self.callback(self.get_status())
+        self._notify()
 
     def all_off(self):
         """Turn ALL relays OFF (Safety Cutoff)"""
         for r in self.relays.values():
             r.off()
+        RELAY_OPS["all_off"].inc()
         self.logger.info("All relays OFF (CUTOFF)")
-        if self.callback: self.callback(self.get_status())
+        self._notify()
+
+    def _notify(self):
+        status = self.get_status()
+        event_store.record('relay', status)
+        if self.callback: self.callback(status)
 
     def get_status(self):
         return {k: v.value for k, v in self.relays.items()}
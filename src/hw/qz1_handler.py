@@ -1,7 +1,10 @@
-import serial
-import threading
-import time
 import logging
+import time
+
+from src.core import metrics
+from src.hw import backends
+from src.hw.clock import REAL_CLOCK
+from src.hw.gnss_clock import GNSSClock
 # Placeholder for azarashi import. Expected usage based on research.
 try:
     import azarashi
@@ -9,46 +12,92 @@ except ImportError:
     azarashi = None
     logging.warning("azarashi library not found. QZ1Handler will not decode messages.")
 
+SENTENCES = metrics.REGISTRY.counter('powertap_qz1_sentences_total', 'NMEA sentences received')
+DECODES = metrics.REGISTRY.counter('powertap_qz1_decodes_total', 'QZQSM sentences decoded')
+DECODE_ERRORS = metrics.REGISTRY.counter('powertap_qz1_decode_errors_total', 'QZQSM sentences that failed to decode')
+DECODE_TIME = metrics.REGISTRY.histogram('powertap_qz1_decode_seconds', 'azarashi.decode() time')
+
 class QZ1Handler:
-    def __init__(self, port='/dev/ttyUSB0', baudrate=9600, callback=None):
+    def __init__(self, port='/dev/ttyUSB0', baudrate=9600, callback=None, clock=None, backend=None):
         self.port = port
         self.baudrate = baudrate
         self.callback = callback
+        self.clock = clock or REAL_CLOCK
+        self.backend = backend
         self.running = False
-        self.thread = None
+        self.task = None
+        self.serial = None # Opened by the reader (backends.serial_port)
         self.logger = logging.getLogger(__name__)
+        self.port_open = False
+        self.last_sentence_at = None # clock.monotonic() of last NMEA sentence
+        self.gnss = GNSSClock(self.clock) # Fed with the receiver's RMC / ZDA / GGA
 
     def start(self):
         if self.running:
             return
         self.running = True
-        self.thread = threading.Thread(target=self._read_loop, daemon=True)
-        self.thread.start()
+        self.task = self.clock.spawn(self._read_step, name="qz1")
         self.logger.info(f"QZ1Handler started on {self.port}")
 
     def stop(self):
         self.running = False
-        if self.thread:
-            self.thread.join()
+        if self.task:
+            self.task.stop()
+            self.task.join()
+        self._close()
         self.logger.info("QZ1Handler stopped")
 
-    def _read_loop(self):
+    def _close(self):
+        if self.serial is not None:
+            self.serial.close()
+            self.serial = None
+        self.port_open = False
+
+    def _read_step(self):
+        """Reads one line. Returns the delay until the next read (None = stop)."""
+        if not self.running:
+            self._close()
+            return None
         try:
-            with serial.Serial(self.port, self.baudrate, timeout=1) as ser:
-                while self.running:
-                    line = ser.readline()
-                    if line:
-                        try:
-                            decoded_line = line.decode('utf-8', errors='ignore').strip()
-                            if decoded_line.startswith('$'): # NMEA sentence
-                                self._process_nmea(decoded_line)
-                            # Add support for binary if needed
-                        except Exception as e:
-                            self.logger.error(f"Error reading/decoding line: {e}")
-        except serial.SerialException as e:
+            if self.serial is None:
+                self.serial = backends.serial_port(self.port, self.baudrate, timeout=1,
+                                                   clock=self.clock, backend=self.backend)
+                # A stand-in for a missing receiver (auto fallback) is not an open port
+                self.port_open = not backends.is_simulated(self.serial) or backends.simulation_only(self.backend)
+            line = self.serial.readline() # Real port: blocks up to timeout
+        except Exception as e:
             self.logger.error(f"Serial port error: {e}")
+            self._close()
+            return None
+        if not line:
+            # Simulated ports never block; poll again later
+            return getattr(self.serial, 'poll_interval', 0)
+        try:
+            decoded_line = line.decode('utf-8', errors='ignore').strip()
+            if decoded_line.startswith('$'): # NMEA sentence
+                received_at = self.last_sentence_at = self.clock.monotonic()
+                SENTENCES.inc()
+                self._process_nmea(decoded_line, received_at)
+            # Add support for binary if needed
+        except Exception as e:
+            self.logger.error("Error reading/decoding line: %s", e)
+        return 0
 
-    def _process_nmea(self, nmea_sentence):
+    def get_health(self):
+        last = self.last_sentence_at
+        return {
+            'running': self.running,
+            'port_open': self.port_open,
+            'last_sentence_age': self.clock.monotonic() - last if last is not None else None,
+            'gnss': self.gnss.get_health(),
+        }
+
+    def _process_nmea(self, nmea_sentence, received_at=None):
+        """received_at: clock.monotonic() when the line arrived (DC Reports are stamped with it)"""
+        if received_at is None:
+            received_at = self.clock.monotonic()
+        if self.gnss.update(nmea_sentence, received_at):
+            return
         # Specific check for QZSS signals if needed (e.g., $QZQSM)
         # Using azarashi to decode
         if azarashi:
@@ -60,18 +109,23 @@ class QZ1Handler:
 
                 # Check for QZQSM or similar DCR NMEA content
                 if "QZQSM" in nmea_sentence:
+                   t0 = time.perf_counter()
                    reports = azarashi.decode(nmea_sentence)
+                   DECODE_TIME.observe(time.perf_counter() - t0)
+                   DECODES.inc()
+                   stamp = self.gnss.stamp(received_at)
                    # azarashi might return a list of reports or a single report
                    for report in reports:
                        if self.callback:
-                           self.callback(report)
+                           self.callback(report, stamp)
             except Exception as e:
-                self.logger.debug(f"Failed to decode with azarashi: {e}")
+                DECODE_ERRORS.inc()
+                self.logger.debug("Failed to decode with azarashi: %s", e)
 
 if __name__ == "__main__":
     # Test stub
-    def print_alert(report):
-        print(f"Alert received: {report}")
+    def print_alert(report, stamp=None):
+        print(f"Alert received: {report} ({stamp})")
 
     logging.basicConfig(level=logging.INFO)
     handler = QZ1Handler(callback=print_alert)
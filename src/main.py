@@ -1,3 +1,6 @@
+import time
+BOOT_T0 = time.monotonic() # Before any heavy import
+
 import sys
 import os
 import logging
@@ -5,70 +8,138 @@ import logging
 # Ensure src is in path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
-from src.hw.qz1_handler import QZ1Handler
-from src.hw.imu_handler import IMUHandler
-from src.hw.power_control import RelayController
-from src.hw.button_handler import ButtonHandler
-from src.hw.audio import AudioHandler
-from src.core.state_machine import StateMachine
-from src.client.socket_client import SocketIOClient
-from src.gui.app_window import AppWindow
+from src.core.boot import BootTimeline, DeferredAudio
+from src.core import log_setup
+
+# Heavy modules (dearpygui, pygame, socketio) are imported inside their boot phase,
+# after the safety core (relays + QZ1 + IMU + StateMachine) is armed.
+
+# "single" (one process) or "supervisor" (safety core isolated in its own process)
+MODE = os.environ.get("POWERTAP_MODE", "single")
+
+# Device <-> web server transport: "socketio" (TCP) or "ipc" (Unix domain socket, same host)
+TRANSPORT = os.environ.get("POWERTAP_TRANSPORT", "socketio")
+
+# Fleet mode: device id and tags ("floor=3,zone=A") announced to the web server
+DEVICE_ID = os.environ.get("POWERTAP_DEVICE_ID", "default")
+DEVICE_TAGS = dict(
+    tag.split("=", 1) for tag in os.environ.get("POWERTAP_DEVICE_TAGS", "").split(",") if "=" in tag
+)
 
 def main():
-    # Setup Logging
-    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if MODE == "supervisor":
+        from src.core.supervisor import run_supervisor
+        run_supervisor(transport=TRANSPORT, device_id=DEVICE_ID, tags=DEVICE_TAGS)
+        return
+
+    # Setup Logging (queued writer thread, rate limited, crash ring buffer)
+    log_setup.setup()
     logger = logging.getLogger("Main")
+    boot = BootTimeline(BOOT_T0)
+    components = {}
 
     try:
+        # --- Phase 1: Safety core (relay control + sensors) ---
         logger.info("Initializing Hardware...")
-        qz1 = QZ1Handler()
-        imu = IMUHandler()
+        with boot.phase("import:safety"):
+            from src.hw.qz1_handler import QZ1Handler
+            from src.hw.imu_handler import IMUHandler
+            from src.hw.power_control import RelayController
+            from src.core.state_machine import StateMachine
+            from src.core import event_store
 
         # Define callback wrapper for PowerControl
-        # We need access to socket_client, which is defined later.
-        # Use a mutable container or late binding.
-        client_container = {}
+        # The network client is created later (in parallel), so bind late.
         def power_callback(status):
-            if 'client' in client_container:
-                client_container['client'].emit_status(status)
+            if 'client' in components:
+                components['client'].emit_status(status)
+
+        with boot.phase("init:relays"):
+            power = RelayController(callback=power_callback)
+        with boot.phase("init:qz1"):
+            qz1 = QZ1Handler()
+        with boot.phase("init:imu"):
+            imu = IMUHandler()
 
-        power = RelayController(callback=power_callback)
-        audio = AudioHandler()
+        # Event history: open before arming so the first transition is recorded
+        with boot.phase("init:events"):
+            event_store.STORE.open()
+            components['events'] = event_store.STORE
+
+        # Audio is attached when ready; alarm requests made before that are replayed
+        audio = DeferredAudio()
 
         logger.info("Initializing Core Logic...")
-        sm = StateMachine(qz1, imu, power, audio)
-
-        logger.info("Initializing Socket.IO Client...")
-        socket_client = SocketIOClient(sm)
-        client_container['client'] = socket_client
-        socket_client.start()
-
-        logger.info("Initializing Controls...")
-        # Bind buttons to SM
-        buttons = ButtonHandler()
-        # Map buttons to SM actions
-        buttons.assign_callback(1, lambda: sm.on_button_press(1))
-        buttons.assign_callback(2, lambda: sm.on_button_press(2))
-        buttons.assign_callback(3, lambda: sm.on_button_press(3))
-        buttons.assign_callback(4, lambda: sm.on_button_press(4))
-        buttons.assign_callback(5, lambda: sm.on_button_press(5))
-
-        logger.info("Starting System...")
-        sm.start()
+        with boot.phase("arm:core"):
+            sm = StateMachine(qz1, imu, power, audio)
+            components['sm'] = sm
+            sm.start()
+        boot.mark("protected")
+        logger.info("Safety core armed")
+
+        # --- Phase 2: Everything else, in parallel ---
+        def start_audio():
+            from src.hw.audio import AudioHandler
+            audio.attach(AudioHandler())
+
+        def start_network():
+            if TRANSPORT == "ipc":
+                logger.info("Initializing IPC Client...")
+                from src.client.ipc_client import IPCClient
+                client = IPCClient(sm, device_id=DEVICE_ID, tags=DEVICE_TAGS)
+            else:
+                logger.info("Initializing Socket.IO Client...")
+                from src.client.socket_client import SocketIOClient
+                client = SocketIOClient(sm, device_id=DEVICE_ID, tags=DEVICE_TAGS)
+            client.start()
+            components['client'] = client
+
+        def start_buttons():
+            logger.info("Initializing Controls...")
+            from src.hw.button_handler import ButtonHandler
+            buttons = ButtonHandler()
+            # Map buttons to SM actions
+            buttons.assign_callback(1, lambda: sm.on_button_press(1))
+            buttons.assign_callback(2, lambda: sm.on_button_press(2))
+            buttons.assign_callback(3, lambda: sm.on_button_press(3))
+            buttons.assign_callback(4, lambda: sm.on_button_press(4))
+            buttons.assign_callback(5, lambda: sm.on_button_press(5))
+            components['buttons'] = buttons
 
+        def start_metrics():
+            from src.core import metrics
+            components['metrics'] = metrics.serve(routes={'/events': event_store.STORE.http_query})
+
+        boot.run_parallel("init:audio", start_audio)
+        boot.run_parallel("init:network", start_network)
+        boot.run_parallel("init:buttons", start_buttons)
+        boot.run_parallel("init:metrics", start_metrics)
+
+        # GUI must stay on the main thread
         logger.info("Starting GUI...")
-        app = AppWindow(sm)
+        with boot.phase("import:gui"):
+            from src.gui.app_window import AppWindow
+        with boot.phase("init:gui"):
+            app = AppWindow(sm)
+        boot.mark("gui_ready")
+        logger.info(boot.report())
+
         app.run() # Blocking call
 
     except KeyboardInterrupt:
         logger.info("Shutdown requested")
     except Exception as e:
         logger.critical(f"Fatal Error: {e}", exc_info=True)
+        path = log_setup.dump_ring("fatal")
+        if path:
+            logger.critical(f"Recent log records written to {path}")
     finally:
         logger.info("Cleaning up...")
-        if 'socket_client' in locals(): socket_client.stop()
-        if 'sm' in locals(): sm.stop()
-        if 'buttons' in locals(): buttons.cleanup()
+        if 'client' in components: components['client'].stop()
+        if 'sm' in components: components['sm'].stop()
+        if 'buttons' in components: components['buttons'].cleanup()
+        if 'events' in components: components['events'].close()
+        log_setup.shutdown()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,259 @@
+import random
+
+from src.core.eew import INTENSITY_SCALE
+from src.hw.gnss_clock import format_sentence, nmea_checksum
+
+# $QZQSM (QZSS L1S DC Report) synthesizer for decoder stress and fuzz tests.
+#
+# A message is 250 bits (IS-QZSS-DCR): preamble 8, message type 6, data 212,
+# CRC-24Q 24 over the first 226 bits. The sentence payload is the message plus
+# 2 zero bits as 63 hex digits: $QZQSM,<satellite id>,<hex>*hh
+#
+# DC Reports (MT 43) share the report header (report classification, disaster
+# category, report time, information type) and the version number at bit 200.
+# EEW and hypocenter reports get their full field layouts; the other categories
+# carry their notification code and a raw body (random in random_message()),
+# which is all a decoder needs to be stressed with. DCX (MT 44, J-Alert /
+# L-Alert) is a raw data field.
+
+MESSAGE_BITS = 250
+CRC_START = 226           # CRC covers bits [0, CRC_START)
+CRC24Q_POLY = 0x864CFB    # x^24 + x^23 + x^18 + x^17 + x^14 + x^11 + x^10 + x^7 + x^6 + x^5 + x^4 + x^3 + x + 1
+PAYLOAD_DIGITS = 63       # (250 + 2 padding bits) / 4
+PREAMBLES = (0x53, 0x9A, 0xC6) # Sent in rotation
+SATELLITE_ID = 55         # QZS PRN 183
+MT_DC_REPORT = 43
+MT_DCX = 44
+VERSION = 1
+
+REPORT_CLASSES = {'maximum_priority': 1, 'priority': 2, 'regular': 3, 'training': 7}
+INFORMATION_TYPES = {'issue': 0, 'correction': 1, 'cancellation': 2}
+
+# name -> (message type, disaster category code)
+CATEGORIES = {
+    'eew': (MT_DC_REPORT, 1),
+    'hypocenter': (MT_DC_REPORT, 2),
+    'seismic_intensity': (MT_DC_REPORT, 3),
+    'nankai_trough': (MT_DC_REPORT, 4),
+    'tsunami': (MT_DC_REPORT, 5),
+    'nw_pacific_tsunami': (MT_DC_REPORT, 6),
+    'volcano': (MT_DC_REPORT, 8),
+    'ash_fall': (MT_DC_REPORT, 9),
+    'weather': (MT_DC_REPORT, 10),
+    'flood': (MT_DC_REPORT, 11),
+    'typhoon': (MT_DC_REPORT, 12),
+    'marine': (MT_DC_REPORT, 14),
+    'j_alert': (MT_DCX, None),
+}
+
+# (name, first bit, width)
+HEADER_FIELDS = (
+    ('report_class', 14, 3),
+    ('category', 17, 4),
+    ('month', 21, 4),
+    ('day', 25, 5),
+    ('hour', 30, 5),
+    ('minute', 35, 6),
+    ('information_type', 41, 2),
+    ('version', 200, 6),
+)
+_ORIGIN_TIME = (('origin_day', 52, 5), ('origin_hour', 57, 5), ('origin_minute', 62, 6))
+_EARTHQUAKE = _ORIGIN_TIME + (('depth', 68, 9), ('magnitude', 77, 7), ('epicenter', 84, 10))
+CATEGORY_FIELDS = {
+    'eew': (('notifications', 43, 9),) + _EARTHQUAKE + (
+        ('intensity_lower', 94, 4), ('intensity_upper', 98, 4), ('regions', 102, 80)),
+    'hypocenter': (('notifications', 43, 9),) + _EARTHQUAKE + (
+        ('latitude_south', 94, 1), ('latitude_degrees', 95, 7), ('latitude_minutes', 102, 6),
+        ('latitude_seconds', 108, 6), ('longitude_west', 114, 1), ('longitude_degrees', 115, 8),
+        ('longitude_minutes', 123, 6), ('longitude_seconds', 129, 6)),
+    'j_alert': (('body', 14, CRC_START - 14),),
+}
+GENERIC_FIELDS = (('notifications', 43, 9), ('body', 52, 200 - 52))
+
+DEFAULT_TIME = (4, 1, 12, 0) # Report time (month, day, hour, minute), JST
+
+CORRUPTIONS = ("bit_flip", "bad_checksum", "truncated", "bad_hex", "short_payload", "long_payload",
+               "lowercase_hex", "bad_preamble", "unknown_type", "missing_fields", "binary", "long_line")
+
+
+def crc24q(value, nbits):
+    """CRC-24Q of the `nbits` low bits of `value`, most significant bit first."""
+    crc = 0
+    for i in range(nbits - 1, -1, -1):
+        top = ((crc >> 23) & 1) ^ ((value >> i) & 1)
+        crc = (crc << 1) & 0xFFFFFF
+        if top:
+            crc ^= CRC24Q_POLY
+    return crc
+
+
+def fields_for(category):
+    if category in CATEGORY_FIELDS:
+        return CATEGORY_FIELDS[category]
+    if category not in CATEGORIES:
+        raise ValueError(f"Unknown disaster category: {category}")
+    return GENERIC_FIELDS
+
+
+def _code(name, value):
+    """Readable values to field codes; ints are taken as raw codes."""
+    if isinstance(value, int):
+        return value
+    if name.startswith('intensity_'):
+        return INTENSITY_SCALE.index(value) + 1 # 1 = intensity 0 ... 10 = intensity 7
+    if name == 'magnitude':
+        return int(round(value * 10))
+    if name == 'regions':
+        mask = 0
+        for region in value: # EEW forecast region numbers, 1 = most significant bit
+            mask |= 1 << (80 - region)
+        return mask
+    raise ValueError(f"{name}: expected an int, got {value!r}")
+
+
+def _put(bits, name, offset, width, value):
+    if not 0 <= value < 1 << width:
+        raise ValueError(f"{name}={value} does not fit in {width} bits")
+    shift = MESSAGE_BITS - offset - width
+    return bits & ~(((1 << width) - 1) << shift) | value << shift
+
+
+def _get(bits, offset, width):
+    return (bits >> (MESSAGE_BITS - offset - width)) & ((1 << width) - 1)
+
+
+def _frame(bits, satellite_id=SATELLITE_ID, crc=None):
+    """250-bit message (CRC bits ignored) -> sentence with CRC-24Q and NMEA checksum."""
+    data = bits >> (MESSAGE_BITS - CRC_START)
+    if crc is None:
+        crc = crc24q(data, CRC_START)
+    payload = (data << 24 | crc) << 2
+    return format_sentence(f"QZQSM,{satellite_id},{payload:0{PAYLOAD_DIGITS}X}")
+
+
+def encode(category="eew", fields=None, report_class="maximum_priority", information_type="issue",
+           report_time=DEFAULT_TIME, preamble=0, satellite_id=SATELLITE_ID, version=VERSION):
+    """
+    One $QZQSM sentence.
+    fields: {name: value} for the category's fields (see fields_for(); missing = 0). Values are
+    raw codes (int), or for intensity_* / magnitude / regions: '5-', 6.8, [region numbers].
+    preamble: index into PREAMBLES (the rotation position).
+    """
+    message_type, code = CATEGORIES.get(category, (None, None))
+    layout = fields_for(category)
+    bits = _put(0, 'preamble', 0, 8, PREAMBLES[preamble % len(PREAMBLES)])
+    bits = _put(bits, 'message_type', 8, 6, message_type)
+    if message_type == MT_DC_REPORT:
+        month, day, hour, minute = report_time
+        header = {'report_class': REPORT_CLASSES.get(report_class, report_class), 'category': code,
+                  'month': month, 'day': day, 'hour': hour, 'minute': minute,
+                  'information_type': INFORMATION_TYPES.get(information_type, information_type),
+                  'version': version}
+        for name, offset, width in HEADER_FIELDS:
+            bits = _put(bits, name, offset, width, header[name])
+    names = {name for name, _, _ in layout}
+    for name in fields or {}:
+        if name not in names:
+            raise ValueError(f"{category} has no field {name}")
+    for name, offset, width in layout:
+        bits = _put(bits, name, offset, width, _code(name, (fields or {}).get(name, 0)))
+    return _frame(bits, satellite_id)
+
+
+def unpack(sentence):
+    """
+    Parse a $QZQSM sentence back into its fields (for self-checks of the encoder).
+    Raises ValueError on framing errors; 'crc_ok' tells whether the CRC-24Q matches.
+    """
+    star = sentence.rfind('*')
+    if not sentence.startswith('$QZQSM,') or star < 0:
+        raise ValueError("Not a $QZQSM sentence")
+    body = sentence[1:star]
+    if sentence[star + 1:star + 3].upper() != nmea_checksum(body):
+        raise ValueError("Bad NMEA checksum")
+    parts = body.split(',')
+    if len(parts) != 3 or len(parts[2]) != PAYLOAD_DIGITS:
+        raise ValueError("Bad $QZQSM payload")
+    bits = int(parts[2], 16) >> 2
+    result = {
+        'satellite_id': int(parts[1]),
+        'preamble': _get(bits, 0, 8),
+        'message_type': _get(bits, 8, 6),
+        'crc_ok': crc24q(bits >> 24, CRC_START) == bits & 0xFFFFFF,
+    }
+    category = None
+    if result['message_type'] == MT_DC_REPORT:
+        for name, offset, width in HEADER_FIELDS:
+            result[name] = _get(bits, offset, width)
+        category = next((name for name, (mt, code) in CATEGORIES.items()
+                         if mt == MT_DC_REPORT and code == result['category']), None)
+    elif result['message_type'] == MT_DCX:
+        category = 'j_alert'
+    result['category_name'] = category
+    if category is not None:
+        for name, offset, width in fields_for(category):
+            result[name] = _get(bits, offset, width)
+    return result
+
+
+def random_message(rng=None, category=None):
+    """(category, sentence) with random header and field values (valid framing and CRC)."""
+    rng = rng or random.Random()
+    category = category or rng.choice(list(CATEGORIES))
+    fields = {name: rng.getrandbits(width) for name, _, width in fields_for(category)}
+    report_time = (rng.randint(1, 12), rng.randint(1, 31), rng.randint(0, 23), rng.randint(0, 59))
+    sentence = encode(category, fields, report_class=rng.choice(list(REPORT_CLASSES)),
+                      information_type=rng.choice(list(INFORMATION_TYPES)), report_time=report_time,
+                      preamble=rng.randrange(len(PREAMBLES)))
+    return category, sentence
+
+
+def corrupt(sentence, rng=None, kind=None):
+    """
+    (kind, line): a damaged variant of a valid sentence. Lines are str, except
+    'binary' (bytes, not valid UTF-8). See CORRUPTIONS for the kinds.
+    """
+    rng = rng or random.Random()
+    kind = kind or rng.choice(CORRUPTIONS)
+    star = sentence.rfind('*')
+    body = sentence[1:star]
+    head, payload = body.rsplit(',', 1)
+    bits = int(payload, 16) >> 2
+    if kind == "bit_flip":
+        # Framing and NMEA checksum fine, CRC-24Q wrong
+        bits ^= 1 << rng.randrange(MESSAGE_BITS)
+        crc = bits & 0xFFFFFF
+        return kind, _frame(bits, head.split(',')[1], crc=crc)
+    if kind == "bad_checksum":
+        checksum = int(sentence[star + 1:star + 3], 16) ^ rng.randint(1, 255)
+        return kind, f"{sentence[:star]}*{checksum:02X}"
+    if kind == "truncated":
+        return kind, sentence[:rng.randrange(1, len(sentence) - 1)]
+    if kind == "bad_hex":
+        i = rng.randrange(len(payload))
+        return kind, format_sentence(f"{head},{payload[:i]}{rng.choice('GZ-. ')}{payload[i + 1:]}")
+    if kind == "short_payload":
+        return kind, format_sentence(f"{head},{payload[:rng.randrange(PAYLOAD_DIGITS)]}")
+    if kind == "long_payload":
+        extra = "".join(rng.choice("0123456789ABCDEF") for _ in range(rng.randint(1, 64)))
+        return kind, format_sentence(f"{head},{payload}{extra}")
+    if kind == "lowercase_hex":
+        return kind, format_sentence(f"{head},{payload.lower()}")
+    if kind == "bad_preamble":
+        preamble = rng.choice([p for p in range(256) if p not in PREAMBLES])
+        return kind, _frame(_put(bits, 'preamble', 0, 8, preamble), head.split(',')[1])
+    if kind == "unknown_type":
+        # Valid CRC, but a message type / disaster category nobody defined
+        if rng.random() < 0.5:
+            bits = _put(bits, 'message_type', 8, 6, rng.choice([t for t in range(64) if t not in (MT_DC_REPORT, MT_DCX)]))
+        else:
+            bits = _put(_put(bits, 'message_type', 8, 6, MT_DC_REPORT), 'category', 17, 4, rng.choice((0, 7, 13, 15)))
+        return kind, _frame(bits, head.split(',')[1])
+    if kind == "missing_fields":
+        return kind, rng.choice(("$QZQSM*", format_sentence("QZQSM"), format_sentence("QZQSM,,"),
+                                 format_sentence(f"QZQSM,{payload}"), format_sentence(f"{head},")))
+    if kind == "binary":
+        return kind, b"$QZQSM," + bytes(rng.getrandbits(8) | 0x80 for _ in range(rng.randint(1, 80)))
+    if kind == "long_line":
+        return kind, format_sentence(f"{head},{payload * rng.randint(50, 200)}")
+    raise ValueError(f"Unknown corruption: {kind}")
@@ -0,0 +1,114 @@
+import logging
+import random
+import time
+
+from src.hw import backends
+from src.hw.clock import VirtualClock
+from src.hw.qz1_handler import QZ1Handler
+from src.hw.imu_handler import IMUHandler
+from src.hw.power_control import RelayController
+from src.hw.audio import AudioHandler
+from src.hw.button_handler import ButtonHandler
+from src.hw.gnss_clock import format_sentence
+from src.core.state_machine import StateMachine
+
+# Full safety core (QZ1 + IMU + StateMachine + relays + buzzer + buttons) on
+# simulated hardware and a VirtualClock. Scenarios are scheduled in simulated
+# seconds and run as fast as the CPU allows; the same seed gives the same trace.
+
+
+class Simulator:
+    def __init__(self, seed=0, imu_interval=None, imu_threshold=2.0):
+        """imu_interval: fixed IMU sample interval, None = adaptive (as deployed)"""
+        self.logger = logging.getLogger(__name__)
+        self.clock = VirtualClock()
+        self.trace = [] # (t, event, state, relays)
+
+        self.power = RelayController(callback=self._on_relays, backend="sim")
+        self.qz1 = QZ1Handler(clock=self.clock, backend="sim")
+        self.imu = IMUHandler(threshold=imu_threshold, sample_interval=imu_interval,
+                              clock=self.clock, backend="sim")
+        self.imu.bus.rng = random.Random(seed)
+        self.audio = AudioHandler(clock=self.clock, backend="sim")
+        self.sm = StateMachine(self.qz1, self.imu, self.power, self.audio)
+        self.buttons = ButtonHandler(backend="sim")
+        for btn_id in self.buttons.buttons:
+            self.buttons.assign_callback(btn_id, lambda btn_id=btn_id: self.sm.on_button_press(btn_id))
+
+    def _on_relays(self, status):
+        self.record("relays")
+
+    def record(self, event):
+        state = getattr(getattr(self, 'sm', None), 'current_state', "BOOT")
+        self.trace.append((self.clock.monotonic(), event, state, dict(self.power.get_status())))
+
+    def start(self):
+        self.sm.start()
+        self.clock.run_until(self.clock.now) # First sensor steps (opens the serial port)
+
+    def stop(self):
+        self.sm.stop()
+
+    # --- Scenario helpers (times are absolute simulated seconds) ---
+
+    def at(self, t, fn, event=None):
+        def fire():
+            if event:
+                self.record(event)
+            fn()
+        return self.clock.call_later(t - self.clock.now, fire)
+
+    def shake(self, amplitude_g, frequency_hz, start, duration):
+        self.imu.bus.source = backends.shake(amplitude_g, frequency_hz, start, duration)
+        self.at(start, lambda: None, event=f"shake {amplitude_g}G")
+
+    def quake(self, p_amplitude_g, s_amplitude_g, start, p_duration, s_duration):
+        """P-wave then S-wave (see backends.quake). Returns the source (s_start = S-wave onset)."""
+        source = backends.quake(p_amplitude_g, s_amplitude_g, start, p_duration, s_duration)
+        self.imu.bus.source = source
+        self.at(start, lambda: None, event=f"quake {s_amplitude_g}G")
+        return source
+
+    def qzss_report(self, report, at):
+        """A decoded DC Report (bypasses the NMEA decoder, stamped like the reader does)."""
+        self.at(at, lambda: self.qz1.callback(report, self.qz1.gnss.stamp(self.clock.now)), event="qzss_report")
+
+    def qzss_sentence(self, sentence, at):
+        """A raw NMEA line on the receiver's serial port."""
+        self.qz1.serial.feed(sentence, at)
+
+    def gnss_fix(self, start, end, delay=0.05):
+        """RMC + GGA for every GNSS second in [start, end), printed `delay` seconds after the epoch."""
+        for second in range(int(start), int(end)):
+            utc = time.gmtime(self.clock.wall_offset + second)
+            hhmmss = time.strftime("%H%M%S", utc)
+            self.qzss_sentence(format_sentence(f"GPRMC,{hhmmss}.00,A,3541.1493,N,13945.3994,E,0.0,0.0,"
+                                               f"{time.strftime('%d%m%y', utc)},,,A"), second + delay)
+            self.qzss_sentence(format_sentence(f"GPGGA,{hhmmss}.00,3541.1493,N,13945.3994,E,1,08,1.0,6.9,M,35.9,M,,"),
+                               second + delay + 0.02)
+
+    def press(self, btn_id, at):
+        self.at(at, lambda: self.buttons.buttons[btn_id].press(), event=f"button {btn_id}")
+
+    def run(self, seconds):
+        self.clock.run_for(seconds)
+
+    def run_until(self, t):
+        self.clock.run_until(t)
+
+    # --- Trace queries ---
+
+    def states(self):
+        """State sequence with consecutive duplicates removed."""
+        seq = []
+        for _, _, state, _ in self.trace:
+            if not seq or seq[-1] != state:
+                seq.append(state)
+        return seq
+
+    def first(self, state, after=0.0):
+        """Time of the first trace entry in `state` at or after `after` (None if never)."""
+        for t, _, s, _ in self.trace:
+            if t >= after and s == state:
+                return t
+        return None
@@ -0,0 +1,323 @@
+# Component micro-benchmarks (headless: simulated hardware, no GUI / server).
+# Times each hot-path operation and measures its memory allocation, compares
+# against the stored baseline and exits 1 on a regression beyond the tolerance.
+#
+#   python3 test/benchmarks.py                 # compare with test/benchmarks_baseline.json
+#   python3 test/benchmarks.py --update        # (re)record the baseline on this machine
+#   python3 test/benchmarks.py -k relay        # only benchmarks whose name contains "relay"
+#
+# Baselines are machine-specific: record them on the machine that runs the gate.
+
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import timeit
+import tracemalloc
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.client.base_client import BaseClient
+from src.core.state_machine import StateMachine
+from src.gui.layout import compute_layout, TEXT_ITEMS
+from src.hw import qz1_handler
+from src.hw.audio import AudioHandler
+from src.hw.clock import VirtualClock
+from src.hw.imu_handler import IMUHandler
+from src.hw.power_control import RelayController
+from src.hw.qz1_handler import QZ1Handler
+
+# --- 設定項目 ---
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "benchmarks_baseline.json")
+TIME_TOLERANCE = 0.5     # Fail when slower than baseline * (1 + tolerance)
+ALLOC_TOLERANCE = 0.2    # Fail when peak allocation exceeds baseline * (1 + tolerance) + ALLOC_SLACK
+ALLOC_SLACK = 512        # Bytes (interpreter-internal caches make tiny allocations jitter)
+REPEATS = 5              # Best of N repeats
+RETRIES = 2              # Re-measure a failing benchmark (noisy machines) before reporting it
+ALLOC_CALLS = 200        # Calls traced for the allocation measurement
+
+QZQSM = "$QZQSM,55,53AD1A3C16C0001FC5E0090E7C7F0EC4A7C6C1E1B3EC58FE9E00000000A0C3A6*0F"
+GGA = "$GPGGA,085120.307,3541.1493,N,13945.3994,E,1,08,1.0,6.9,M,35.9,M,,0000*69"
+
+
+# --- Benchmarks: each setup returns a zero-argument operation ---
+
+def bench_nmea_framing():
+    """One serial line through QZ1Handler._read_step (decode, framing, dispatch)."""
+    clock = VirtualClock()
+    qz1 = QZ1Handler(callback=lambda report, stamp=None: None, clock=clock, backend="sim")
+    qz1.running = True
+    qz1._read_step() # Opens the simulated port
+    feed = qz1.serial.feed
+    step = qz1._read_step
+    def op():
+        feed(GGA)
+        step()
+    return op
+
+
+def bench_qz1_process_nmea():
+    """QZQSM sentence through QZ1Handler._process_nmea (azarashi decode when installed)."""
+    qz1 = QZ1Handler(callback=lambda report, stamp=None: None, clock=VirtualClock(), backend="sim")
+    return lambda: qz1._process_nmea(QZQSM)
+
+
+def bench_imu_decode():
+    """Accelerometer read + raw -> G conversion (6 register reads)."""
+    imu = IMUHandler(sample_interval=0.01, clock=VirtualClock(), backend="sim")
+    return imu.get_accel_data
+
+
+def _imu_step(sample_interval):
+    imu = IMUHandler(sample_interval=sample_interval, clock=VirtualClock(), backend="sim")
+    imu.callback = lambda g: None
+    imu.running = True
+    return imu._monitor_step
+
+
+def bench_imu_detect_fixed():
+    """One IMU sample + threshold check at the fixed full rate."""
+    return _imu_step(0.01)
+
+
+def bench_imu_detect_adaptive():
+    """One idle adaptive IMU sample (motion-interrupt poll + sample + rest-level update)."""
+    return _imu_step(None)
+
+
+def bench_state_machine_cycle():
+    """NORMAL -> ALERT (QZSS report) -> RECOVERY -> NORMAL (reset button) with simulated hardware."""
+    clock = VirtualClock()
+    power = RelayController(backend="sim")
+    qz1 = QZ1Handler(clock=clock, backend="sim")
+    imu = IMUHandler(clock=clock, backend="sim")
+    audio = AudioHandler(clock=clock, backend="sim")
+    sm = StateMachine(qz1, imu, power, audio)
+    sm._transition_to(sm.STATE_NORMAL)
+    def op():
+        sm.on_qz1_message("benchmark report")
+        sm.on_button_press(1)
+        clock.run_until(clock.now) # Drop the cancelled alarm step
+    return op
+
+
+def bench_relay_bulk():
+    """Group update + all off + all on."""
+    power = RelayController(callback=lambda status: None, backend="sim")
+    states = {1: False, 2: True, 3: False, 4: True}
+    def op():
+        power.set_relays(states)
+        power.all_off()
+        power.all_on()
+    return op
+
+
+class _BenchClient(BaseClient):
+    """
+    SocketIOClient without the transport: its on_control handler only forwards
+    to handle_control, which is what gets measured.
+    """
+
+    @property
+    def connected(self):
+        return False
+
+    def _connect(self):
+        pass
+
+    def _wait(self):
+        pass
+
+    def _disconnect(self):
+        pass
+
+    def _send(self, event, data):
+        pass
+
+
+def _control_client():
+    clock = VirtualClock()
+    power = RelayController(backend="sim")
+    sm = StateMachine(QZ1Handler(clock=clock, backend="sim"), IMUHandler(clock=clock, backend="sim"),
+                      power, AudioHandler(clock=clock, backend="sim"))
+    sm._transition_to(sm.STATE_NORMAL)
+    return _BenchClient(sm)
+
+
+def bench_control_toggle():
+    """c2s_control {cmd: toggle}."""
+    handle = _control_client().handle_control
+    data = {'cmd': 'toggle', 'relay': 2}
+    return lambda: handle(data)
+
+
+def bench_control_batch():
+    """c2s_control {cmd: batch} with validation, atomic apply and ack."""
+    client = _control_client()
+    data = {'cmd': 'batch', 'req_id': 1,
+            'ops': [{'cmd': 'set', 'relay': 1, 'state': False}, {'cmd': 'toggle', 'relay': 4}]}
+    def op():
+        client.handle_control(data)
+        client.queue.clear() # Ack would otherwise wait for a connection
+    return op
+
+
+def bench_gui_layout():
+    """Layout of both screens for an 800x480 viewport (text sizes as measured by DearPyGui)."""
+    sizes = {tag: (12 * (i + 4), 24 + 4 * i) for i, (tag, _, _) in enumerate(TEXT_ITEMS)}
+    return lambda: compute_layout(800, 480, sizes, waveform=True)
+
+
+BENCHMARKS = [
+    ("nmea_framing", bench_nmea_framing),
+    ("qz1_process_nmea", bench_qz1_process_nmea),
+    ("imu_decode", bench_imu_decode),
+    ("imu_detect_fixed", bench_imu_detect_fixed),
+    ("imu_detect_adaptive", bench_imu_detect_adaptive),
+    ("state_machine_cycle", bench_state_machine_cycle),
+    ("relay_bulk", bench_relay_bulk),
+    ("control_toggle", bench_control_toggle),
+    ("control_batch", bench_control_batch),
+    ("gui_layout", bench_gui_layout),
+]
+
+
+# --- Measurement ---
+
+def _reference_work():
+    """Fixed pure-Python workload; its time tracks the machine's current speed."""
+    total = 0
+    for i in range(200):
+        total += len(str(i)) * (i & 3)
+    return {'total': total}
+
+
+def best_time(op):
+    """Best per-call seconds over REPEATS repeats."""
+    timer = timeit.Timer(op)
+    number, _ = timer.autorange() # Calls per repeat (>= 0.2 s)
+    return min(timer.repeat(repeat=REPEATS, number=number)) / number
+
+
+def measure(op):
+    """
+    Returns {'time_us': best per-call time, 'score': time relative to the reference
+    workload measured alongside it, 'peak_bytes': per-call peak, 'retained_bytes': per-call growth}.
+    The gate compares scores, so CPU frequency scaling and load between runs largely cancel out.
+    """
+    reference = best_time(_reference_work)
+    best = best_time(op)
+    reference = min(reference, best_time(_reference_work))
+
+    op() # Warm caches outside the trace
+    tracemalloc.start()
+    try:
+        start, _ = tracemalloc.get_traced_memory()
+        peak = 0
+        for _ in range(ALLOC_CALLS):
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            op()
+            _, call_peak = tracemalloc.get_traced_memory()
+            peak = max(peak, call_peak - before)
+        end, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'time_us': round(best * 1e6, 3),
+        'score': round(best / reference, 4),
+        'peak_bytes': peak,
+        'retained_bytes': round(max(0, end - start) / ALLOC_CALLS, 1),
+    }
+
+
+def best_of(a, b):
+    """Per-field minimum of two measurements."""
+    return {key: min(a[key], b[key]) for key in a}
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'azarashi': qz1_handler.azarashi is not None,
+    }
+
+
+def check(name, result, base, time_tolerance, alloc_tolerance):
+    """Returns a list of regression messages (empty = OK)."""
+    problems = []
+    limit = base['score'] * (1 + time_tolerance)
+    if result['score'] > limit:
+        problems.append(f"score {result['score']:.3f} > {limit:.3f}")
+    limit = base['peak_bytes'] * (1 + alloc_tolerance) + ALLOC_SLACK
+    if result['peak_bytes'] > limit:
+        problems.append(f"peak {result['peak_bytes']}B > {limit:.0f}B")
+    limit = base['retained_bytes'] * (1 + alloc_tolerance) + ALLOC_SLACK / 10
+    if result['retained_bytes'] > limit:
+        problems.append(f"retained {result['retained_bytes']}B/call > {limit:.1f}B/call")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Component benchmarks with regression gate")
+    parser.add_argument("--update", action="store_true", help="record the results as the new baseline")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--tolerance", type=float, default=TIME_TOLERANCE, help="allowed slowdown (0.5 = +50%%)")
+    parser.add_argument("--alloc-tolerance", type=float, default=ALLOC_TOLERANCE)
+    parser.add_argument("-k", dest="pattern", default="", help="only benchmarks whose name contains this")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING) # INFO logging would dominate the hot paths
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    env = environment()
+    if baseline and not args.update and baseline.get('environment') != env:
+        print(f"警告: ベースラインの環境が異なります ({baseline.get('environment')} != {env})")
+
+    results = {}
+    failures = 0
+    for name, setup in BENCHMARKS:
+        if args.pattern not in name:
+            continue
+        op = setup()
+        result = measure(op)
+        base = baseline.get('benchmarks', {}).get(name)
+        for _ in range(RETRIES):
+            if base is not None and not args.update and not check(name, result, base, args.tolerance, args.alloc_tolerance):
+                break
+            result = best_of(result, measure(op)) # Baselines are best-of-(1 + RETRIES) as well
+        results[name] = result
+        line = (f"{name:22s} {result['time_us']:9.2f}us  peak {result['peak_bytes']:6d}B  "
+                f"retained {result['retained_bytes']:7.1f}B/call")
+        if args.update:
+            print(line)
+        elif base is None:
+            print(f"{line}  (ベースラインなし)")
+        else:
+            problems = check(name, result, base, args.tolerance, args.alloc_tolerance)
+            failures += bool(problems)
+            ratio = result['score'] / base['score'] if base['score'] else 0.0
+            print(f"{line}  x{ratio:.2f}  {'NG: ' + '; '.join(problems) if problems else 'OK'}")
+
+    if args.update:
+        merged = dict(baseline.get('benchmarks', {}), **results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({'environment': env, 'benchmarks': merged}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"ベースラインを保存しました: {args.baseline}")
+        return 0
+
+    if failures:
+        print(f"性能劣化: {failures} 件")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
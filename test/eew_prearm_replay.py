@@ -0,0 +1,145 @@
+# EEW pre-arm replay on the simulator: each run pairs a QZSS EEW (below the
+# cutoff intensity, so it pre-arms instead of cutting off) with a quake waveform,
+# and compares the cutoff time against the same waveform without the EEW.
+# Also checks that a pre-arm without shaking expires back to NORMAL with the
+# relays untouched.
+#
+#   python3 test/eew_prearm_replay.py [runs]
+#   python3 test/eew_prearm_replay.py --waveform rec.csv --eew-at 12.3 --s-onset 15.0
+#       (recorded waveform: CSV rows t,ax,ay,az in G, t in seconds)
+
+import argparse
+import bisect
+import csv
+import logging
+import os
+import random
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.core import state_machine
+from src.sim.simulator import Simulator
+
+# --- 設定項目 ---
+RUNS = 50
+QUIET_BEFORE = 30.0
+P_AMPLITUDE_G = 0.1
+P_DURATION = 6.0
+S_DURATION = 10.0
+EEW_AFTER_P = (1.0, 4.0)      # EEW arrives this long after the P-wave onset (uniform)
+S_AMPLITUDES_G = (3.0, 1.0)   # Strong (both detect) and moderate (normal profile may miss it)
+EEW_REPORT = {'category': 'EEW', 'intensity': '4', 'regions': ['テスト地域']}
+ALL_ON = {1: True, 2: True, 3: True, 4: True}
+
+
+def recorded_source(path):
+    """Acceleration source from a CSV recording (sample-and-hold between rows)."""
+    times, values = [], []
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.reader(f):
+            try:
+                t, ax, ay, az = (float(v) for v in row[:4])
+            except ValueError:
+                continue # Header / comment
+            times.append(t)
+            values.append((ax, ay, az))
+    def source(t):
+        i = bisect.bisect_right(times, t) - 1
+        return values[i] if i >= 0 else (0.0, 0.0, 1.0)
+    source.window = (times[0], times[-1])
+    return source
+
+
+def replay(seed, source_fn, eew_at, end):
+    """Returns (first ALERT time or None, sim)."""
+    sim = Simulator(seed=seed)
+    sim.start()
+    source_fn(sim)
+    if eew_at is not None:
+        sim.qzss_report(EEW_REPORT, at=eew_at)
+    sim.run_until(end)
+    alert = sim.first("ALERT")
+    return alert, sim
+
+
+def compare(seed, source_fn, eew_at, s_onset, end):
+    """(cutoff after S onset without EEW, with EEW pre-arm), None = no cutoff"""
+    without, _ = replay(seed, source_fn, None, end)
+    with_eew, _ = replay(seed, source_fn, eew_at, end)
+    return (without - s_onset if without is not None else None,
+            with_eew - s_onset if with_eew is not None else None)
+
+
+def synthetic_runs(runs, s_amplitude):
+    rng = random.Random(1)
+    gains, only_prearm, missed = [], 0, 0
+    for seed in range(runs):
+        onset = QUIET_BEFORE + rng.uniform(0.0, 1.0)
+        eew_at = onset + rng.uniform(*EEW_AFTER_P)
+        s_onset = onset + P_DURATION
+        source_fn = lambda sim: sim.quake(P_AMPLITUDE_G, s_amplitude, onset, P_DURATION, S_DURATION)
+        without, with_eew = compare(seed, source_fn, eew_at, s_onset, s_onset + S_DURATION + 5.0)
+        if with_eew is None:
+            missed += 1
+            print(f"seed={seed}: 予備警戒中も遮断なし")
+        elif without is None:
+            only_prearm += 1
+        else:
+            gains.append(without - with_eew)
+    return gains, only_prearm, missed
+
+
+def expiry_check():
+    """EEW without shaking: PREARM -> NORMAL after the window, relays never touched."""
+    sim = Simulator(seed=0)
+    sim.start()
+    sim.qzss_report(EEW_REPORT, at=1.0)
+    sim.run_until(1.5)
+    prearmed = sim.sm.current_state == "PREARM" and sim.imu.prearmed
+    sim.run_until(1.0 + state_machine.PREARM_WINDOW + 1.0)
+    problems = []
+    if not prearmed:
+        problems.append("PREARM にならない")
+    if sim.sm.current_state != "NORMAL" or sim.imu.prearmed:
+        problems.append(f"期間終了後 {sim.sm.current_state} (prearmed={sim.imu.prearmed})")
+    if sim.power.get_status() != ALL_ON or sim.first("ALERT") is not None:
+        problems.append("リレーが操作された")
+    if sim.imu.threshold != sim.imu.base_threshold:
+        problems.append(f"閾値が戻らない ({sim.imu.threshold})")
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="EEW pre-arm replay")
+    parser.add_argument("runs", nargs="?", type=int, default=RUNS)
+    parser.add_argument("--waveform", help="recorded waveform CSV (t,ax,ay,az)")
+    parser.add_argument("--eew-at", type=float, help="EEW receipt time in the recording (s)")
+    parser.add_argument("--s-onset", type=float, help="S-wave onset in the recording (s)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.waveform:
+        source = recorded_source(args.waveform)
+        without, with_eew = compare(0, lambda sim: setattr(sim.imu.bus, 'source', source),
+                                    args.eew_at, args.s_onset, source.window[1] + 5.0)
+        fmt = lambda v: f"{v:+.3f}s" if v is not None else "遮断なし"
+        print(f"遮断 (S波到達から): EEWなし {fmt(without)}  予備警戒あり {fmt(with_eew)}")
+        sys.exit(0)
+
+    failed = False
+    problems = expiry_check()
+    print(f"揺れなし予備警戒: {'OK' if not problems else 'NG: ' + '; '.join(problems)}")
+    failed |= bool(problems)
+
+    for s_amplitude in S_AMPLITUDES_G:
+        gains, only_prearm, missed = synthetic_runs(args.runs, s_amplitude)
+        mean = sum(gains) / len(gains) if gains else 0.0
+        ok = missed == 0 and all(g >= -1e-9 for g in gains)
+        failed |= not ok
+        line = f"S波 {s_amplitude}G: {'OK' if ok else 'NG'}  遮断が早まった時間"
+        if gains:
+            line += f" 平均 {mean * 1000:.0f}ms 最小 {min(gains) * 1000:.0f}ms 最大 {max(gains) * 1000:.0f}ms"
+        print(f"{line}  予備警戒時のみ遮断 {only_prearm}/{args.runs}  未遮断 {missed}/{args.runs}")
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,157 @@
+# Event store (src/core/event_store.py) in a temporary directory: seq numbering of
+# buffered events across flush(), paging with after_seq over the buffer / disk
+# boundary, type and time filters, segment rotation and retention with a small
+# SEGMENT_BYTES, and recovery from a crash that left a half-written tail in the
+# last .seg / .idx.
+#
+#   python3 test/event_store_check.py
+
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.core import event_store
+from src.core.event_store import EventStore
+
+# --- 設定項目 ---
+SEGMENT_BYTES = 512      # A few batches per segment
+MAX_SEGMENTS = 4
+PAGE = 7                 # Query page size (does not divide the batch sizes)
+
+
+class FakeTime:
+    """Event timestamps 1000.0, 1001.0, ... (one second per event)."""
+
+    def __init__(self):
+        self.now = 999.0
+
+    def __call__(self):
+        self.now += 1.0
+        return self.now
+
+
+def open_store(directory, clock):
+    store = EventStore()
+    store.time = clock
+    store.open(directory)
+    return store
+
+
+def record(store, count, expected):
+    """count events alternating qzss / button; expected: seq -> (type, payload)."""
+    for _ in range(count):
+        seq = len(expected) + 1
+        event_type = 'qzss' if seq % 2 else 'button'
+        payload = {'n': seq, 'text': "緊急地震速報" if event_type == 'qzss' else None}
+        store.record(event_type, payload)
+        expected[seq] = (event_type, payload)
+
+
+def all_pages(store, **kwargs):
+    events, after_seq = [], 0
+    while True:
+        page = store.query(after_seq=after_seq, limit=PAGE, **kwargs)
+        events += page['events']
+        if page['next_after_seq'] is None:
+            return events
+        after_seq = page['next_after_seq']
+
+
+def compare(name, events, expected, problems):
+    got = {e['seq']: (e['type'], e['payload']) for e in events}
+    seqs = [e['seq'] for e in events]
+    if seqs != sorted(expected) or got != expected:
+        missing = sorted(set(expected) - set(got))[:5]
+        wrong = [s for s in got if s in expected and got[s] != expected[s]][:5]
+        problems.append(f"{name}: {len(events)}/{len(expected)} 件  欠落 {missing}  不一致 {wrong}  "
+                        f"順序 {'OK' if seqs == sorted(seqs) else 'NG'}")
+
+
+def check_buffer_boundary(directory, problems):
+    clock = FakeTime()
+    store = open_store(directory, clock)
+    expected = {}
+    record(store, 20, expected)
+    store.flush()
+    record(store, 15, expected) # Still in the buffer
+
+    before = all_pages(store)
+    compare("バッファ跨ぎのページング", before, expected, problems)
+    if len(store.buffer) != 15:
+        problems.append(f"クエリでバッファがフラッシュされた (残り {len(store.buffer)} 件)")
+    store.flush()
+    after = all_pages(store)
+    if after != before:
+        problems.append("フラッシュ前後で seq / 内容が変わった")
+
+    qzss = [e['seq'] for e in all_pages(store, types=['qzss'])]
+    if qzss != [s for s in sorted(expected) if expected[s][0] == 'qzss']:
+        problems.append(f"types=qzss: {qzss}")
+    # Event n was recorded at 999 + n
+    window = [e['seq'] for e in all_pages(store, start=1005.0, end=1024.0)]
+    if window != list(range(6, 26)):
+        problems.append(f"start/end: {window}")
+    store.close()
+
+
+def check_rotation_and_crash(directory, problems):
+    clock = FakeTime()
+    store = open_store(directory, clock)
+    expected = {}
+    for _ in range(12):
+        record(store, 5, expected)
+        store.flush()
+    record(store, 3, expected)
+    store.close() # Flushes the rest
+
+    names = sorted(os.listdir(directory))
+    segs = [n for n in names if n.endswith(".seg")]
+    if len(segs) != MAX_SEGMENTS or len([n for n in names if n.endswith(".idx")]) != len(segs):
+        problems.append(f"ローテーション後のセグメント {names}")
+    retained = {seq: v for seq, v in expected.items() if seq >= store.segments[0].first_seq}
+    if len(retained) == len(expected):
+        problems.append("古いセグメントが削除されていない")
+
+    reopened = open_store(directory, clock)
+    compare("再オープン後", all_pages(reopened), retained, problems)
+    last = reopened.segments[-1]
+    end_seq = reopened.next_seq
+    reopened.close()
+
+    # Crash: a half-written batch in the .seg and a torn index entry in the .idx
+    with open(last.path, 'ab') as f:
+        f.write(event_store.RECORD.pack(end_seq, 0.0, 1, 200) + b'{"torn":')
+    with open(last.index_path, 'ab') as f:
+        f.write(b'\x01' * (event_store.INDEX_ENTRY.size // 2))
+    seg_size, idx_size = os.path.getsize(last.path), os.path.getsize(last.index_path)
+
+    recovered = open_store(directory, clock)
+    if recovered.next_seq != end_seq:
+        problems.append(f"クラッシュ後の next_seq {recovered.next_seq} (期待値 {end_seq})")
+    if (os.path.getsize(last.path) >= seg_size or os.path.getsize(last.index_path) >= idx_size
+            or os.path.getsize(last.index_path) % event_store.INDEX_ENTRY.size):
+        problems.append("壊れた末尾が切り詰められていない")
+    compare("クラッシュ後", all_pages(recovered), retained, problems)
+
+    for seq in range(end_seq, end_seq + 4): # Numbering continues after the truncated tail
+        expected[seq] = retained[seq] = ('state', {'n': seq})
+        recovered.record('state', {'n': seq})
+    recovered.flush()
+    compare("クラッシュ後の追記", all_pages(recovered), retained, problems)
+    recovered.close()
+
+
+if __name__ == "__main__":
+    event_store.FLUSH_INTERVAL = 3600.0 # Only the explicit flush() calls write
+    event_store.SEGMENT_BYTES = SEGMENT_BYTES
+    event_store.MAX_SEGMENTS = MAX_SEGMENTS
+    problems = []
+    with tempfile.TemporaryDirectory(prefix="powertap-events-") as directory:
+        check_buffer_boundary(os.path.join(directory, "boundary"), problems)
+        check_rotation_and_crash(os.path.join(directory, "rotation"), problems)
+    print(f"イベントストア: {'OK' if not problems else 'NG'}")
+    for problem in problems:
+        print(f"  {problem}")
+    sys.exit(1 if problems else 0)
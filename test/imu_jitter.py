@@ -0,0 +1,84 @@
+# IMU sampling-loop jitter: in-process vs isolated core process, with and without
+# a GIL-heavy "GUI" load. No hardware needed (IMUHandler falls back to mock mode).
+#
+#   python3 test/imu_jitter.py
+
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+# --- 設定項目 ---
+SAMPLE_INTERVAL = 0.01 # 100 Hz sampling loop
+DURATION = 5.0         # seconds per scenario
+LOAD_THREADS = 2       # Python threads emulating heavy GUI frames / logging storms
+
+
+def busy_load(stop):
+    # Pure-Python work that holds the GIL (string formatting + JSON like a log/emit storm)
+    payload = {"relays": {str(i): bool(i % 2) for i in range(1, 5)}, "msg": "強い揺れを検知" * 10}
+    while not stop.is_set():
+        for _ in range(200):
+            json.dumps(payload)
+            f"{payload}"
+
+
+def sample_intervals(duration):
+    """Run the real IMU monitor loop and return the intervals between samples."""
+    from src.hw.imu_handler import IMUHandler
+    imu = IMUHandler(sample_interval=SAMPLE_INTERVAL)
+    stamps = []
+    imu.sample_listener = lambda t, ax, ay, az: stamps.append(t)
+    imu.start_monitoring(lambda g: None)
+    time.sleep(duration)
+    imu.stop_monitoring()
+    return [b - a for a, b in zip(stamps, stamps[1:])]
+
+
+def isolated_worker(duration, conn):
+    try:
+        os.nice(-10)
+    except OSError:
+        pass
+    conn.send(sample_intervals(duration))
+
+
+def run_scenario(isolated, load):
+    stop = threading.Event()
+    threads = [threading.Thread(target=busy_load, args=(stop,), daemon=True) for _ in range(LOAD_THREADS if load else 0)]
+    for t in threads:
+        t.start()
+    try:
+        if isolated:
+            ctx = multiprocessing.get_context('spawn')
+            parent, child = ctx.Pipe()
+            proc = ctx.Process(target=isolated_worker, args=(DURATION, child))
+            proc.start()
+            intervals = parent.recv()
+            proc.join()
+        else:
+            intervals = sample_intervals(DURATION)
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+    return intervals
+
+
+def summarize(intervals):
+    # Jitter = deviation of each period from the nominal interval (+ read time in mock mode is ~0)
+    dev = sorted(abs(i - SAMPLE_INTERVAL) * 1000 for i in intervals)
+    pick = lambda p: dev[min(len(dev) - 1, int(len(dev) * p / 100))]
+    return f"n={len(dev):4d}  mean={sum(dev) / len(dev):6.3f}ms  p50={pick(50):6.3f}ms  p99={pick(99):6.3f}ms  max={dev[-1]:6.3f}ms"
+
+
+if __name__ == "__main__":
+    print(f"IMU ループのジッタ計測 (周期 {SAMPLE_INTERVAL * 1000:.0f}ms, 各 {DURATION:.0f} 秒)")
+    for isolated in (False, True):
+        for load in (False, True):
+            name = f"{'isolated' if isolated else 'in-process':10s} {'+ GUI load' if load else 'idle':10s}"
+            print(f"{name}  {summarize(run_scenario(isolated, load))}")
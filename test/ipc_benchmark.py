@@ -0,0 +1,68 @@
+# Round-trip latency: Socket.IO (TCP localhost:3000) vs Unix domain socket IPC.
+# 事前に web サーバーを起動しておくこと: cd web && npm start
+
+import os
+import socket
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import socketio
+
+from src.client.ipc_client import IPC_PATH, FrameDecoder, encode_frame
+
+# --- 設定項目 ---
+SERVER_URL = "http://localhost:3000"
+ITERATIONS = 1000
+PAYLOAD = {"version": 0, "relays": {"1": True, "2": False, "3": True, "4": True}}
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def report(name, samples):
+    ms = [s * 1000 for s in samples]
+    print(f"{name:10s} n={len(ms)}  p50={percentile(ms, 50):.3f}ms  "
+          f"p90={percentile(ms, 90):.3f}ms  p99={percentile(ms, 99):.3f}ms  max={max(ms):.3f}ms")
+
+
+def bench_socketio():
+    sio = socketio.Client()
+    sio.connect(SERVER_URL)
+    samples = []
+    try:
+        for i in range(ITERATIONS):
+            t0 = time.perf_counter()
+            sio.call('c2s_ping', dict(PAYLOAD, seq=i), timeout=5)
+            samples.append(time.perf_counter() - t0)
+    finally:
+        sio.disconnect()
+    return samples
+
+
+def bench_ipc():
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(IPC_PATH)
+    decoder = FrameDecoder()
+    samples = []
+    try:
+        for i in range(ITERATIONS):
+            t0 = time.perf_counter()
+            sock.sendall(encode_frame('ping', dict(PAYLOAD, seq=i)))
+            while True:
+                messages = decoder.feed(sock.recv(65536))
+                if any(event == 'pong' for event, _ in messages):
+                    break
+            samples.append(time.perf_counter() - t0)
+    finally:
+        sock.close()
+    return samples
+
+
+if __name__ == "__main__":
+    print(f"往復レイテンシ計測 ({ITERATIONS} 回)")
+    report("socket.io", bench_socketio())
+    report("ipc", bench_ipc())
@@ -0,0 +1,67 @@
+# IPC framing robustness against a running web server: frames whose JSON body is
+# malformed or truncated must close only that connection; the server keeps
+# serving other devices (checked with a ping / pong on a fresh connection).
+# 事前に web サーバーを起動しておくこと: cd web && npm start
+
+import os
+import socket
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.client.ipc_client import IPC_PATH, FRAME_HEADER, MSG_TYPES, FrameDecoder, encode_frame
+
+# --- 設定項目 ---
+TIMEOUT = 2.0
+BAD_BODIES = {
+    "壊れたJSON": b'{"version": 1, "relays": ',
+    "途中で切れたUTF-8": '{"alert_message": "緊急"}'.encode('utf-8')[:-4],
+    "JSONでない": b'\x00\xff garbage',
+}
+
+
+def connect():
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(TIMEOUT)
+    sock.connect(IPC_PATH)
+    return sock
+
+
+def ping_ok():
+    """A fresh connection gets its pong back (the server is alive)."""
+    with connect() as sock:
+        sock.sendall(encode_frame('ping', {'seq': 1}))
+        decoder = FrameDecoder()
+        while True:
+            chunk = sock.recv(4096)
+            if not chunk:
+                return False
+            for event, data in decoder.feed(chunk):
+                if event == 'pong':
+                    return data == {'seq': 1}
+
+
+def closed_by_server(body, event='s2c_snapshot'):
+    """Sends a frame with `body` as payload; True if the server closes this connection."""
+    with connect() as sock:
+        sock.sendall(FRAME_HEADER.pack(len(body), MSG_TYPES[event]) + body)
+        try:
+            return sock.recv(4096) == b''
+        except socket.timeout:
+            return False
+        except ConnectionResetError:
+            return True
+
+
+if __name__ == "__main__":
+    failed = False
+    if not ping_ok():
+        print("サーバーに接続できません")
+        sys.exit(1)
+    for name, body in BAD_BODIES.items():
+        closed = closed_by_server(body)
+        alive = ping_ok()
+        ok = closed and alive
+        failed |= not ok
+        print(f"{name}: {'OK' if ok else 'NG'}  (接続切断 {closed}, サーバー応答 {alive})")
+    sys.exit(1 if failed else 0)
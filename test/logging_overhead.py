@@ -0,0 +1,141 @@
+# Hot-path cost of logging: synchronous logging.basicConfig-style file handler
+# (as before) vs. the queued, rate-limited pipeline (src/core/log_setup.py).
+# The log file write is slowed down to mimic an SD card (SD_WRITE_LATENCY per flush).
+# Without rate limiting the writer falls behind: the queue fills, records are dropped
+# and shutdown waits for the backlog to drain.
+#
+#   python3 test/logging_overhead.py [iterations]
+
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.client.base_client import BaseClient
+from src.core import log_setup
+from src.core.state_machine import StateMachine
+from src.hw.audio import AudioHandler
+from src.hw.clock import VirtualClock
+from src.hw.imu_handler import IMUHandler
+from src.hw.power_control import RelayController
+from src.hw.qz1_handler import QZ1Handler
+
+# --- 設定項目 ---
+ITERATIONS = 2000
+SD_WRITE_LATENCY = 0.0005  # Seconds per flushed record (SD card write stall)
+DEBUG_PAYLOAD = {'version': 1, 'relays': {1: True, 2: False, 3: True, 4: True}, 'sensors': {'imu': {'ok': True}}}
+
+
+class SlowFileHandler(logging.FileHandler):
+    def flush(self):
+        super().flush()
+        time.sleep(SD_WRITE_LATENCY)
+
+
+class _Client(BaseClient):
+    @property
+    def connected(self):
+        return False
+
+    def _connect(self):
+        pass
+
+    def _wait(self):
+        pass
+
+    def _disconnect(self):
+        pass
+
+    def _send(self, event, data):
+        pass
+
+
+def build():
+    clock = VirtualClock()
+    power = RelayController(backend="sim")
+    sm = StateMachine(QZ1Handler(clock=clock, backend="sim"), IMUHandler(clock=clock, backend="sim"),
+                      power, AudioHandler(clock=clock, backend="sim"))
+    sm._transition_to(sm.STATE_NORMAL)
+    client = _Client(sm)
+    logger = logging.getLogger("src.client.base_client")
+
+    def op():
+        # One alert cycle + a burst of remote control, as on a busy device
+        sm.on_qz1_message("benchmark report")
+        sm.on_button_press(1)
+        clock.run_until(clock.now)
+        client.handle_control({'cmd': 'toggle', 'relay': 2})
+        client.handle_control({'cmd': 'set', 'relay': 2, 'state': True})
+        logger.debug("Emitting %s: %s", 's2c_snapshot', DEBUG_PAYLOAD) # DEBUG disabled
+    return op
+
+
+def run(op, iterations):
+    samples = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        op()
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    return {
+        'mean': sum(samples) / len(samples),
+        'p99': samples[int(len(samples) * 0.99)],
+        'max': samples[-1],
+    }
+
+
+def count_lines(path):
+    with open(path, encoding="utf-8") as f:
+        return sum(1 for _ in f)
+
+
+def report(name, result, lines):
+    print(f"{name}: 平均 {result['mean'] * 1e6:8.1f}us  p99 {result['p99'] * 1e6:8.1f}us  "
+          f"最大 {result['max'] * 1e6:8.1f}us  書き込み行数 {lines}")
+
+
+def eager_vs_lazy(iterations=100000):
+    """Disabled DEBUG record with a dict payload: f-string vs %-style args."""
+    logger = logging.getLogger("overhead.debug")
+    logger.setLevel(logging.INFO)
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        logger.debug(f"Emitting s2c_snapshot: {DEBUG_PAYLOAD}")
+    eager = (time.perf_counter() - t0) / iterations
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        logger.debug("Emitting %s: %s", 's2c_snapshot', DEBUG_PAYLOAD)
+    lazy = (time.perf_counter() - t0) / iterations
+    print(f"無効な DEBUG ログ 1回: f-string {eager * 1e6:.2f}us  %s遅延整形 {lazy * 1e6:.2f}us")
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else ITERATIONS
+    directory = tempfile.mkdtemp(prefix="powertap-log-")
+    op = build()
+    root = logging.getLogger()
+
+    # Before: synchronous handler on the caller's thread (logging.basicConfig to a file)
+    path = os.path.join(directory, "sync.log")
+    handler = SlowFileHandler(path, encoding="utf-8")
+    handler.setFormatter(logging.Formatter(log_setup.LOG_FORMAT))
+    root.handlers[:] = [handler]
+    root.setLevel(logging.INFO)
+    result = run(op, iterations)
+    handler.close()
+    report("同期 (basicConfig)", result, count_lines(path))
+
+    # After: queue + writer thread, without and with rate limiting
+    for name, rate in (("キュー", 0), ("キュー + レート制限", log_setup.LOG_RATE)):
+        path = os.path.join(directory, f"async-{rate:g}.log")
+        handler = SlowFileHandler(path, encoding="utf-8")
+        root.handlers[:] = []
+        log_setup.setup(outputs=[handler], rate=rate)
+        result = run(op, iterations)
+        log_setup.shutdown()
+        report(name, result, count_lines(path))
+
+    eager_vs_lazy()
@@ -0,0 +1,174 @@
+# DC Report decode stress / fuzz on simulated hardware: synthesized $QZQSM
+# sentences (src/sim/qzqsm.py) for every disaster category, with random field
+# values, and corrupted variants, through the QZ1 reader into the state machine.
+#
+#   1. Encoder self-check: every category round-trips (fields, CRC-24Q, checksum).
+#   2. Throughput: valid sentences through QZ1Handler._process_nmea ->
+#      StateMachine.on_qz1_message, mean / p99 latency per category.
+#   3. Fuzz: valid + corrupted lines on the simulated serial port through
+#      QZ1Handler._read_step; the reader must keep running and the state
+#      machine must not raise on whatever the decoder delivers.
+#
+#   python3 test/qzqsm_stress.py [messages] [--fuzz N] [--seed N]
+
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.core.state_machine import StateMachine
+from src.hw import qz1_handler
+from src.hw.audio import AudioHandler
+from src.hw.clock import VirtualClock
+from src.hw.imu_handler import IMUHandler
+from src.hw.power_control import RelayController
+from src.hw.qz1_handler import QZ1Handler
+from src.sim import qzqsm
+
+# --- 設定項目 ---
+MESSAGES = 2000       # Valid sentences for the throughput run
+FUZZ_LINES = 5000     # Lines for the fuzz run
+CORRUPT_RATIO = 0.7   # Share of corrupted lines in the fuzz run
+
+
+def build():
+    """State machine on simulated hardware, QZ1 callback wrapped to surface its exceptions."""
+    clock = VirtualClock()
+    qz1 = QZ1Handler(clock=clock, backend="sim")
+    sm = StateMachine(qz1, IMUHandler(clock=clock, backend="sim"), RelayController(backend="sim"),
+                      AudioHandler(clock=clock, backend="sim"))
+    sm._transition_to(sm.STATE_NORMAL)
+    stats = {'reports': 0, 'errors': []}
+
+    def callback(report, stamp=None):
+        stats['reports'] += 1
+        try:
+            sm.on_qz1_message(report, stamp)
+        except Exception as e:
+            # _process_nmea would count this as a decode error; report it as a state machine failure
+            stats['errors'].append(f"{type(e).__name__}: {e}")
+            raise
+        # Back to NORMAL for the next message (ALERT -> RECOVERY -> NORMAL, PREARM -> NORMAL)
+        for _ in range(2):
+            if sm.current_state != sm.STATE_NORMAL:
+                sm.on_button_press(1)
+        clock.run_until(clock.now)
+
+    qz1.callback = callback
+    return qz1, stats
+
+
+def counters():
+    return {'decodes': qz1_handler.DECODES.value(), 'errors': qz1_handler.DECODE_ERRORS.value()}
+
+
+def delta(before):
+    after = counters()
+    return {key: after[key] - before[key] for key in after}
+
+
+def self_check(rng):
+    problems = []
+    for category in qzqsm.CATEGORIES:
+        for _ in range(20):
+            _, sentence = qzqsm.random_message(rng, category)
+            fields = qzqsm.unpack(sentence)
+            if not fields['crc_ok'] or fields['category_name'] != category or len(sentence) > 82:
+                problems.append(f"{category}: {sentence}")
+    fields = qzqsm.unpack(qzqsm.encode("eew", {'intensity_upper': '5-', 'magnitude': 6.8, 'regions': [1, 80]}))
+    if (fields['intensity_upper'], fields['magnitude'], fields['regions']) != (6, 68, 1 << 79 | 1):
+        problems.append(f"eew fields {fields}")
+    for _ in range(50):
+        _, sentence = qzqsm.random_message(rng)
+        _, flipped = qzqsm.corrupt(sentence, rng, "bit_flip")
+        if qzqsm.unpack(flipped)['crc_ok']:
+            problems.append(f"bit flip not detected: {flipped}")
+    return problems
+
+
+def throughput(rng, messages):
+    qz1, stats = build()
+    sentences = [qzqsm.random_message(rng) for _ in range(messages)]
+    latencies = {category: [] for category in qzqsm.CATEGORIES}
+    before = counters()
+    t_start = time.perf_counter()
+    for category, sentence in sentences:
+        t0 = time.perf_counter()
+        qz1._process_nmea(sentence)
+        latencies[category].append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - t_start
+    return elapsed, latencies, delta(before), stats
+
+
+def fuzz(rng, lines):
+    qz1, stats = build()
+    qz1.running = True
+    qz1._read_step() # Opens the simulated port
+    kinds = {}
+    for _ in range(lines):
+        _, sentence = qzqsm.random_message(rng)
+        kind = "valid"
+        if rng.random() < CORRUPT_RATIO:
+            kind, sentence = qzqsm.corrupt(sentence, rng)
+        kinds[kind] = kinds.get(kind, 0) + 1
+        qz1.serial.feed(sentence)
+    before = counters()
+    problems = []
+    for _ in range(lines):
+        if qz1._read_step() is None or not qz1.running or qz1.serial is None:
+            problems.append("reader stopped")
+            break
+    if qz1.serial is not None and qz1.serial.lines:
+        problems.append(f"{len(qz1.serial.lines)} lines not read")
+    return kinds, delta(before), stats, problems
+
+
+def percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="$QZQSM decode stress / fuzz")
+    parser.add_argument("messages", nargs="?", type=int, default=MESSAGES)
+    parser.add_argument("--fuzz", type=int, default=FUZZ_LINES, help="lines for the fuzz run")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+    rng = random.Random(args.seed)
+    failed = False
+
+    if qz1_handler.azarashi is None:
+        print("注意: azarashi 未インストールのため、デコードは行われません（フレーミングと読み取りのみ）")
+
+    problems = self_check(rng)
+    print(f"エンコーダ自己検査: {'OK' if not problems else 'NG'}")
+    for problem in problems[:10]:
+        print(f"  {problem}")
+    failed |= bool(problems)
+
+    elapsed, latencies, counts, stats = throughput(rng, args.messages)
+    print(f"処理速度: {args.messages / elapsed:.0f} 文/秒  デコード {counts['decodes']}  "
+          f"デコード失敗 {counts['errors']}  通知 {stats['reports']}")
+    for category, samples in latencies.items():
+        if samples:
+            print(f"  {category:20s} {len(samples):5d}件  平均 {sum(samples) / len(samples) * 1e6:8.1f}us  "
+                  f"p99 {percentile(samples, 0.99) * 1e6:8.1f}us")
+    for error in stats['errors'][:10]:
+        print(f"  状態遷移で例外: {error}")
+    failed |= bool(stats['errors'])
+
+    kinds, counts, fuzz_stats, problems = fuzz(rng, args.fuzz)
+    problems += [f"状態遷移で例外: {error}" for error in fuzz_stats['errors'][:10]]
+    print(f"ファジング {args.fuzz} 行: {'OK' if not problems else 'NG'}  "
+          f"デコード {counts['decodes']}  デコード失敗 {counts['errors']}  通知 {fuzz_stats['reports']}")
+    print("  " + "  ".join(f"{kind} {count}" for kind, count in sorted(kinds.items())))
+    for problem in problems:
+        print(f"  {problem}")
+    failed |= bool(problems)
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,86 @@
+# Full-system scenario on simulated hardware + virtual clock (no Raspberry Pi needed):
+# EEW arrives -> shaking -> manual reset -> shaking alone -> reset.
+#
+#   python3 test/scenario_runner.py [runs]
+
+import logging
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.sim.simulator import Simulator
+
+# --- 設定項目 ---
+RUNS = 1000
+IMU_INTERVAL = None      # Adaptive sampling (IMUHandler default)
+SHAKE_G = 3.0
+SHAKE_HZ = 2.0
+MAX_DETECT_DELAY = 0.5   # Shaking -> ALERT must be faster than this (simulated seconds)
+GNSS_DELAY = 0.05        # Receiver prints RMC this long after the GNSS second
+GNSS_MAX_ERROR = 0.1     # GNSS clock model vs. true time (output delay + serial polling)
+
+EXPECTED_STATES = ["NORMAL", "ALERT", "NORMAL", "ALERT", "NORMAL"]
+ALL_ON = {1: True, 2: True, 3: True, 4: True}
+ALL_OFF = {1: False, 2: False, 3: False, 4: False}
+
+
+def eew_shaking_reset(seed):
+    sim = Simulator(seed=seed, imu_interval=IMU_INTERVAL)
+    sim.start()
+    sim.gnss_fix(0, 21, delay=GNSS_DELAY)
+
+    sim.qzss_report("緊急地震速報 (テスト)", at=1.0)
+    sim.shake(SHAKE_G, SHAKE_HZ, start=3.0, duration=4.0)
+    sim.press(1, at=10.0)
+    sim.run_until(10.5)
+    eew_alert = sim.first("ALERT")
+
+    sim.shake(SHAKE_G, SHAKE_HZ, start=12.0, duration=3.0)
+    sim.press(1, at=20.0)
+    sim.run_until(21.0)
+    restored = sim.power.get_status() == ALL_ON
+    gnss_now = sim.sm.gnss_time()
+    sim.stop()
+
+    problems = []
+    if sim.states() != EXPECTED_STATES:
+        problems.append(f"states {sim.states()}")
+    if eew_alert != 1.0:
+        problems.append(f"EEW -> ALERT at {eew_alert}")
+    shake_alert = sim.first("ALERT", after=10.5)
+    if shake_alert is None or shake_alert - 12.0 > MAX_DETECT_DELAY:
+        problems.append(f"shaking -> ALERT at {shake_alert}")
+    for t, event, state, relays in sim.trace:
+        if state == "ALERT" and relays != ALL_OFF:
+            problems.append(f"relays on during ALERT at {t:.2f}s")
+    if not restored:
+        problems.append("relays not restored")
+    if gnss_now is None or abs(gnss_now - sim.clock.time()) > GNSS_MAX_ERROR:
+        problems.append(f"GNSS time {gnss_now} vs {sim.clock.time()}")
+    return sim, problems
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else RUNS
+
+    # Same seed -> same trace
+    a, _ = eew_shaking_reset(0)
+    b, _ = eew_shaking_reset(0)
+    print(f"決定性: {'OK' if a.trace == b.trace else 'NG'}")
+
+    start = time.perf_counter()
+    failures = 0
+    for seed in range(runs):
+        sim, problems = eew_shaking_reset(seed)
+        if problems:
+            failures += 1
+            print(f"seed={seed}: {'; '.join(problems)}")
+    elapsed = time.perf_counter() - start
+    simulated = runs * sim.clock.monotonic()
+
+    print(f"シナリオ {runs} 回: 失敗 {failures} 回")
+    print(f"シミュレーション時間 {simulated:.0f}s / 実時間 {elapsed:.2f}s (x{simulated / elapsed:.0f})")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,226 @@
+# Socket.IO control-path load test (no hardware, loopback only).
+#
+# Starts a Python stand-in for web/server.ts (same room routing), connects the
+# real SocketIOClient wired to a mock StateMachine/RelayController, and floods
+# c2s_control commands from a fake browser at increasing rates.
+# Reports command->relay and command->status-echo latency and the max sustainable rate.
+#
+#   python3 test/socketio_load_harness.py
+#   python3 test/socketio_load_harness.py --server-url http://localhost:3000   # against web/server.ts
+
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIServer, WSGIRequestHandler, make_server
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import socketio
+
+from src.client.socket_client import SocketIOClient
+
+# --- 設定項目 ---
+PORT = 3100
+RATES = [20, 50, 100, 200, 500, 1000, 2000] # commands/s
+DURATION = 3.0          # seconds per rate step
+DRAIN_TIMEOUT = 5.0     # seconds to wait for the backlog after the last command
+SUSTAINABLE_P99 = 0.1   # a rate is "sustainable" if cmd->relay p99 stays below this (s)
+
+
+# --- Mock core ---
+
+class MockRelayController:
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.relays = {i: False for i in range(1, 5)}
+        self.applied = [] # time.perf_counter() of each relay write, in order
+
+    def set_relay(self, relay_id, state):
+        if relay_id in self.relays:
+            self.relays[relay_id] = state
+            self.applied.append(time.perf_counter())
+            if self.callback: self.callback(self.get_status())
+
+    def set_relays(self, states):
+        self.relays.update(states)
+        self.applied.append(time.perf_counter())
+        if self.callback: self.callback(self.get_status())
+
+    def toggle(self, relay_id):
+        self.set_relay(relay_id, not self.relays[relay_id])
+
+    def get_status(self):
+        return dict(self.relays)
+
+
+class MockStateMachine:
+    STATE_NORMAL = "NORMAL"
+
+    def __init__(self, power):
+        self.power = power
+        self.current_state = self.STATE_NORMAL
+        self.alert_message = ""
+
+    def apply_relay_batch(self, states):
+        self.power.set_relays(states)
+        return True
+
+    def get_sensor_health(self):
+        return {}
+
+    def on_button_press(self, btn_id): pass
+    def on_qz1_message(self, report): pass
+    def on_imu_shake(self, g_force): pass
+
+
+# --- Server stand-in (same routing as web/server.ts) ---
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def start_standin_server(port):
+    sio = socketio.Server(async_mode='threading', cors_allowed_origins='*')
+
+    @sio.event
+    def connect(sid, environ, auth):
+        role = (auth or {}).get('role')
+        sio.enter_room(sid, 'devices' if role == 'device' else 'browsers')
+
+    @sio.on('c2s_control')
+    def on_control(sid, data):
+        sio.emit('c2s_control', data, room='devices')
+
+    for event in ('s2c_status', 's2c_snapshot', 's2c_ack'):
+        sio.on(event, lambda sid, data, event=event: sio.emit(event, data, room='browsers'))
+
+    httpd = make_server('127.0.0.1', port, socketio.WSGIApp(sio),
+                        server_class=ThreadingWSGIServer, handler_class=QuietHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+
+# --- Load driver ---
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else float('nan')
+
+
+def run_step(browser, power, echoes, rate, duration):
+    power.applied.clear()
+    echoes.clear()
+    sent = []
+    interval = 1.0 / rate
+    n = int(rate * duration)
+    start = time.perf_counter()
+    for i in range(n):
+        # Pace against the schedule (not sleep-per-command) so the rate holds
+        target = start + i * interval
+        delay = target - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        sent.append(time.perf_counter())
+        browser.emit('c2s_control', {'cmd': 'set', 'relay': i % 4 + 1, 'state': (i // 4) % 2 == 0})
+
+    deadline = time.perf_counter() + DRAIN_TIMEOUT
+    while len(power.applied) < n and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.2) # Last status echo
+
+    applied = list(power.applied)
+    echo_times = list(echoes)
+    to_relay = [a - s for s, a in zip(sent, applied)]
+    to_echo = []
+    j = 0
+    for s, a in zip(sent, applied):
+        # First status echo at/after this command's relay write (statuses are coalesced)
+        while j < len(echo_times) and echo_times[j] < a:
+            j += 1
+        if j < len(echo_times):
+            to_echo.append(echo_times[j] - s)
+    achieved = n / (sent[-1] - start) if n > 1 else rate
+    return {
+        'rate': rate,
+        'achieved': achieved,
+        'sent': n,
+        'applied': len(applied),
+        'echoes': len(echo_times),
+        'relay': to_relay,
+        'echo': to_echo,
+    }
+
+
+def print_step(r):
+    ms = lambda v: f"{v * 1000:7.2f}"
+    print(f"{r['rate']:5d}/s (sent {r['achieved']:7.1f}/s) applied {r['applied']:5d}/{r['sent']:<5d} "
+          f"echoes {r['echoes']:5d} | cmd->relay p50 {ms(percentile(r['relay'], 50))} "
+          f"p99 {ms(percentile(r['relay'], 99))} ms | cmd->echo p50 {ms(percentile(r['echo'], 50))} "
+          f"p99 {ms(percentile(r['echo'], 99))} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Socket.IO control-path load test")
+    parser.add_argument('--server-url', help="Use a running server (e.g. web/server.ts) instead of the stand-in")
+    parser.add_argument('--rates', type=lambda s: [int(x) for x in s.split(',')], default=RATES)
+    parser.add_argument('--duration', type=float, default=DURATION)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    url = args.server_url
+    if not url:
+        start_standin_server(PORT)
+        url = f"http://127.0.0.1:{PORT}"
+
+    # Device side: the real client on a mock core
+    power = MockRelayController()
+    sm = MockStateMachine(power)
+    client = SocketIOClient(sm, server_url=url)
+    power.callback = client.emit_status
+    client.start()
+
+    # Browser side
+    echoes = []
+    browser = socketio.Client()
+    browser.on('s2c_status', lambda data: echoes.append(time.perf_counter()))
+    browser.connect(url)
+
+    deadline = time.time() + 10
+    while not client.connected and time.time() < deadline:
+        time.sleep(0.05)
+    if not client.connected:
+        print("Device client failed to connect")
+        return 1
+
+    print(f"Server: {url}")
+    sustainable = None
+    for rate in args.rates:
+        r = run_step(browser, power, echoes, rate, args.duration)
+        print_step(r)
+        ok = r['applied'] == r['sent'] and percentile(r['relay'], 99) < SUSTAINABLE_P99
+        if ok:
+            sustainable = rate
+        else:
+            break
+
+    print(f"Max sustainable rate: {sustainable or '< ' + str(args.rates[0])} commands/s "
+          f"(all applied, cmd->relay p99 < {SUSTAINABLE_P99 * 1000:.0f} ms)")
+    print(f"Client emit stats: {client.get_stats()}")
+
+    browser.disconnect()
+    client.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
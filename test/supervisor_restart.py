@@ -0,0 +1,106 @@
+# Supervisor mode core restart on simulated hardware: the core process is killed
+# and restarted (as run_supervisor does), then a GUI / network side CoreProxy
+# that connected to the first core sends control commands again. The killed core
+# is made to look like it died mid-update of the shared status block (odd seq).
+#
+#   python3 test/supervisor_restart.py
+
+import multiprocessing
+import os
+import secrets
+import struct
+import sys
+import tempfile
+import time
+
+# Before the src imports: read at import time, inherited by the spawned core
+os.environ["POWERTAP_BACKEND"] = "sim"
+os.environ["POWERTAP_METRICS_PORT"] = "0"
+os.environ.setdefault("POWERTAP_EVENTS_DIR", tempfile.mkdtemp(prefix="powertap-events-"))
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.core.shared_status import SharedStatusBlock
+from src.core.supervisor import CoreProxy, run_core
+
+# --- 設定項目 ---
+READY_TIMEOUT = 30.0
+READ_TIMEOUT = 0.5       # A status block read must return within this
+STATUS_TIMEOUT = 2.0     # Core -> status block update after a command
+
+
+def start_core(ctx, block, address, authkey, stop):
+    ready = ctx.Event()
+    proc = ctx.Process(target=run_core, name="core", daemon=True, args=(block.name, address, authkey, ready, stop))
+    proc.start()
+    if not ready.wait(READY_TIMEOUT):
+        raise RuntimeError("core did not become ready")
+    return proc
+
+
+def wait_relay(proxy, relay_id, state):
+    deadline = time.monotonic() + STATUS_TIMEOUT
+    while time.monotonic() < deadline:
+        if proxy.power.get_status()[relay_id] == state:
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def scenario():
+    ctx = multiprocessing.get_context('spawn')
+    block = SharedStatusBlock(create=True)
+    address = os.path.join(tempfile.mkdtemp(prefix="powertap-"), "core.sock")
+    authkey = secrets.token_bytes(16)
+    stop = ctx.Event()
+    problems = []
+    core = start_core(ctx, block, address, authkey, stop)
+    try:
+        proxy = CoreProxy(block.name, address, authkey)
+        proxy.power.set_relay(2, False)
+        if not wait_relay(proxy, 2, False):
+            problems.append("初回コアでリレー操作が反映されない")
+
+        core.kill()
+        core.join()
+        seq = struct.unpack_from('<I', block.shm.buf, 0)[0]
+        struct.pack_into('<I', block.shm.buf, 0, seq | 1) # Died mid-update
+        t0 = time.monotonic()
+        stale = proxy.block.read()
+        if time.monotonic() - t0 > READ_TIMEOUT or stale['relays'][2]:
+            problems.append("更新途中で止まったブロックの読み取りが戻らない / 最後の値でない")
+        try:
+            proxy.power.set_relay(3, False)
+            problems.append("停止中のコアへのコマンドが成功扱い")
+        except (EOFError, OSError):
+            pass # Expected while the core is down
+
+        core = start_core(ctx, block, address, authkey, stop)
+        try:
+            proxy.power.set_relay(3, False)
+        except (EOFError, OSError) as e:
+            problems.append(f"再起動後のコマンドが失敗: {e}")
+        if not wait_relay(proxy, 3, False):
+            problems.append("再起動後のリレー操作が反映されない")
+        if proxy.current_state != "NORMAL":
+            problems.append(f"再起動後の状態 {proxy.current_state}")
+        seq = struct.unpack_from('<I', block.shm.buf, 0)[0]
+        t0 = time.monotonic()
+        proxy.block.read()
+        if seq & 1 and seq == struct.unpack_from('<I', block.shm.buf, 0)[0] or time.monotonic() - t0 > READ_TIMEOUT:
+            problems.append(f"再起動後もブロックが更新途中のまま (seq={seq})")
+    finally:
+        stop.set()
+        core.join(timeout=5)
+        if core.is_alive():
+            core.terminate()
+        block.close()
+    return problems
+
+
+if __name__ == "__main__":
+    problems = scenario()
+    print(f"コア再起動後の制御コマンド: {'OK' if not problems else 'NG'}")
+    for problem in problems:
+        print(f"  {problem}")
+    sys.exit(1 if problems else 0)
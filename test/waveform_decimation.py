@@ -0,0 +1,66 @@
+# Min/max decimation of the alert screen waveform buffer (src/gui/waveform.py):
+# bucket counts, spikes surviving decimation, and rejection of point counts below
+# one min/max pair. Needs numpy (as the GUI does).
+#
+#   python3 test/waveform_decimation.py
+
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.gui.waveform import SampleRingBuffer
+
+# --- 設定項目 ---
+RATE_HZ = 100
+SECONDS = 10
+SPIKE_AT = 537           # Sample index of a one-sample spike
+SPIKE_G = 3.0
+
+
+def filled_buffer():
+    buf = SampleRingBuffer(RATE_HZ * SECONDS, max_points=800)
+    for i in range(RATE_HZ * SECONDS):
+        ax = SPIKE_G if i == SPIKE_AT else 0.0
+        buf.append(i / RATE_HZ, ax, 0.0, 1.0)
+    return buf, (RATE_HZ * SECONDS - 1) / RATE_HZ
+
+
+def check():
+    problems = []
+    buf, now = filled_buffer()
+
+    for points in (2, 3, 100, 800, 5000, None):
+        t, series = buf.decimated(SECONDS, now, points=points)
+        limit = min(points or buf.max_points, buf.max_points)
+        if not 0 < len(t) <= limit or any(len(v) != len(t) for v in series.values()):
+            problems.append(f"points={points}: {len(t)} 点")
+        elif series["ax"].max() != SPIKE_G:
+            problems.append(f"points={points}: スパイクが消えた")
+
+    for points in (1, 0, -5):
+        try:
+            buf.decimated(SECONDS, now, points=points)
+            problems.append(f"points={points}: ValueError にならない")
+        except ValueError:
+            pass
+
+    try:
+        SampleRingBuffer(10, max_points=1)
+        problems.append("max_points=1: ValueError にならない")
+    except ValueError:
+        pass
+
+    empty = SampleRingBuffer(10, max_points=2)
+    t, _ = empty.decimated(SECONDS, now, points=2)
+    if len(t):
+        problems.append("空のバッファで点が返る")
+    return problems
+
+
+if __name__ == "__main__":
+    problems = check()
+    print(f"波形の間引き: {'OK' if not problems else 'NG'}")
+    for problem in problems:
+        print(f"  {problem}")
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,127 @@
+// Fleet load generator: N simulated devices + M fleet dashboards against a running server.
+// Usage: DEVICES=500 BROWSERS=20 npm run loadgen
+import { io as connect, Socket } from 'socket.io-client';
+import { performance } from 'perf_hooks';
+
+const SERVER_URL = process.env.SERVER_URL || 'http://localhost:3000';
+const DEVICES = Number(process.env.DEVICES || 200);
+const BROWSERS = Number(process.env.BROWSERS || 10);
+const FLOORS = Number(process.env.FLOORS || 10);
+const COMMANDS = Number(process.env.COMMANDS || 50);
+const COMMAND_TIMEOUT_MS = 5000;
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
+
+function percentile(values: number[], pct: number): number {
+    const sorted = [...values].sort((a, b) => a - b);
+    return sorted[Math.min(sorted.length - 1, Math.floor(sorted.length * pct / 100))];
+}
+
+async function fleetStats() {
+    const res = await fetch(`${SERVER_URL}/api/fleet/stats`);
+    return res.json() as Promise<{ devices: number; connected: number; memory: NodeJS.MemoryUsage }>;
+}
+
+function waitConnected(socket: Socket): Promise<void> {
+    return new Promise((resolve, reject) => {
+        socket.once('connect', () => resolve());
+        socket.once('connect_error', reject);
+    });
+}
+
+// Pending fleet command: how many devices still have to receive it
+interface Pending {
+    sentAt: number;
+    remaining: number;
+    receipts: number[];
+    done: () => void;
+}
+const pending = new Map<string, Pending>();
+
+async function main() {
+    const before = await fleetStats();
+    console.log(`Server before: ${before.devices} devices, heap ${(before.memory.heapUsed / 1e6).toFixed(1)} MB`);
+
+    // --- Simulated devices ---
+    const devices: Socket[] = [];
+    for (let i = 0; i < DEVICES; i++) {
+        const floor = i % FLOORS;
+        const socket = connect(SERVER_URL, {
+            transports: ['websocket'],
+            forceNew: true,
+            auth: { role: 'device', device_id: `sim-${i}`, tags: { floor: floor } },
+        });
+        let version = 0;
+        const relays: { [id: string]: boolean } = { 1: true, 2: true, 3: true, 4: true };
+        socket.on('connect', () => {
+            socket.emit('s2c_snapshot', { version, relays, current_state: 'NORMAL', alert_message: '', sensors: {} });
+        });
+        socket.on('c2s_control', (cmd) => {
+            const p = pending.get(cmd.req_id);
+            if (p) {
+                p.receipts.push(performance.now() - p.sentAt);
+                if (--p.remaining === 0) p.done();
+            }
+            for (const op of cmd.ops || []) relays[op.relay] = !!op.state;
+            version++;
+            socket.emit('s2c_status', relays);
+            socket.emit('s2c_ack', { req_id: cmd.req_id, ok: true, version });
+        });
+        devices.push(socket);
+    }
+    await Promise.all(devices.map(waitConnected));
+
+    // --- Fleet dashboards ---
+    const browsers: Socket[] = [];
+    for (let i = 0; i < BROWSERS; i++) {
+        browsers.push(connect(SERVER_URL, { transports: ['websocket'], forceNew: true, auth: { fleet: true } }));
+    }
+    await Promise.all(browsers.map(waitConnected));
+    await sleep(1000); // Let snapshots settle
+
+    const after = await fleetStats();
+    const perDevice = (after.memory.heapUsed - before.memory.heapUsed) / DEVICES;
+    console.log(`Server after:  ${after.connected} connected, heap ${(after.memory.heapUsed / 1e6).toFixed(1)} MB`
+        + ` (~${(perDevice / 1024).toFixed(1)} KB/device incl. socket)`);
+
+    // --- Fleet commands: "cut all devices on floor N" ---
+    const fanout: number[] = [];
+    const all: number[] = [];
+    const controller = browsers[0];
+    for (let c = 0; c < COMMANDS; c++) {
+        const floor = c % FLOORS;
+        const expected = Math.ceil((DEVICES - floor) / FLOORS);
+        const reqId = `cmd-${c}`;
+        const command = {
+            cmd: 'batch', req_id: reqId,
+            ops: [1, 2, 3, 4].map((relay) => ({ cmd: 'set', relay, state: c % 2 === 1 })),
+        };
+        await new Promise<void>((resolve) => {
+            const timer = setTimeout(() => {
+                console.warn(`${reqId}: timeout (${pending.get(reqId)?.remaining} devices missing)`);
+                resolve();
+            }, COMMAND_TIMEOUT_MS);
+            pending.set(reqId, {
+                sentAt: performance.now(), remaining: expected, receipts: [],
+                done: () => { clearTimeout(timer); resolve(); },
+            });
+            controller.emit('c2s_fleet_control', { selector: { tags: { floor } }, command });
+        });
+        const p = pending.get(reqId)!;
+        pending.delete(reqId);
+        if (p.receipts.length) fanout.push(Math.max(...p.receipts));
+        all.push(...p.receipts);
+    }
+
+    const fmt = (v: number) => `${v.toFixed(2)}ms`;
+    console.log(`Fleet commands: ${COMMANDS} x ~${Math.ceil(DEVICES / FLOORS)} devices`);
+    console.log(`  per device : p50=${fmt(percentile(all, 50))} p99=${fmt(percentile(all, 99))}`);
+    console.log(`  full fanout: p50=${fmt(percentile(fanout, 50))} p99=${fmt(percentile(fanout, 99))} max=${fmt(Math.max(...fanout))}`);
+
+    for (const s of [...devices, ...browsers]) s.disconnect();
+}
+
+main().catch((err) => {
+    console.error(err);
+    process.exit(1);
+});
@@ -2,6 +2,8 @@ import express from 'express';
 import { createServer } from 'http';
 import { Server, Socket } from 'socket.io';
 import path from 'path';
+import net from 'net';
+import fs from 'fs';
 
 const app = express();
 const httpServer = createServer(app);
@@ -11,26 +13,260 @@ const io = new Server(httpServer, {
 
 const port = 3000;
 
+// Same-host device transport (Unix domain socket, see src/client/ipc_client.py)
+// Frame: [payload length: uint32 BE][message type: uint8][payload: JSON]
+const IPC_PATH = process.env.IPC_PATH || '/tmp/qzss-powertap.sock';
+const MSG_TYPES: { [event: string]: number } = {
+    s2c_status: 1,
+    s2c_snapshot: 2,
+    s2c_ack: 3,
+    c2s_control: 4,
+    ping: 5,
+    pong: 6,
+    register: 7,
+    s2c_metrics: 8,
+};
+const MSG_NAMES: { [code: number]: string } = Object.fromEntries(
+    Object.entries(MSG_TYPES).map(([name, code]) => [code, name])
+);
+const MAX_FRAME_SIZE = 1 << 20;
+
+// Device-local HTTP endpoint (metrics + event history, see src/core/metrics.py)
+const DEVICE_HTTP_URL = process.env.DEVICE_HTTP_URL || 'http://127.0.0.1:9108';
+
+function encodeFrame(event: string, data: unknown): Buffer {
+    const payload = Buffer.from(JSON.stringify(data), 'utf-8');
+    const header = Buffer.alloc(5);
+    header.writeUInt32BE(payload.length, 0);
+    header.writeUInt8(MSG_TYPES[event], 4);
+    return Buffer.concat([header, payload]);
+}
+
+// --- Fleet ---
+// Every device has an id (single-tap setups use 'default') and optional tags
+// such as { floor: 3 }. Socket.IO rooms per device and per tag let one emit
+// reach any selection of devices; browsers watch one device or the fleet.
+const DEFAULT_DEVICE_ID = 'default';
+const DEVICE_ROOM = 'devices';
+const FLEET_ROOM = 'fleet';
+const FLEET_SUMMARY_INTERVAL_MS = 500;
+
+const deviceRoom = (id: string) => `device:${id}`;
+const watchRoom = (id: string) => `watch:${id}`;
+const tagRoom = (key: string, value: unknown) => `tag:${key}=${value}`;
+
+// Last known device state, served to new browsers and the HTTP API
+interface DeviceState {
+    version: number;
+    epoch: string | null;   // Device process boot id: versions compare only within one epoch
+    relays: { [id: string]: boolean };
+    current_state: string | null;
+    alert_message: string;
+    sensors: unknown;
+    updated_at: number | null;
+}
+
+interface Device {
+    id: string;
+    tags: { [key: string]: string | number };
+    connected: boolean;
+    sid: string | null;     // Current Socket.IO connection (ignore late disconnects of old ones)
+    ipc: net.Socket | null; // Set for IPC devices (Socket.IO devices are reached via rooms)
+    state: DeviceState;
+    metrics: unknown;       // Last 's2c_metrics' push (see src/core/metrics.py)
+}
+
+const devices = new Map<string, Device>();
+let fleetDirty = false;
+
+function getDevice(id: string): Device {
+    let dev = devices.get(id);
+    if (!dev) {
+        dev = {
+            id: id,
+            tags: {},
+            connected: false,
+            sid: null,
+            ipc: null,
+            state: {
+                version: 0,
+                epoch: null,
+                relays: {},
+                current_state: null,
+                alert_message: '',
+                sensors: null,
+                updated_at: null,
+            },
+            metrics: null,
+        };
+        devices.set(id, dev);
+    }
+    return dev;
+}
+
+// Fleet selector: { all: true } | { device_ids: [...] } | { tags: { floor: 3 } }
+interface Selector {
+    all?: boolean;
+    device_ids?: string[];
+    tags?: { [key: string]: string | number };
+}
+
+function matches(dev: Device, sel: Selector): boolean {
+    if (sel.all) return true;
+    if (sel.device_ids) return sel.device_ids.includes(dev.id);
+    if (sel.tags) {
+        return Object.entries(sel.tags).every(([k, v]) => String(dev.tags[k]) === String(v));
+    }
+    return false;
+}
+
+// Send a control command to the selected devices (Socket.IO and IPC).
+// Socket.IO devices get a single emit to a room list (payload encoded once).
+function sendControl(sel: Selector, data: unknown): number {
+    let rooms: string[];
+    if (sel.all) {
+        rooms = [DEVICE_ROOM];
+    } else if (sel.device_ids) {
+        rooms = sel.device_ids.map(deviceRoom);
+    } else if (sel.tags && Object.keys(sel.tags).length === 1) {
+        const [k, v] = Object.entries(sel.tags)[0];
+        rooms = [tagRoom(k, v)];
+    } else {
+        rooms = [...devices.values()].filter((d) => matches(d, sel)).map((d) => deviceRoom(d.id));
+    }
+    if (rooms.length) io.to(rooms).emit('c2s_control', data);
+
+    let frame: Buffer | null = null;
+    let count = 0;
+    for (const dev of devices.values()) {
+        if (!dev.connected || !matches(dev, sel)) continue;
+        count++;
+        if (dev.ipc) {
+            frame = frame || encodeFrame('c2s_control', data);
+            dev.ipc.write(frame);
+        }
+    }
+    return count;
+}
+
+// Event from a device (either transport): update cache, fan out to its watchers
+function onDeviceEvent(dev: Device, event: string, data: any) {
+    const state = dev.state;
+    if (event === 's2c_status') {
+        state.relays = data;
+        state.updated_at = Date.now();
+    } else if (event === 's2c_snapshot') {
+        Object.assign(state, data, { updated_at: Date.now() });
+    } else if (event === 's2c_ack') {
+        if (data && data.epoch === state.epoch && data.version > state.version) state.version = data.version;
+    } else if (event === 's2c_metrics') {
+        dev.metrics = data; // Not part of the fleet summary
+        io.to(watchRoom(dev.id)).emit(event, data);
+        return;
+    }
+    fleetDirty = true;
+    io.to(watchRoom(dev.id)).emit(event, data);
+}
+
+function registerDevice(id: string, tags: Device['tags'], socket: Socket | null, ipc: net.Socket | null): Device {
+    const dev = getDevice(id);
+    dev.tags = tags || {};
+    dev.connected = true;
+    dev.sid = socket ? socket.id : null;
+    dev.ipc = ipc;
+    if (socket) {
+        socket.join([DEVICE_ROOM, deviceRoom(id), ...Object.entries(dev.tags).map(([k, v]) => tagRoom(k, v))]);
+    }
+    fleetDirty = true;
+    return dev;
+}
+
+function unregisterDevice(dev: Device) {
+    dev.connected = false;
+    dev.sid = null;
+    dev.ipc = null;
+    fleetDirty = true;
+}
+
+function fleetSummary(sel: Selector = { all: true }) {
+    const byState: { [state: string]: number } = {};
+    const list = [];
+    for (const dev of devices.values()) {
+        if (!matches(dev, sel)) continue;
+        const key = dev.connected ? (dev.state.current_state || 'UNKNOWN') : 'OFFLINE';
+        byState[key] = (byState[key] || 0) + 1;
+        list.push({
+            id: dev.id,
+            tags: dev.tags,
+            connected: dev.connected,
+            current_state: dev.state.current_state,
+            relays: dev.state.relays,
+            updated_at: dev.state.updated_at,
+        });
+    }
+    return { total: list.length, by_state: byState, devices: list };
+}
+
+// Aggregated view for fleet dashboards, throttled
+setInterval(() => {
+    if (!fleetDirty) return;
+    fleetDirty = false;
+    io.to(FLEET_ROOM).emit('s2c_fleet_summary', fleetSummary());
+}, FLEET_SUMMARY_INTERVAL_MS);
+
 app.use(express.static('public'));
 app.use(express.json());
 
 // Relay Logic
 io.on('connection', (socket: Socket) => {
-    console.log('Client connected:', socket.id);
+    const auth = socket.handshake.auth || {};
+    const isDevice = auth.role === 'device';
+    console.log(`${isDevice ? 'Device' : 'Browser'} connected:`, socket.id);
 
-    // When Python client sends Status Update
-    socket.on('s2c_status', (data) => {
-        console.log('Relaxing status update to all clients:', data);
-        // Broadcast to all web clients (and the python client itself, though unrelated)
-        io.emit('s2c_status', data);
-    });
+    if (isDevice) {
+        const dev = registerDevice(String(auth.device_id || DEFAULT_DEVICE_ID), auth.tags, socket, null);
+
+        // Status / snapshot / ack from the Python client
+        for (const event of ['s2c_status', 's2c_snapshot', 's2c_ack', 's2c_metrics']) {
+            socket.on(event, (data) => onDeviceEvent(dev, event, data));
+        }
+        socket.on('disconnect', () => {
+            if (dev.sid === socket.id) unregisterDevice(dev);
+        });
+    } else {
+        // Browsers watch one device (default) or the whole fleet
+        const watching = String(auth.device_id || socket.handshake.query.device_id || DEFAULT_DEVICE_ID);
+        if (auth.fleet) {
+            socket.join(FLEET_ROOM);
+            socket.emit('s2c_fleet_summary', fleetSummary());
+        } else {
+            socket.join(watchRoom(watching));
+            // Last known state right away, no round trip to the device
+            const dev = devices.get(watching);
+            if (dev && dev.state.updated_at !== null) {
+                socket.emit('s2c_snapshot', dev.state);
+            }
+        }
+
+        // When Web Client sends Control Command (to the watched device unless given)
+        socket.on('c2s_control', (data) => {
+            console.log('Control command received:', data);
+            const target = String((data && data.device_id) || watching);
+            sendControl({ device_ids: [target] }, data);
+        });
+
+        // Fleet-wide command: { selector: {...}, command: { cmd: ... } }
+        socket.on('c2s_fleet_control', (data, ack) => {
+            const sel: Selector = (data && data.selector) || {};
+            const count = sendControl(sel, data && data.command);
+            console.log(`Fleet command to ${count} devices:`, data);
+            if (typeof ack === 'function') ack({ devices: count });
+        });
+    }
 
-    // When Web Client sends Control Command
-    socket.on('c2s_control', (data) => {
-        console.log('Control command received:', data);
-        // Relay to Python listeners
-        // We broadcast to everyone, Python client will hear it and act.
-        io.emit('c2s_control', data);
+    // Round-trip probe (test/ipc_benchmark.py)
+    socket.on('c2s_ping', (data, ack) => {
+        if (typeof ack === 'function') ack(data);
     });
 
     socket.on('disconnect', () => {
@@ -38,16 +274,132 @@ io.on('connection', (socket: Socket) => {
     });
 });
 
+// Cached state (no round trip to the device)
+app.get('/api/status', (req, res) => {
+    const id = String(req.query.device_id || DEFAULT_DEVICE_ID);
+    const dev = devices.get(id);
+    if (!dev) {
+        res.status(404).json({ error: 'unknown device' });
+        return;
+    }
+    res.json(dev.state);
+});
+
+// Last metrics pushed by the device (the device also serves Prometheus text locally)
+app.get('/api/metrics', (req, res) => {
+    const id = String(req.query.device_id || DEFAULT_DEVICE_ID);
+    const dev = devices.get(id);
+    if (!dev || dev.metrics === null) {
+        res.status(404).json({ error: 'no metrics' });
+        return;
+    }
+    res.json(dev.metrics);
+});
+
+// Event history (paged): ?start=&end=<epoch s>&types=qzss,imu,button,relay,state,imu_rate,cutoff&after_seq=&limit=
+// Proxied to the device on this host; page with after_seq = previous next_after_seq.
+app.get('/api/events', async (req, res) => {
+    const query = new URLSearchParams();
+    for (const key of ['start', 'end', 'types', 'after_seq', 'limit']) {
+        if (req.query[key] !== undefined) query.set(key, String(req.query[key]));
+    }
+    try {
+        const upstream = await fetch(`${DEVICE_HTTP_URL}/events?${query}`);
+        res.status(upstream.status).json(await upstream.json());
+    } catch (e) {
+        res.status(502).json({ error: 'device unreachable' });
+    }
+});
+
+// Fleet views
+app.get('/api/fleet', (req, res) => {
+    const tags: { [key: string]: string } = {};
+    for (const [k, v] of Object.entries(req.query)) tags[k] = String(v);
+    res.json(fleetSummary(Object.keys(tags).length ? { tags } : { all: true }));
+});
+
+app.post('/api/fleet/control', (req, res) => {
+    const count = sendControl(req.body.selector || {}, req.body.command);
+    res.json({ success: true, devices: count });
+});
+
+app.get('/api/fleet/stats', (req, res) => {
+    let connected = 0;
+    for (const dev of devices.values()) if (dev.connected) connected++;
+    res.json({
+        devices: devices.size,
+        connected: connected,
+        sockets: io.engine.clientsCount,
+        memory: process.memoryUsage(),
+    });
+});
 
 // Legacy API Support (Optional - redirects to socket emit)
 app.post('/api/relay', (req, res) => {
     const relayId = req.body.relay;
     const state = req.body.state;
+    const target = String(req.body.device_id || DEFAULT_DEVICE_ID);
     console.log(`Legacy API: Setting Relay ${relayId} to ${state}`);
-    io.emit('c2s_control', { cmd: 'set', relay: relayId, state: state });
+    sendControl({ device_ids: [target] }, { cmd: 'set', relay: relayId, state: state });
     res.json({ success: true });
 });
 
+// IPC device server: events from the device go straight to its watchers (no echo back)
+const ipcServer = net.createServer((conn) => {
+    console.log('IPC device connected');
+    let dev: Device | null = null;
+    let buffer = Buffer.alloc(0);
+
+    conn.on('data', (chunk: Buffer) => {
+        buffer = Buffer.concat([buffer, chunk]);
+        while (buffer.length >= 5) {
+            const length = buffer.readUInt32BE(0);
+            if (length > MAX_FRAME_SIZE) {
+                console.error('IPC frame too large, dropping connection');
+                conn.destroy();
+                return;
+            }
+            if (buffer.length < 5 + length) break;
+            const event = MSG_NAMES[buffer.readUInt8(4)];
+            const payload = buffer.subarray(5, 5 + length);
+            buffer = buffer.subarray(5 + length);
+            if (!event) continue;
+
+            let data: any = null;
+            try {
+                data = length ? JSON.parse(payload.toString('utf-8')) : null;
+            } catch (err) {
+                // Framing is lost or the device is broken: drop this connection only
+                console.error('IPC frame with invalid JSON, dropping connection:', (err as Error).message);
+                conn.destroy();
+                return;
+            }
+            if (event === 'ping') {
+                conn.write(encodeFrame('pong', data));
+            } else if (event === 'register') {
+                dev = registerDevice(String((data && data.device_id) || DEFAULT_DEVICE_ID), data && data.tags, null, conn);
+            } else if (event.startsWith('s2c_')) {
+                // Devices that never registered are treated as the default device
+                dev = dev || registerDevice(DEFAULT_DEVICE_ID, {}, null, conn);
+                onDeviceEvent(dev, event, data);
+            }
+        }
+    });
+
+    conn.on('close', () => {
+        console.log('IPC device disconnected');
+        if (dev && dev.ipc === conn) unregisterDevice(dev);
+    });
+    conn.on('error', (err) => {
+        console.error('IPC device error:', err.message);
+    });
+});
+
+if (fs.existsSync(IPC_PATH)) fs.unlinkSync(IPC_PATH); // Stale socket from a previous run
+ipcServer.listen(IPC_PATH, () => {
+    console.log(`IPC server listening at ${IPC_PATH}`);
+});
+
 httpServer.listen(port, () => {
     console.log(`Socket.IO Server listening at http://0.0.0.0:${port}`);
 });